@@ -3,11 +3,16 @@ from .passages import Passages
 from .queries import Queries
 from .triples import Triples
 from .ranking import Ranking
+from .vocab import MappedVocabulary, Vocabulary
+from .writer import TriplesWriter
 
 __all__ = [
     "BaseData",
     "Passages",
     "Queries",
     "Triples",
-    "Ranking"
+    "Ranking",
+    "Vocabulary",
+    "MappedVocabulary",
+    "TriplesWriter"
 ]
\ No newline at end of file
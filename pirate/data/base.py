@@ -1,75 +1,147 @@
+import io
+import os
 import json
+import polars as pl
 
 from abc import ABC
 from typing import (
+    IO,
     List,
     Mapping,
     Union,
     Optional
 )
 
+from .compression import iter_line_chunks, open_compressed, read_compressed, split_extension, stream_compressed
+from .shards import find_shards, map_shards, shard_bounds, shard_paths
+from .storage import ArrowStore, JsonlStore, ShardedStore
+from .vocab import Vocabulary
+
 class BaseData(ABC):
     """
     BaseData is an abstract base class that provides methods for loading and saving data in different formats.
     """
 
+    _LAZY_FORMATS = {(ext, None) for ext in ShardedStore.STORES}
+
     def __init__(
         self, 
         data: Union[str, List, Mapping],
         id_key: Optional[str] = None,
-        content_key: Optional[str] = None
+        content_key: Optional[str] = None,
+        lazy: bool = False
     ):
         """
         Initialize the BaseData object.
 
         Args:
-            data: The data to be loaded. It can be a string (path to a file), a list, or a dictionary.
+            data: The data to be loaded. It can be a string (path to a file, directory or glob pattern),
+                a list, or a dictionary.
             id_key: The key used for the id in the data. Defaults to 'id'.
             content_key: The key used for the content in the data. Defaults to 'content'.
+            lazy: Whether to keep file-backed data on disk and read records on access. Arrow files
+                are memory-mapped and JSONL files are indexed by byte offset. Defaults to False.
         """
         self.id_key = id_key or "id"
         self.content_key = content_key or "content"
+        self.lazy = lazy
 
         self.load(data)
 
-    def save(self, path: str):
+    def save(self, path: str, num_shards: Optional[int] = None):
         """
-        Save the data to a file.
+        Save the data to a file. Paths ending in `.gz` or `.zst`, such as `passages.jsonl.zst`, are
+        compressed.
 
         Args:
             path: The path to the file where the data will be saved.
+            num_shards: The number of files to split the data into, written in parallel and named like
+                `passages-00000-of-00004.jsonl` next to `path`. Defaults to a single file.
+
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+            ValueError: If the number of shards is not positive.
+        """
+        df = self._to_frame()
+
+        if num_shards is None:
+            self._save_file(path, df)
+        else:
+            frames = [df.slice(offset, length) for offset, length in shard_bounds(len(df), num_shards)]
+            map_shards(self._save_file, shard_paths(path, num_shards), frames)
+
+    def _save_file(self, path: str, df: pl.DataFrame):
+        """
+        Save a DataFrame of records to a file, compressing it if the path asks for it.
+
+        Args:
+            path: The path to the file where the records will be saved.
+            df: The records to be saved.
 
         Raises:
             NotImplementedError: If the file extension is not supported.
         """
-        ext = path.split(".")[-1]
+        ext, compression = split_extension(path)
 
+        if compression is None:
+            self._save(path, ext, df)
+        else:
+            with open_compressed(path, compression) as f:
+                self._save(f, ext, df)
+
+    def _save(self, target: Union[str, IO[bytes]], ext: str, df: pl.DataFrame):
+        """
+        Save records in the format of a file extension.
+
+        Args:
+            target: The path or the binary stream to which the records will be saved.
+            ext: The extension of the format.
+            df: The records to be saved.
+
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+        """
         if ext == "json" or ext == "jsonl":
-            self._to_json(path)
+            self._to_json(target, df)
         elif ext == "csv":
-            self._to_csv(path)
+            self._to_csv(target, df)
+        elif ext == "parquet":
+            self._to_parquet(target, df)
+        elif ext == "arrow" or ext == "feather":
+            self._to_arrow(target, df)
         else:
             raise NotImplementedError(f"Extension {ext} not supported")
 
     def load(self, data: Union[str, List, Mapping]):
         """
-        Load data from a file, list, or dictionary.
+        Load data from a file, list, or dictionary. Files ending in `.gz` or `.zst` are decompressed
+        while they are read.
+
+        A directory or a glob pattern loads every shard file it holds, in sorted order, as a single
+        dataset. Shards are read in parallel, or opened on first access when the data is lazy.
 
         Args:
-            data: The data to be loaded. It can be a string (path to a file), a list, or a dictionary.
+            data: The data to be loaded. It can be a string (path to a file, directory or glob pattern),
+                a list, or a dictionary.
 
         Raises:
             NotImplementedError: If the data type or file extension is not supported.
+            ValueError: If a compressed file is loaded lazily.
+            FileNotFoundError: If a directory or glob pattern holds no file.
         """
+        self._vocab: Optional[Vocabulary] = None
+
         if isinstance(data, str):
-            ext = data.split(".")[-1]
+            paths = find_shards(data)
 
-            if ext == "json" or ext == "jsonl":
-                self.data = self._from_json(data)
-            elif ext == "csv":
-                self.data = self._from_csv(data)
+            if paths is None:
+                self.data = self._from_file(data)
+            elif self.lazy and all(split_extension(path) in self._LAZY_FORMATS for path in paths):
+                self.data = ShardedStore(paths, self.id_key, self.content_key)
             else:
-                raise NotImplementedError(f"Extension {ext} not supported")
+                self.data = {}
+                for shard in map_shards(self._from_file, paths):
+                    self.data.update(shard)
         
         elif isinstance(data, list):
             self.data = self._from_list(data)
@@ -80,27 +152,106 @@ class BaseData(ABC):
         else:
             raise NotImplementedError(f"Type {type(data)} not supported")
 
-    def _to_json(self, path: str):
+    def _from_file(self, path: str) -> Mapping:
+        """
+        Load data from a single file.
+
+        Args:
+            path: The path to the file from which the data will be loaded.
+
+        Returns:
+            The loaded mapping, or an on-disk store if the data is lazy.
+
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+            ValueError: If a compressed file is loaded lazily.
+        """
+        ext, compression = split_extension(path)
+
+        if compression is not None and self.lazy:
+            raise ValueError("Compressed files can't be loaded lazily, decompress them first.")
+
+        if compression is not None and ext in ("json", "jsonl", "csv"):
+            with stream_compressed(path, compression) as stream:
+                return self._from_csv(stream) if ext == "csv" else self._from_json(stream)
+
+        source = path if compression is None else read_compressed(path, compression)
+
+        if ext == "json" or ext == "jsonl":
+            return JsonlStore(path, self.id_key, self.content_key) if self.lazy else self._from_json(source)
+        elif ext == "csv":
+            return self._from_csv(source)
+        elif ext == "parquet":
+            return self._from_parquet(source)
+        elif ext == "arrow" or ext == "feather":
+            return ArrowStore(path, self.id_key, self.content_key) if self.lazy else self._from_arrow(source)
+        else:
+            raise NotImplementedError(f"Extension {ext} not supported")
+
+    @property
+    def vocab(self) -> Vocabulary:
+        """
+        The vocabulary of the IDs, where the code of an ID is its position in iteration order.
+
+        It is built on first access. Pass it to `Triples` or use it in retrievers to work on dense
+        integer codes instead of ID strings.
+        """
+        if self._vocab is None:
+            self._vocab = Vocabulary(self.data)
+
+        return self._vocab
+
+    def _to_json(self, path: Union[str, IO[bytes]], df: pl.DataFrame):
         """
         Save the data to a JSON file.
 
         Args:
-            path: The path to the file where the data will be saved.
+            path: The path or the binary stream to which the data will be saved.
+            df: The records to be saved, as returned by `_to_frame`.
         """
-        with open(path, "w") as f:
-            for k, v in self.data.items():
-                f.write(json.dumps({self.id_key: k, self.content_key: v}) + "\n")
+        df.write_ndjson(path)
 
-    def _to_csv(self, path: str):
+    def _to_csv(self, path: Union[str, IO[bytes]], df: pl.DataFrame):
         """
-        Save the data to a CSV file.
+        Save the data to a CSV file without a header. Contents with commas or quotes are quoted.
 
         Args:
-            path: The path to the file where the data will be saved.
+            path: The path or the binary stream to which the data will be saved.
+            df: The records to be saved, as returned by `_to_frame`.
         """
-        with open(path, "w") as f:
-            for k, v in self.data.items():
-                f.write(f"{k},{v}\n")
+        df.write_csv(path, include_header=False)
+
+    def _to_parquet(self, path: Union[str, IO[bytes]], df: pl.DataFrame):
+        """
+        Save the data to a Parquet file.
+
+        Args:
+            path: The path or the binary stream to which the data will be saved.
+            df: The records to be saved, as returned by `_to_frame`.
+        """
+        df.write_parquet(path)
+
+    def _to_arrow(self, path: Union[str, IO[bytes]], df: pl.DataFrame):
+        """
+        Save the data to an uncompressed Arrow IPC file, which can be memory-mapped on load.
+
+        Args:
+            path: The path or the binary stream to which the data will be saved.
+            df: The records to be saved, as returned by `_to_frame`.
+        """
+        df.write_ipc(path, compression="uncompressed")
+
+    def _to_frame(self) -> pl.DataFrame:
+        """
+        Convert the data to a DataFrame with an id column and a string content column.
+
+        Returns:
+            A DataFrame with one row per record.
+        """
+        return pl.DataFrame({
+            self.id_key: list(self.data.keys()),
+            self.content_key: pl.Series(list(self.data.values()), dtype=pl.String)
+        })
 
     def _from_dict(self, data: Mapping) -> Mapping:
         """
@@ -128,43 +279,109 @@ class BaseData(ABC):
         
         return mapped_data
 
-    def _from_json(self, data: str):
+    def _from_json(self, data: Union[str, IO[bytes]]):
         """
-        Load data from a JSON file.
+        Load data from a JSON file. An empty file, such as an empty shard, holds no records.
+
+        polars infers the type of the IDs from the first records and turns IDs of another type into
+        nulls, so records whose IDs come back null are parsed again with `json`, which keeps every ID
+        as it is in the file.
 
         Args:
-            data: The path to the JSON file from which the data will be loaded.
+            data: The path to the JSON file, or a binary stream, from which the data will be loaded.
+                Streams are parsed in chunks of whole lines, so only one chunk is held as text.
         """
+        if isinstance(data, str):
+            if os.path.getsize(data) == 0:
+                return {}
 
-        mapped_data = {}
+            df = pl.scan_ndjson(data).select([self.id_key, self.content_key]).collect()
+            if df[self.id_key].null_count() == 0:
+                return self._from_frame(df)
 
-        with open(data, "r") as f:
-            for line in f:
-                record = json.loads(line)
-                mapped_data[record[self.id_key]] = record[self.content_key]
+            with open(data, "rb") as f:
+                return self._from_json(f)
 
-        return mapped_data
+        records = {}
+        for lines in iter_line_chunks(data):
+            if lines.strip():
+                records.update(self._from_json_lines(lines))
 
-    def _from_csv(self, data: str):
+        return records
+
+    def _from_json_lines(self, lines: bytes) -> Mapping:
+        """
+        Load data from a chunk of JSON lines, with `json` if polars turns some IDs into nulls.
+
+        Args:
+            lines: The JSON lines.
+        """
+        df = pl.read_ndjson(io.BytesIO(lines)).select([self.id_key, self.content_key])
+        if df[self.id_key].null_count() == 0:
+            return self._from_frame(df)
+
+        records = json.loads(b"[" + b",".join(filter(bytes.strip, lines.split(b"\n"))) + b"]")
+        return {record[self.id_key]: record[self.content_key] for record in records}
+
+    def _from_csv(self, data: Union[str, IO[bytes]]):
         """
         Load data from a CSV file.
 
         Args:
-            data: The path to the CSV file from which the data will be loaded.
+            data: The path to the CSV file, or a binary stream, from which the data will be loaded.
+                Streams are parsed in chunks of whole lines, so only one chunk is held as text.
         """
-        mapped_data = {}
+        chunks = [data] if isinstance(data, str) else (io.BytesIO(lines) for lines in iter_line_chunks(data, quoted=True))
 
-        with open(data, "r") as f:
-            for line in f:
-                k, v = line.split(",")
-                mapped_data[k] = v.strip()
-            
-        return mapped_data
+        records = {}
+        for chunk in chunks:
+            df = pl.read_csv(chunk, has_header=False, infer_schema_length=0, raise_if_empty=False)
+
+            if df.width:
+                df.columns = [self.id_key, self.content_key]
+                records.update(self._from_frame(df.with_columns(pl.all().str.strip_chars())))
+
+        return records
+
+    def _from_parquet(self, data: Union[str, IO[bytes]]):
+        """
+        Load data from a Parquet file.
+
+        Args:
+            data: The path to the Parquet file, or a binary stream, from which the data will be loaded.
+        """
+        df = pl.read_parquet(data, columns=[self.id_key, self.content_key])
+
+        return self._from_frame(df)
+
+    def _from_arrow(self, data: Union[str, IO[bytes]]):
+        """
+        Load data from an Arrow IPC file.
+
+        Args:
+            data: The path to the Arrow file, or a binary stream, from which the data will be loaded.
+        """
+        df = pl.read_ipc(data, columns=[self.id_key, self.content_key], rechunk=False)
+
+        return self._from_frame(df)
+
+    def _from_frame(self, df: pl.DataFrame) -> Mapping:
+        """
+        Load data from a DataFrame with an id column and a content column.
+
+        Args:
+            df: The DataFrame from which the data will be loaded.
+        """
+        return dict(zip(df[self.id_key].to_list(), df[self.content_key].to_list()))
 
     def __getitem__(self, key):
         """ Get the value of a key. """
         return self.data[key]
 
+    def __contains__(self, key):
+        """ Check if a key is in the data, without iterating over it. """
+        return key in self.data
+
     def __len__(self):
         """ Get the length of the data. """
         return len(self.data)
@@ -0,0 +1,129 @@
+import io
+import os
+import shutil
+import pyarrow as pa
+
+from typing import IO, Iterator, Optional, Tuple
+
+
+CODECS = {
+    "gz": "gzip",
+    "zst": "zstd"
+}
+
+
+def split_extension(path: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a path into its format extension and its compression extension.
+
+    Args:
+        path: The path to a file, such as `passages.jsonl` or `passages.jsonl.zst`.
+
+    Returns:
+        The format extension and the compression extension, which is None for uncompressed files.
+    """
+    parts = os.path.basename(path).split(".")
+
+    if len(parts) > 2 and parts[-1] in CODECS:
+        return parts[-2], parts[-1]
+
+    return parts[-1], None
+
+
+def read_compressed(path: str, compression: str) -> io.BytesIO:
+    """
+    Decompress a file into memory, streaming it in chunks so no decompressed copy touches the disk.
+
+    Only formats that need random access, Parquet, Arrow and NumPy archives, are read this way. They
+    need the full decompressed size in memory. Line-oriented formats are parsed from
+    `stream_compressed` one chunk at a time instead.
+
+    Args:
+        path: The path to the compressed file.
+        compression: The compression extension of the file, `gz` or `zst`.
+
+    Returns:
+        A buffer with the decompressed content, positioned at its start.
+    """
+    buffer = io.BytesIO()
+
+    with stream_compressed(path, compression) as stream:
+        shutil.copyfileobj(stream, buffer, 1 << 20)
+
+    buffer.seek(0)
+    return buffer
+
+
+def stream_compressed(path: str, compression: str) -> IO[bytes]:
+    """
+    Open a binary stream that decompresses a file as it is read.
+
+    Args:
+        path: The path to the compressed file.
+        compression: The compression extension of the file, `gz` or `zst`.
+
+    Returns:
+        A readable binary stream, which is not seekable.
+    """
+    return pa.CompressedInputStream(path, CODECS[compression])
+
+
+def iter_line_chunks(stream: IO[bytes], chunk_size: int = 1 << 24, quoted: bool = False) -> Iterator[bytes]:
+    """
+    Read a stream in chunks that end at line boundaries, so each chunk can be parsed on its own.
+
+    Args:
+        stream: The binary stream to be read.
+        chunk_size: The number of bytes read at once. A chunk holds at most this many bytes plus the
+            partial line left over from the previous read. Defaults to 16 MiB.
+        quoted: Whether lines may hold quoted fields with line breaks, as in CSV. A chunk then only
+            ends at a line break that follows an even number of quote characters.
+
+    Returns:
+        An iterator over the chunks. Lines are never split across chunks, and the last chunk may not
+        end with a line break.
+    """
+    rest = b""
+
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+
+        lines = rest + block
+        end = lines.rfind(b"\n") + 1
+        while quoted and end > 0 and lines.count(b'"', 0, end) % 2:
+            end = lines.rfind(b"\n", 0, end - 1) + 1
+
+        if end:
+            yield lines[:end]
+        rest = lines[end:]
+
+    if rest:
+        yield rest
+
+
+def open_compressed(path: str, compression: str) -> IO[bytes]:
+    """
+    Open a binary stream that compresses what is written to it into a file.
+
+    Zstandard files are compressed on all cores when the optional `zstandard` package is installed.
+    Otherwise, and for gzip files, the single-threaded codecs bundled with pyarrow are used.
+
+    Args:
+        path: The path to the file to be written.
+        compression: The compression extension of the file, `gz` or `zst`.
+
+    Returns:
+        A writable binary stream. Closing it finishes and closes the file.
+    """
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError:
+            zstandard = None
+
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(threads=-1).stream_writer(open(path, "wb"))
+
+    return pa.CompressedOutputStream(path, CODECS[compression])
@@ -2,6 +2,7 @@ import textwrap
 from typing import List, Mapping, Union, Optional
 
 from .base import BaseData
+from .index import HashIndex, normalize_text
 
 class Passages(BaseData):
     """
@@ -11,22 +12,43 @@ class Passages(BaseData):
         self,
         data: Union[str, List, Mapping],
         id_key: Optional[str] = None, 
-        content_key: Optional[str] = None
+        content_key: Optional[str] = None,
+        lazy: bool = False,
+        normalize: bool = False
     ):
         """
         Initialize the Passages object.
 
         Args:
-            data: The data to be loaded. It can be a string (path to a file), a list, or a dictionary.
+            data: The data to be loaded. It can be a string (path to a file, directory or glob pattern),
+                a list, or a dictionary.
             id_key: The key used for the id in the data. Defaults to 'pid'.
             content_key: The key used for the content in the data. Defaults to 'passage'.
+            lazy: Whether to keep file-backed data on disk and read records on access. Defaults to False.
+            normalize: Whether content lookups ignore case and whitespace differences. Defaults to False.
         """
         id_key = id_key or "pid"
         content_key = content_key or "passage"
 
         self.data: dict  # This is for type hinting only
+        self.normalize = normalize
         
-        super().__init__(data, id_key, content_key)
+        super().__init__(data, id_key, content_key, lazy)
+
+
+    def load(self, data: Union[str, List, Mapping]):
+        """
+        Load data from a file, list, or dictionary.
+
+        The content index is built on the first lookup by content, since most callers never make one.
+
+        Args:
+            data: The data to be loaded. It can be a string (path to a file, directory or glob pattern),
+                a list, or a dictionary.
+        """
+        super().load(data)
+
+        self._content_index: Optional[HashIndex] = None
     
 
     def get_id(self, content: str) -> Optional[str]:
@@ -39,11 +61,30 @@ class Passages(BaseData):
         Returns:
             The ID of the passage if it exists, otherwise None.
         """
-        for pid, passage in self.data.items():
-            if passage[self.content_key] == content:
+        key = self._index_key(content)
+
+        if self._content_index is None:
+            self._build_content_index()
+
+        for row in self._content_index.lookup(key):  # type: ignore
+            pid = self.vocab.decode(row)
+            if self._index_key(self.data[pid]) == key:
                 return pid
         
         return None
+
+
+    def has_content(self, content: str) -> bool:
+        """
+        Check if a passage with the given content exists.
+
+        Args:
+            content: The content of the passage.
+
+        Returns:
+            True if the passage exists, otherwise False.
+        """
+        return self.get_id(content) is not None
     
 
     def add(self, content: str) -> str:
@@ -57,11 +98,32 @@ class Passages(BaseData):
             The ID of the passage.
         """
         pid = str(len(self.data))
-        self.data[pid] = {self.id_key: pid, self.content_key: content}
+        while pid in self.data:
+            pid = str(int(pid) + 1)
+
+        self.data[pid] = content
+
+        if self._vocab is not None:
+            row = self._vocab.add(pid)
+
+            if self._content_index is not None:
+                self._content_index.add(self._index_key(content), row)
         
         return pid
 
 
+    def _build_content_index(self):
+        """ Build the content hash index over the loaded passages, with rows matching the vocabulary codes. """
+        self._content_index = HashIndex.build(
+            self._index_key(self.data[pid]) for pid in self.vocab
+        )
+
+
+    def _index_key(self, content: str) -> str:
+        """ Return the key under which a content is indexed. """
+        return normalize_text(content) if self.normalize else content
+
+
     def __repr__(self):
         """ Return the string representation of the BaseData object. """
         string = textwrap.dedent(
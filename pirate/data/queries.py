@@ -11,20 +11,23 @@ class Queries(BaseData):
         self,
         data: Union[str, List, Mapping],
         id_key: Optional[str] = None, 
-        content_key: Optional[str] = None
+        content_key: Optional[str] = None,
+        lazy: bool = False
     ):
         """
         Initialize the Queries object.
 
         Args:
-            data: The data to be loaded. It can be a string (path to a file), a list, or a dictionary.
+            data: The data to be loaded. It can be a string (path to a file, directory or glob pattern),
+                a list, or a dictionary.
             id_key: The key used for the id in the data. Defaults to 'qid'.
             content_key: The key used for the content in the data. Defaults to 'query'.
+            lazy: Whether to keep file-backed data on disk and read records on access. Defaults to False.
         """
         id_key = id_key or "qid"
         content_key = content_key or "query"
         
-        super().__init__(data, id_key, content_key)
+        super().__init__(data, id_key, content_key, lazy)
 
     def __repr__(self):
         """ Return the string representation of the BaseData object. """
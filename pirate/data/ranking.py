@@ -1,67 +1,174 @@
+import io
 import textwrap
 import polars as pl
 
-from typing import Union, List
+from itertools import chain
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .compression import iter_line_chunks, open_compressed, read_compressed, split_extension, stream_compressed
+from .shards import find_shards, map_shards, shard_paths
 
 class Ranking:
 	"""
-	Ranking is a class that handles ranking data in different formats (json, jsonl, csv, list).
+	Ranking is a class that handles ranking data in different formats (json, jsonl, csv, parquet, arrow, list).
+
+	A lazy Ranking keeps a polars query plan over the file instead of the rows. Filters and per-query
+	truncation are added to the plan and pushed down into the scan, and the rows are only read, in
+	streaming mode, when `data` is first accessed.
 	"""
-	def __init__(self, ranking: Union[str, List]):
+	def __init__(self, ranking: Union[str, List, pl.DataFrame, pl.LazyFrame], lazy: bool = False):
 		"""
 		Initialize the Ranking object.
 
 		Args:
-			ranking: The ranking to be loaded. It can be a string (path to a file) or a list.
+			ranking: The ranking to be loaded. It can be a string (path to a file, directory or glob
+				pattern), a list, a DataFrame or a LazyFrame. DataFrames are wrapped without copying.
+			lazy: Whether to scan a file lazily instead of reading it. Defaults to False.
 		"""
+		self.lazy = lazy
+
+		self._data: Optional[pl.DataFrame] = None
+		self._plan: Optional[pl.LazyFrame] = None
+
+		self._grouped: Optional[pl.DataFrame] = None
+		self._group_offsets: Dict[str, Tuple[int, int]] = {}
+		self._grouped_source: Optional[pl.DataFrame] = None
+
 		self.load(ranking)
 
 
-	def load(self, ranking: Union[str, List]):
+	def load(self, ranking: Union[str, List, pl.DataFrame, pl.LazyFrame]):
 		"""
-		Load ranking from a file or a list.
+		Load ranking from a file, a list, a DataFrame or a LazyFrame. Files ending in `.gz` or `.zst` are
+		decompressed while they are read.
+
+		A directory or a glob pattern loads every shard file it holds, in sorted order. The shards are
+		read in parallel, or, for a lazy ranking, scanned together when the plan is collected.
 
 		Args:
-			ranking: The ranking to be loaded. It can be a string (path to a file) or a list.
+			ranking: The ranking to be loaded. It can be a string (path to a file, directory or glob
+				pattern), a list, a DataFrame or a LazyFrame.
 
 		Raises:
 			NotImplementedError: If the file extension or data type is not supported.
+			ValueError: If a compressed file is loaded lazily.
+			FileNotFoundError: If a directory or glob pattern holds no file.
 		"""
-		if isinstance(ranking, str):
-			ext = ranking.split(".")[-1]
+		paths = find_shards(ranking) if isinstance(ranking, str) else None
+
+		if paths is not None:
+			shards = map_shards(lambda path: Ranking(path, self.lazy), paths)
+			merged = self.concat(shards)
+			self._data, self._plan = merged._data, merged._plan
+
+		elif isinstance(ranking, str) and self.lazy:
+			self._plan = self._scan(ranking)
+
+		elif isinstance(ranking, str):
+			ext, compression = split_extension(ranking)
+
+			if compression is None:
+				source = ranking
+			elif ext in ("json", "jsonl", "csv"):
+				source = stream_compressed(ranking, compression)
+			else:
+				source = read_compressed(ranking, compression)
 
 			if ext == "json" or ext == "jsonl":
-				self._from_json(ranking)
+				self._from_json(source)
 			elif ext == "csv":
-				self._from_csv(ranking)
+				self._from_csv(source)
+			elif ext == "parquet":
+				self._from_parquet(source)
+			elif ext == "arrow" or ext == "feather":
+				self._from_arrow(source)
 			else:
 				raise NotImplementedError(f"Extension {ext} not supported")
 
+			if source is not ranking:
+				source.close()
+
 		elif isinstance(ranking, list):
 			self._from_list(ranking)
+		elif isinstance(ranking, pl.DataFrame):
+			self.data = self._cast(ranking)
+		elif isinstance(ranking, pl.LazyFrame):
+			self._plan = self._cast(ranking)
 		else:
 			raise NotImplementedError(f"Type {type(ranking)} not supported")
 
 
-	def save(self, path: str):
+	def save(self, path: str, num_shards: Optional[int] = None):
 		"""
-		Save the ranking to a file.
+		Save the ranking to a file. Paths ending in `.gz` or `.zst`, such as `ranking.jsonl.zst`, are
+		compressed.
 
 		Args:
 			path: The path to the file where the ranking will be saved.
+			num_shards: The number of files to split the ranking into, written in parallel and named like
+				`ranking-00000-of-00004.jsonl` next to `path`. Rows are assigned to shards by a hash of
+				their query ID, so every query is in a single shard. Defaults to a single file.
 
 		Raises:
 			NotImplementedError: If the file extension is not supported.
+			ValueError: If the number of shards is not positive.
+		"""
+		if num_shards is not None:
+			if num_shards < 1:
+				raise ValueError(f"The number of shards must be positive, got {num_shards}.")
+
+			shard = pl.col("qid").cast(pl.String).hash() % num_shards
+			data = self.data.with_columns(shard.alias("_shard"))
+			shards = [Ranking(data.filter(pl.col("_shard") == i).drop("_shard")) for i in range(num_shards)]
+			map_shards(Ranking.save, shards, shard_paths(path, num_shards))
+			return
+
+		ext, compression = split_extension(path)
+
+		if compression is None:
+			if not (self._is_pending() and self._sink(path, ext)):
+				self._save(path, ext)
+		else:
+			with open_compressed(path, compression) as f:
+				self._save(f, ext)
+
+
+	def _save(self, target: Union[str, IO[bytes]], ext: str):
 		"""
-		ext = path.split(".")[-1]
+		Save the ranking in the format of a file extension.
+
+		Args:
+			target: The path or the binary stream to which the ranking will be saved.
+			ext: The extension of the format.
 
+		Raises:
+			NotImplementedError: If the file extension is not supported.
+		"""
 		if ext == "json" or ext == "jsonl":
-			self._to_json(path)
+			self._to_json(target)
 		elif ext == "csv":
-			self._to_csv(path)
+			self._to_csv(target)
+		elif ext == "parquet":
+			self._to_parquet(target)
+		elif ext == "arrow" or ext == "feather":
+			self._to_arrow(target)
 		else:
 			raise NotImplementedError(f"Extension {ext} not supported")
-		
+
+
+	@property
+	def data(self) -> pl.DataFrame:
+		""" The ranking rows. A lazy ranking collects its plan in streaming mode on first access and keeps the result. """
+		if self._data is None and self._plan is not None:
+			self._data = self._plan.collect(streaming=True)
+
+		return self._data
+
+
+	@data.setter
+	def data(self, df: pl.DataFrame):
+		self._data = df
+
 
 	def get_passage_groups(self, qid: str) -> pl.DataFrame:
 		"""
@@ -73,7 +180,53 @@ class Ranking:
 		Returns:
 			A DataFrame with the passage groups for the given query ID.
 		"""
-		return self.data.filter(pl.col("qid") == qid).sort("rank")
+		grouped = self._get_grouped()
+
+		if qid not in self._group_offsets:
+			return grouped.clear()
+
+		start, length = self._group_offsets[qid]
+		return grouped.slice(start, length)
+
+
+	def iter_groups(self) -> Iterator[Tuple[str, pl.DataFrame]]:
+		"""
+		Iterate over the passage groups of every query in one pass.
+
+		Yields:
+			Tuples of a query ID and a DataFrame with its passage groups sorted by rank.
+		"""
+		grouped = self._get_grouped()
+
+		for qid, (start, length) in self._group_offsets.items():
+			yield qid, grouped.slice(start, length)
+
+
+	def _get_grouped(self) -> pl.DataFrame:
+		"""
+		Get the ranking sorted by (qid, rank), building it and the per-query offset table on first use.
+
+		The layout is rebuilt whenever `data` is replaced, and the offset table turns every per-query
+		lookup into an O(1) slice.
+
+		Returns:
+			The ranking sorted by query ID and rank.
+		"""
+		if self._grouped is None or self._grouped_source is not self.data:
+			grouped = self.data.sort(["qid", "rank"])
+			runs = grouped["qid"].rle().struct.unnest()
+
+			lengths = runs["lengths"].cast(pl.Int64)
+			ends = lengths.cum_sum()
+
+			self._group_offsets = {
+				qid: (end - length, length)
+				for qid, length, end in zip(runs["values"].to_list(), lengths.to_list(), ends.to_list())
+			}
+			self._grouped = grouped
+			self._grouped_source = self.data
+
+		return self._grouped
 	
 	
 	def filter_by_score(self, threshold: float) -> "Ranking":
@@ -86,29 +239,253 @@ class Ranking:
 		Returns:
 			A Ranking with the rows that have a score greater than the threshold.
 		"""
-		df = self.data.filter(pl.col("score") > threshold)
+		return self._filter(pl.col("score") > threshold)
+
+
+	def top_k_per_query(self, k: int) -> "Ranking":
+		"""
+		Keep the k best ranked passages of every query.
+
+		Args:
+			k: The number of passages to keep per query.
+
+		Returns:
+			A Ranking with at most k rows per query, in their original order.
+		"""
+		# Windows over a categorical made of several chunks, such as the IDs of concatenated rankings,
+		# corrupt memory in polars 0.20. The physical codes group the rows the same way.
+		return self._filter(pl.col("rank").rank(method="ordinal").over(pl.col("qid").to_physical()) <= k)
+
+
+	def select_queries(self, qids: Iterable[str]) -> "Ranking":
+		"""
+		Keep the rows of the given queries.
+
+		Args:
+			qids: The query IDs to keep. IDs that are not in the ranking are ignored.
+
+		Returns:
+			A Ranking with the rows of the given queries, in their original order.
+		"""
+		return self._filter(pl.col("qid").is_in(list(qids)))
+
+
+	@classmethod
+	def concat(cls, rankings: List["Ranking"]) -> "Ranking":
+		"""
+		Concatenate rankings, for example the rankings of several corpus shards.
 
-		return Ranking(df.rows())
+		Each ranking has its own categorical encoding of the IDs, and IDs may also be integers or
+		enums, so the ID columns are concatenated as strings and categorized once. The result is lazy
+		if any of the rankings is.
 
+		Args:
+			rankings: The rankings to be concatenated.
 
-	def _from_json(self, path: str):
+		Returns:
+			A Ranking with the rows of all rankings, in order.
+		"""
+		if any(ranking._is_pending() for ranking in rankings):
+			frames = [ranking._plan if ranking._is_pending() else ranking.data.lazy() for ranking in rankings]
+		else:
+			frames = [ranking.data for ranking in rankings]
+
+		frames = [
+			cls._cast(frame).with_columns(pl.col("qid").cast(pl.String), pl.col("pid").cast(pl.String))
+			for frame in frames
+		]
+
+		return cls(pl.concat(frames))
+
+
+	def _filter(self, predicate: pl.Expr) -> "Ranking":
+		"""
+		Filter the ranking without leaving polars. A lazy ranking adds the predicate to its plan.
+
+		Args:
+			predicate: The predicate selecting the rows to keep.
+
+		Returns:
+			A Ranking with the selected rows and the same schema.
+		"""
+		if self._is_pending():
+			return Ranking(self._plan.filter(predicate))
+
+		return Ranking(self.data.filter(predicate))
+
+
+	def _is_pending(self) -> bool:
+		""" Check if the ranking is a query plan that has not been collected yet. """
+		return self._data is None and self._plan is not None
+
+
+	def _scan(self, path: str) -> pl.LazyFrame:
+		"""
+		Build a lazy scan of a ranking file that reads only the ranking columns.
+
+		Args:
+			path: The path to the file to be scanned.
+
+		Returns:
+			A LazyFrame over the file with the ranking schema.
+
+		Raises:
+			NotImplementedError: If the file extension is not supported.
+			ValueError: If the file is compressed.
+		"""
+		ext, compression = split_extension(path)
+		columns = ["qid", "pid", "rank", "score"]
+
+		if compression is not None:
+			raise ValueError("Compressed files can't be loaded lazily, decompress them first.")
+
+		if ext == "json" or ext == "jsonl":
+			plan = pl.scan_ndjson(path, schema={"qid": pl.String, "pid": pl.String, "rank": pl.Int32, "score": pl.Float64})
+		elif ext == "csv":
+			plan = pl.scan_csv(path, dtypes={"qid": pl.String, "pid": pl.String, "rank": pl.Int32, "score": pl.Float64})
+		elif ext == "parquet":
+			plan = pl.scan_parquet(path)
+		elif ext == "arrow" or ext == "feather":
+			plan = pl.scan_ipc(path, memory_map=True)
+		else:
+			raise NotImplementedError(f"Extension {ext} not supported")
+
+		return self._cast(plan.select(columns))
+
+
+	def _sink(self, path: str, ext: str) -> bool:
+		"""
+		Stream the query plan of a lazy ranking into a file without collecting it.
+
+		Args:
+			path: The path to the file where the ranking will be saved.
+			ext: The extension of the file.
+
+		Returns:
+			Whether the plan was streamed. Plans with operations the streaming engine doesn't support,
+			such as JSON scans or per-query truncation, are not, and have to be collected instead.
+		"""
+		try:
+			if ext == "json" or ext == "jsonl":
+				self._plan.sink_ndjson(path)
+			elif ext == "csv":
+				self._plan.sink_csv(path)
+			elif ext == "parquet":
+				self._plan.sink_parquet(path)
+			elif ext == "arrow" or ext == "feather":
+				self._plan.sink_ipc(path, compression=None)
+			else:
+				return False
+		except pl.InvalidOperationError:
+			return False
+
+		return True
+
+
+	def _from_json(self, path: Union[str, IO[bytes]]):
 		"""
 		Load ranking from a JSON file.
 
 		Args:
-			path: The path to the JSON file from which the ranking will be loaded.
+			path: The path to the JSON file, or a binary stream, from which the ranking will be loaded.
+				Streams are parsed in chunks of whole lines, so only one chunk is held as text.
 		"""
-		self.data = pl.read_ndjson(path, schema={"qid": pl.String, "pid": pl.String, "rank": pl.Int32, "score": pl.Float64})
+		schema = {"qid": pl.String, "pid": pl.String, "rank": pl.Int32, "score": pl.Float64}
+
+		if isinstance(path, str):
+			self.data = self._categorize(pl.read_ndjson(path, schema=schema))
+			return
 
+		frames = [pl.read_ndjson(io.BytesIO(lines), schema=schema) for lines in iter_line_chunks(path) if lines.strip()]
+		self.data = self._categorize(pl.concat(frames) if frames else pl.DataFrame(schema=schema))
 
-	def _from_csv(self, path: str):
+
+	def _from_csv(self, path: Union[str, IO[bytes]]):
 		"""
 		Load ranking from a CSV file.
 
 		Args:
-			path: The path to the CSV file from which the ranking will be loaded.
+			path: The path to the CSV file, or a binary stream, from which the ranking will be loaded.
+				Streams are parsed in chunks of whole lines, so only one chunk is held as text.
 		"""
-		self.data = pl.read_csv(path, columns=["qid", "pid", "rank", "score"])
+		columns = ["qid", "pid", "rank", "score"]
+		dtypes = {"qid": pl.String, "pid": pl.String, "rank": pl.Int32, "score": pl.Float64}
+
+		if isinstance(path, str):
+			self.data = self._categorize(pl.read_csv(path, columns=columns, dtypes=dtypes))
+			return
+
+		chunks = iter_line_chunks(path, quoted=True)
+		header = next(chunks, b"")
+		header, first = header.split(b"\n", 1) if b"\n" in header else (header, b"")
+		names = pl.read_csv(io.BytesIO(header), has_header=True).columns if header.strip() else columns
+
+		frames = [
+			pl.read_csv(io.BytesIO(lines), has_header=False, new_columns=names, dtypes=dtypes).select(columns)
+			for lines in chain([first], chunks) if lines.strip()
+		]
+		self.data = self._categorize(pl.concat(frames) if frames else pl.DataFrame(schema=dtypes))
+
+
+	def _from_parquet(self, path: Union[str, IO[bytes]]):
+		"""
+		Load ranking from a Parquet file.
+
+		Args:
+			path: The path to the Parquet file, or a binary stream, from which the ranking will be loaded.
+		"""
+		self.data = self._cast(pl.read_parquet(path, columns=["qid", "pid", "rank", "score"]))
+
+
+	def _from_arrow(self, path: Union[str, IO[bytes]]):
+		"""
+		Load ranking from an Arrow IPC file. The file is memory-mapped rather than copied.
+
+		Args:
+			path: The path to the Arrow file, or a binary stream, from which the ranking will be loaded.
+		"""
+		self.data = self._cast(pl.read_ipc(path, columns=["qid", "pid", "rank", "score"], rechunk=False))
+
+
+	@staticmethod
+	def _cast(df: Union[pl.DataFrame, pl.LazyFrame]) -> Union[pl.DataFrame, pl.LazyFrame]:
+		"""
+		Cast the rank and score columns to the ranking schema. Columns that already match are not copied.
+
+		Args:
+			df: The DataFrame or LazyFrame to be cast.
+
+		Returns:
+			The DataFrame with an Int32 rank column, a Float64 score column and categorical ID columns.
+		"""
+		casts = [
+			pl.col(column).cast(dtype)
+			for column, dtype in [("rank", pl.Int32), ("score", pl.Float64)]
+			if df.schema[column] != dtype
+		]
+
+		return Ranking._categorize(df.with_columns(casts) if casts else df)
+
+
+	@staticmethod
+	def _categorize(df: Union[pl.DataFrame, pl.LazyFrame]) -> Union[pl.DataFrame, pl.LazyFrame]:
+		"""
+		Store string qid and pid columns as categoricals, so each distinct ID is kept once and rows hold
+		integer codes. Columns with other dtypes, such as integer IDs, are left as they are.
+
+		Args:
+			df: The DataFrame or LazyFrame to be converted.
+
+		Returns:
+			The DataFrame with categorical ID columns.
+		"""
+		casts = [
+			pl.col(column).cast(pl.Categorical)
+			for column in ["qid", "pid"]
+			if df.schema[column] == pl.String or isinstance(df.schema[column], pl.Enum)
+		]
+
+		return df.with_columns(casts) if casts else df
 
 
 	def _from_list(self, ranking: List):
@@ -118,25 +495,45 @@ class Ranking:
 		Args:
 			ranking: The list from which the ranking will be loaded.
 		"""
-		self.data = pl.DataFrame(ranking, schema=["qid", "pid", "rank", "score"])
+		self.data = self._categorize(pl.DataFrame(ranking, schema=["qid", "pid", "rank", "score"]))
 
 
-	def _to_json(self, path: str):
+	def _to_json(self, path: Union[str, IO[bytes]]):
 		"""
 		Save the ranking to a JSON file.
 
 		Args:
-			path: The path to the file where the ranking will be saved.
+			path: The path or the binary stream to which the ranking will be saved.
 		"""
 		self.data.write_ndjson(path)
 
 
-	def _to_csv(self, path: str):
+	def _to_parquet(self, path: Union[str, IO[bytes]]):
+		"""
+		Save the ranking to a Parquet file.
+
+		Args:
+			path: The path or the binary stream to which the ranking will be saved.
+		"""
+		self.data.write_parquet(path)
+
+
+	def _to_arrow(self, path: Union[str, IO[bytes]]):
+		"""
+		Save the ranking to an uncompressed Arrow IPC file, which can be memory-mapped on load.
+
+		Args:
+			path: The path or the binary stream to which the ranking will be saved.
+		"""
+		self.data.write_ipc(path, compression="uncompressed")
+
+
+	def _to_csv(self, path: Union[str, IO[bytes]]):
 		"""
 		Save the ranking to a CSV file.
 
 		Args:
-			path: The path to the file where the ranking will be saved.
+			path: The path or the binary stream to which the ranking will be saved.
 		"""
 		self.data.write_csv(path)
 
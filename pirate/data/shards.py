@@ -0,0 +1,123 @@
+import os
+import glob
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from .compression import split_extension
+
+
+def find_shards(path: str) -> Optional[List[str]]:
+    """
+    Find the shard files of a sharded dataset.
+
+    A directory stands for every file in it, and a path with glob characters for every file it
+    matches. Hidden files and the `.npy` index files written next to lazily loaded files are skipped.
+
+    Args:
+        path: A directory, a glob pattern such as `shards/passages-*.jsonl`, or the path to a single file.
+
+    Returns:
+        The shard paths in sorted order, or None if the path is a single file.
+
+    Raises:
+        FileNotFoundError: If the directory or the pattern holds no shard.
+    """
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in os.listdir(path)]
+    elif glob.has_magic(path):
+        paths = glob.glob(path)
+    else:
+        return None
+
+    paths = sorted(
+        path for path in paths
+        if os.path.isfile(path) and not os.path.basename(path).startswith(".") and not path.endswith(".npy")
+    )
+
+    if not paths:
+        raise FileNotFoundError(f"No shards found at {path}")
+
+    return paths
+
+
+def shard_paths(path: str, num_shards: int) -> List[str]:
+    """
+    Name the shards of a file, such as `passages-00000-of-00004.jsonl` for `passages.jsonl`, and create
+    their directory.
+
+    The shards sort in order, so the directory or a glob like `passages-*.jsonl` loads them back.
+
+    Args:
+        path: The path to the unsharded file.
+        num_shards: The number of shards.
+
+    Returns:
+        The path of every shard, next to the unsharded path.
+    """
+    directory, name = os.path.split(path)
+    ext, compression = split_extension(path)
+
+    suffix = ext if compression is None else f"{ext}.{compression}"
+    stem = name[:-len(suffix) - 1] if name.endswith(f".{suffix}") else name
+
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    return [
+        os.path.join(directory, f"{stem}-{shard:05d}-of-{num_shards:05d}.{suffix}")
+        for shard in range(num_shards)
+    ]
+
+
+def shard_bounds(num_rows: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split rows into contiguous shards whose sizes differ by at most one row.
+
+    Args:
+        num_rows: The number of rows to be split.
+        num_shards: The number of shards.
+
+    Returns:
+        The offset and the length of every shard.
+
+    Raises:
+        ValueError: If the number of shards is not positive.
+    """
+    if num_shards < 1:
+        raise ValueError(f"The number of shards must be positive, got {num_shards}.")
+
+    size, remainder = divmod(num_rows, num_shards)
+    bounds = []
+
+    offset = 0
+    for shard in range(num_shards):
+        length = size + (shard < remainder)
+        bounds.append((offset, length))
+        offset += length
+
+    return bounds
+
+
+def map_shards(function: Callable[..., Any], *iterables: Iterable) -> List[Any]:
+    """
+    Apply a function to every shard on a thread pool, one thread per core.
+
+    polars, pyarrow and numpy release the GIL while they parse and write files, so the shards are
+    read or written in parallel.
+
+    Args:
+        function: The function to be applied.
+        iterables: The arguments of every call, as in `map`.
+
+    Returns:
+        The results in shard order.
+    """
+    arguments = list(zip(*iterables))
+    num_workers = min(len(arguments), os.cpu_count() or 1)
+
+    if num_workers <= 1:
+        return [function(*args) for args in arguments]
+
+    with ThreadPoolExecutor(num_workers) as executor:
+        return list(executor.map(function, *zip(*arguments)))
@@ -0,0 +1,387 @@
+import os
+import json
+import mmap
+import numpy as np
+import pyarrow as pa
+
+from abc import abstractmethod
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .index import HashIndex, hash_text
+
+
+class DiskStore(MutableMapping):
+    """
+    DiskStore is an abstract read-mostly mapping whose records stay on disk.
+
+    Records are fetched when they are accessed. Records added at runtime are kept in memory on top
+    of the on-disk ones, so `Passages.add` keeps working.
+    """
+
+    def __init__(self, path: str, id_key: str, content_key: str):
+        """
+        Initialize the DiskStore object.
+
+        Args:
+            path: The path to the file backing the store.
+            id_key: The key used for the id in the file.
+            content_key: The key used for the content in the file.
+        """
+        self.path = path
+        self.id_key = id_key
+        self.content_key = content_key
+
+        self._added: Dict[Any, Any] = {}
+        self._open()
+
+
+    @abstractmethod
+    def _open(self):
+        """ Open the backing file and build or load the ID index. """
+        pass
+
+
+    @abstractmethod
+    def _get_id(self, row: int) -> Any:
+        """ Return the ID stored at a row. """
+        pass
+
+
+    @abstractmethod
+    def _get_content(self, row: int) -> Any:
+        """ Return the content stored at a row. """
+        pass
+
+
+    @abstractmethod
+    def _iter_ids(self) -> Iterator[Any]:
+        """ Return an iterator over the on-disk IDs in file order. """
+        pass
+
+
+    @abstractmethod
+    def _num_rows(self) -> int:
+        """ Return the number of on-disk records. """
+        pass
+
+
+    def _index_path(self) -> str:
+        """ Return the path of the ID index saved next to the backing file. """
+        return f"{self.path}.ids.npy"
+
+
+    def _is_fresh(self, path: str) -> bool:
+        """ Check if a file saved next to the backing file exists and is not older than it. """
+        return os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(self.path)
+
+
+    def _load_id_index(self) -> HashIndex:
+        """
+        Load the ID index saved next to the backing file, or build and save it if it is missing or stale.
+
+        Returns:
+            The ID index.
+        """
+        index_path = self._index_path()
+
+        if self._is_fresh(index_path):
+            return HashIndex.load(index_path)
+
+        id_index = HashIndex.build(self._iter_ids())
+        try:
+            id_index.save(index_path)
+        except OSError:
+            pass
+
+        return id_index
+
+
+    def _find_row(self, key: Any) -> int:
+        """ Return the row of an on-disk ID, or -1 if it is not stored. """
+        for row in self.id_index.lookup(key):
+            if self._get_id(row) == key:
+                return row
+
+        return -1
+
+
+    def __getitem__(self, key):
+        """ Get the content of an ID. """
+        if key in self._added:
+            return self._added[key]
+
+        row = self._find_row(key)
+        if row < 0:
+            raise KeyError(key)
+
+        return self._get_content(row)
+
+
+    def __contains__(self, key):
+        """ Check if an ID is stored, from the ID index alone, without reading its content. """
+        return key in self._added or self._find_row(key) >= 0
+
+
+    def __setitem__(self, key, value):
+        """ Add a new record. On-disk records can't be overwritten. """
+        if key not in self._added and self._find_row(key) >= 0:
+            raise TypeError(f"{type(self).__name__} does not support overwriting on-disk records")
+
+        self._added[key] = value
+
+
+    def __delitem__(self, key):
+        """ Delete a record added at runtime. On-disk records can't be deleted. """
+        if key not in self._added:
+            raise TypeError(f"{type(self).__name__} does not support deleting on-disk records")
+
+        del self._added[key]
+
+
+    def __iter__(self):
+        """ Return an iterator over the IDs. """
+        yield from self._iter_ids()
+        yield from self._added
+
+
+    def __len__(self):
+        """ Get the number of records. """
+        return self._num_rows() + len(self._added)
+
+
+    def __getstate__(self):
+        """ Pickle the location of the data rather than the data, so worker processes map the same file. """
+        return {
+            "path": self.path,
+            "id_key": self.id_key,
+            "content_key": self.content_key,
+            "_added": self._added
+        }
+
+
+    def __setstate__(self, state):
+        """ Reopen the backing file after unpickling. """
+        self.__dict__.update(state)
+        self._open()
+
+
+class ArrowStore(DiskStore):
+    """
+    ArrowStore is a mapping over a memory-mapped Arrow IPC file.
+
+    The content column stays in the file's single text buffer with its offsets array, so processes
+    that open the same file share pages and start up without parsing anything.
+    """
+
+    def _open(self):
+        """ Memory-map the Arrow file and load the ID index. """
+        source = pa.memory_map(self.path, "r")
+        table = pa.ipc.open_file(source).read_all()
+
+        self.ids = table.column(self.id_key)
+        self.contents = table.column(self.content_key)
+        self.id_index = self._load_id_index()
+
+
+    def _get_id(self, row: int) -> Any:
+        return self.ids[row].as_py()
+
+
+    def _get_content(self, row: int) -> Any:
+        return self.contents[row].as_py()
+
+
+    def _iter_ids(self) -> Iterator[Any]:
+        for chunk in self.ids.chunks:
+            yield from chunk.to_pylist()
+
+
+    def _num_rows(self) -> int:
+        return len(self.ids)
+
+
+class JsonlStore(DiskStore):
+    """
+    JsonlStore is a mapping over a JSONL file that parses a record only when it is accessed.
+
+    The file is scanned once to record the byte offset of every line. The offsets and the ID index
+    are saved next to the file, so later loads only memory-map them.
+    """
+
+    def _open(self):
+        """ Memory-map the JSONL file and load or build its offset and ID indexes. """
+        with open(self.path, "rb") as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(self.path) else b""
+
+        offsets_path = f"{self.path}.offsets.npy"
+        if self._is_fresh(offsets_path) and self._is_fresh(self._index_path()):
+            self.offsets = np.load(offsets_path, mmap_mode="r")
+            self.id_index = HashIndex.load(self._index_path())
+            return
+
+        self.offsets, hashes = self._scan()
+        self.id_index = HashIndex.from_hashes(hashes)
+
+        try:
+            with open(offsets_path, "wb") as f:
+                np.save(f, self.offsets)
+            self.id_index.save(self._index_path())
+        except OSError:
+            pass
+
+
+    def _scan(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scan the file once for the start offset and the ID hash of every record.
+
+        Returns:
+            The record offsets followed by the file size, and the ID hashes.
+        """
+        offsets = []
+        hashes = []
+
+        position = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    offsets.append(position)
+                    hashes.append(hash_text(json.loads(line)[self.id_key]))
+                position += len(line)
+        offsets.append(position)
+
+        return np.array(offsets, dtype=np.int64), np.array(hashes, dtype=np.uint64)
+
+
+    def _read_record(self, row: int) -> Dict:
+        """ Parse the record at a row. """
+        return json.loads(self._buffer[self.offsets[row]:self.offsets[row + 1]])
+
+
+    def _get_id(self, row: int) -> Any:
+        return self._read_record(row)[self.id_key]
+
+
+    def _get_content(self, row: int) -> Any:
+        return self._read_record(row)[self.content_key]
+
+
+    def _iter_ids(self) -> Iterator[Any]:
+        for row in range(self._num_rows()):
+            yield self._get_id(row)
+
+
+    def _num_rows(self) -> int:
+        return len(self.offsets) - 1
+
+
+class ShardedStore(MutableMapping):
+    """
+    ShardedStore is a mapping over the on-disk stores of several shard files.
+
+    A shard is only opened, which loads or builds its index files, when a lookup or an iteration
+    reaches it. Lookups try the shards in order. Records added at runtime are kept in memory.
+    """
+
+    STORES = {
+        "json": JsonlStore,
+        "jsonl": JsonlStore,
+        "arrow": ArrowStore,
+        "feather": ArrowStore
+    }
+
+    def __init__(self, paths: List[str], id_key: str, content_key: str):
+        """
+        Initialize the ShardedStore object.
+
+        Args:
+            paths: The paths to the shard files, JSONL or Arrow.
+            id_key: The key used for the id in the files.
+            content_key: The key used for the content in the files.
+        """
+        self.paths = paths
+        self.id_key = id_key
+        self.content_key = content_key
+
+        self._added: Dict[Any, Any] = {}
+        self._stores: List[Optional[DiskStore]] = [None] * len(paths)
+
+
+    def _store(self, shard: int) -> DiskStore:
+        """ Return the store of a shard, opening it on first use. """
+        if self._stores[shard] is None:
+            path = self.paths[shard]
+            store_class = self.STORES[os.path.basename(path).rsplit(".", 1)[-1]]
+            self._stores[shard] = store_class(path, self.id_key, self.content_key)
+
+        return self._stores[shard]
+
+
+    def _find_shard(self, key: Any) -> int:
+        """ Return the shard storing an on-disk ID, or -1 if no shard does. """
+        for shard in range(len(self.paths)):
+            if self._store(shard)._find_row(key) >= 0:
+                return shard
+
+        return -1
+
+
+    def __getitem__(self, key):
+        """ Get the content of an ID. """
+        if key in self._added:
+            return self._added[key]
+
+        shard = self._find_shard(key)
+        if shard < 0:
+            raise KeyError(key)
+
+        return self._store(shard)[key]
+
+
+    def __contains__(self, key):
+        """ Check if an ID is stored in any shard, without reading its content. """
+        return key in self._added or self._find_shard(key) >= 0
+
+
+    def __setitem__(self, key, value):
+        """ Add a new record. On-disk records can't be overwritten. """
+        if key not in self._added and self._find_shard(key) >= 0:
+            raise TypeError(f"{type(self).__name__} does not support overwriting on-disk records")
+
+        self._added[key] = value
+
+
+    def __delitem__(self, key):
+        """ Delete a record added at runtime. On-disk records can't be deleted. """
+        if key not in self._added:
+            raise TypeError(f"{type(self).__name__} does not support deleting on-disk records")
+
+        del self._added[key]
+
+
+    def __iter__(self):
+        """ Return an iterator over the IDs, shard by shard. """
+        for shard in range(len(self.paths)):
+            yield from self._store(shard)
+        yield from self._added
+
+
+    def __len__(self):
+        """ Get the number of records. """
+        return sum(len(self._store(shard)) for shard in range(len(self.paths))) + len(self._added)
+
+
+    def __getstate__(self):
+        """ Pickle the shard paths rather than the opened stores. """
+        return {
+            "paths": self.paths,
+            "id_key": self.id_key,
+            "content_key": self.content_key,
+            "_added": self._added
+        }
+
+
+    def __setstate__(self, state):
+        """ Reopen shards on demand after unpickling. """
+        self.__dict__.update(state)
+        self._stores = [None] * len(self.paths)
@@ -1,135 +1,566 @@
+import gc
+import io
 import json
+import contextlib
+import numpy as np
+import polars as pl
+import pyarrow as pa
 
-from typing import List, Union
+from typing import IO, Dict, Iterator, List, Optional, Union
+
+from .compression import iter_line_chunks, open_compressed, read_compressed, split_extension, stream_compressed
+from .shards import find_shards, map_shards, shard_bounds, shard_paths
+from .vocab import Vocabulary
 
 class Triples:
     """
-    Triples is a class that handles triple data in different formats (json, jsonl, csv).
+    Triples is a class that handles triple data in different formats (json, jsonl, csv, parquet, arrow, npz).
+
+    Triples are stored as an integer matrix with one row per triple. The first column holds query codes
+    interned in `qid_vocab`, and the remaining columns hold passage codes interned in `pid_vocab`.
     """
 
-    def __init__(self, triples: Union[str, List[List[str]]]):
+    def __init__(
+        self,
+        triples: Union[str, List[List[str]]],
+        qid_vocab: Optional[Vocabulary] = None,
+        pid_vocab: Optional[Vocabulary] = None
+    ):
         """
         Initialize the Triples object.
 
         Args:
-            triples: The triples to be loaded. It can be a string (path to a file) or a list of triples.
+            triples: The triples to be loaded. It can be a string (path to a file, directory or glob
+                pattern) or a list of triples.
+            qid_vocab: The vocabulary used to intern query IDs. Defaults to a new vocabulary.
+            pid_vocab: The vocabulary used to intern passage IDs. Defaults to a new vocabulary.
+        """
+        self.qid_vocab = qid_vocab if qid_vocab is not None else Vocabulary()
+        self.pid_vocab = pid_vocab if pid_vocab is not None else Vocabulary()
+
+        self.codes = self.load(triples)
+
+
+    @classmethod
+    def from_codes(cls, codes: np.ndarray, qid_vocab: Vocabulary, pid_vocab: Vocabulary) -> "Triples":
+        """
+        Create a Triples object from an interned code matrix without copying it.
+
+        Args:
+            codes: The code matrix with one row per triple.
+            qid_vocab: The vocabulary the query codes refer to.
+            pid_vocab: The vocabulary the passage codes refer to.
+
+        Returns:
+            A Triples object over the codes.
         """
-        self.triples = self.load(triples)
+        triples = cls.__new__(cls)
+        triples.qid_vocab = qid_vocab
+        triples.pid_vocab = pid_vocab
+        triples.codes = codes
+
+        return triples
 
 
-    def load(self, triples: Union[str, List[List[str]]]) -> List[List[str]]:
+    def load(self, triples: Union[str, List[List[str]]]) -> np.ndarray:
         """
-        Load triples from a file or a list.
+        Load triples from a file or a list. Files ending in `.gz` or `.zst` are decompressed while
+        they are read.
+
+        A directory or a glob pattern loads every shard file it holds, in sorted order. The shards are
+        read in parallel and interned into the shared vocabularies in order.
 
         Args:
-            triples: The triples to be loaded. It can be a string (path to a file) or a list of triples.
+            triples: The triples to be loaded. It can be a string (path to a file, directory or glob
+                pattern) or a list of triples.
+
+        Returns:
+            The interned code matrix of the triples.
 
         Raises:
             NotImplementedError: If the file extension or data type is not supported.
+            FileNotFoundError: If a directory or glob pattern holds no file.
         """
         if isinstance(triples, str):
-            ext = triples.split(".")[-1]
+            paths = find_shards(triples)
 
-            if ext == "json" or ext == "jsonl":
-                return self._from_json(triples)
-            elif ext == "csv":
-                return self._from_csv(triples)
-            else:
-                raise NotImplementedError(f"Extension {ext} not supported")
+            if paths is None:
+                return self._encode(self._read(triples))
+
+            codes = [self._encode(shard) for shard in map_shards(self._read, paths)]
+            return self._stack_shards(codes)
 
         elif isinstance(triples, list):
-            return triples
+            return self._encode_rows(triples)
         else:
             raise NotImplementedError(f"Type {type(triples)} not supported")
-    
 
-    def save(self, path: str):
+
+    def save(self, path: str, num_shards: Optional[int] = None):
         """
-        Save the triples to a file.
+        Save the triples to a file. Paths ending in `.gz` or `.zst`, such as `triples.jsonl.zst`, are
+        compressed.
 
         Args:
             path: The path to the file where the triples will be saved.
+            num_shards: The number of files to split the triples into, written in parallel and named like
+                `triples-00000-of-00004.jsonl` next to `path`. Defaults to a single file.
 
         Raises:
             NotImplementedError: If the file extension is not supported.
+            ValueError: If the number of shards is not positive.
+        """
+        if num_shards is not None:
+            bounds = shard_bounds(len(self), num_shards)
+            shards = [self.filter(slice(offset, offset + length)) for offset, length in bounds]
+            map_shards(Triples.save, shards, shard_paths(path, num_shards))
+            return
+
+        ext, compression = split_extension(path)
+
+        if compression is None:
+            self._save(path, ext)
+        else:
+            with open_compressed(path, compression) as f:
+                self._save(f, ext)
+
+
+    def _save(self, target: Union[str, IO[bytes]], ext: str):
         """
-        ext = path.split(".")[-1]
+        Save the triples in the format of a file extension.
+
+        Args:
+            target: The path or the binary stream to which the triples will be saved.
+            ext: The extension of the format.
 
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+        """
         if ext == "json" or ext == "jsonl":
-            self._to_json(path)
+            self._to_json(target)
         elif ext == "csv":
-            self._to_csv(path)
+            self._to_csv(target)
+        elif ext == "parquet":
+            self._to_frame().write_parquet(target)
+        elif ext == "arrow" or ext == "feather":
+            self._to_frame().write_ipc(target)
+        elif ext == "npz":
+            self._to_npz(target)
         else:
             raise NotImplementedError(f"Extension {ext} not supported")
-        
 
-    def _from_json(self, path: str) -> List[List[str]]:
+
+    def dedup(self) -> "Triples":
+        """
+        Remove duplicate triples, keeping the first occurrence of each.
+
+        Returns:
+            A Triples object with the unique triples in their original order.
+        """
+        first = (
+            pl.DataFrame(self.codes, schema=self._columns(self.width), orient="row")
+            .with_row_index()
+            .unique(subset=self._columns(self.width), keep="first", maintain_order=True)
+        )
+        return self.filter(first["index"].to_numpy())
+
+
+    def filter(self, mask: np.ndarray) -> "Triples":
         """
-        Load triples from a JSON file.
+        Select triples with a boolean mask or an array of row indices.
 
         Args:
-            path: The path to the JSON file from which the triples will be loaded.
+            mask: A boolean array with one entry per triple, or an array of row indices.
 
         Returns:
-            A list of triples.
+            A Triples object with the selected triples.
+        """
+        return self.from_codes(self.codes[mask], self.qid_vocab, self.pid_vocab)
+
+
+    def shuffle(self, seed: Optional[int] = None) -> "Triples":
+        """
+        Shuffle the triples.
+
+        Args:
+            seed: The seed of the random permutation.
+
+        Returns:
+            A Triples object with the triples in random order.
+        """
+        permutation = np.random.default_rng(seed).permutation(len(self))
+        return self.filter(permutation)
+
+
+    @property
+    def width(self) -> int:
+        """ The number of elements in each triple, 2 for pairs. """
+        return self.codes.shape[1]
+
+
+    @property
+    def triples(self) -> List[List[str]]:
+        """ The triples as a list of lists of IDs. """
+        return self._decode(self.codes)
+
+
+    def _read(self, path: str) -> Union[pl.DataFrame, Dict[str, np.ndarray]]:
+        """
+        Read a triples file without interning it, so several files can be read at once.
+
+        Args:
+            path: The path to the file from which the triples will be read.
+
+        Returns:
+            A DataFrame with one column per element, or the arrays of a NumPy archive.
+
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+        """
+        ext, compression = split_extension(path)
+
+        if ext in ("json", "jsonl", "csv"):
+            parse = self._from_csv if ext == "csv" else self._from_json
+            if compression is None:
+                return parse(path)
+
+            with stream_compressed(path, compression) as stream:
+                return parse(stream)
+
+        source = path if compression is None else read_compressed(path, compression)
+
+        if ext == "parquet":
+            return pl.read_parquet(source)
+        elif ext == "arrow" or ext == "feather":
+            return pl.read_ipc(source, rechunk=False)
+        elif ext == "npz":
+            with np.load(source) as archive:
+                return {name: archive[name] for name in ("codes", "qids", "pids")}
+        else:
+            raise NotImplementedError(f"Extension {ext} not supported")
+
+
+    def _encode(self, data: Union[pl.DataFrame, Dict[str, np.ndarray]]) -> np.ndarray:
+        """
+        Intern triples read by `_read`.
+
+        Args:
+            data: A DataFrame with one column per element, or the arrays of a NumPy archive.
+
+        Returns:
+            The interned code matrix of the triples.
+        """
+        if isinstance(data, pl.DataFrame):
+            return self._encode_frame(data)
+
+        return self._encode_archive(data)
+
+
+    def _stack_shards(self, codes: List[np.ndarray]) -> np.ndarray:
+        """
+        Stack the code matrices of several shards. Empty shards are skipped, since their width is unknown.
+
+        Args:
+            codes: The code matrix of every shard.
+
+        Returns:
+            The code matrix of all triples.
+
+        Raises:
+            ValueError: If the shards don't all have the same number of elements per triple.
         """
-        with open(path, "r") as f:
-            return [json.loads(line) for line in f]
-    
+        codes = [shard for shard in codes if len(shard)] or codes[:1]
 
-    def _from_csv(self, path: str) -> List[List[str]]:
+        if len({shard.shape[1] for shard in codes}) > 1:
+            raise ValueError("All triples must have the same number of elements.")
+
+        return np.concatenate(codes)
+
+
+    def _from_json(self, path: Union[str, IO[bytes]], chunk_size: int = 1 << 24) -> pl.DataFrame:
         """
-        Load triples from a CSV file.
+        Load triples from a JSON file with one array per line.
+
+        The file is read in chunks of whole lines. Every chunk is parsed with one `json.loads` call and
+        turned into Arrow columns, so only one chunk is held as Python objects. The garbage collector
+        is paused meanwhile, since it would otherwise scan the new lists over and over. IDs keep their
+        JSON type, except that a file mixing integer and string IDs loads them all as strings.
 
         Args:
-            path: The path to the CSV file from which the triples will be loaded.
+            path: The path to the JSON file, or a binary stream, from which the triples will be loaded.
+            chunk_size: The number of bytes read at once. Defaults to 16 MiB.
+
+        Returns:
+            A DataFrame with one column per element.
+
+        Raises:
+            ValueError: If the triples don't all have the same length.
+        """
+        chunks = []
+        collecting = gc.isenabled()
+        gc.disable()
+
+        try:
+            with (open(path, "rb") if isinstance(path, str) else contextlib.nullcontext(path)) as f:
+                for lines in iter_line_chunks(f, chunk_size):
+                    body = b",".join(filter(bytes.strip, lines.split(b"\n")))
+                    if body:
+                        chunks.append(self._json_columns(json.loads(b"[" + body + b"]")))
+        finally:
+            if collecting:
+                gc.enable()
+
+        if not chunks:
+            return pl.DataFrame()
+        if len({len(chunk) for chunk in chunks}) > 1:
+            raise ValueError("All triples must have the same number of elements.")
+
+        if len({array.type for chunk in chunks for array in chunk}) > 1:
+            chunks = [[array.cast(pa.string()) for array in chunk] for chunk in chunks]
+
+        columns = [pl.from_arrow(pa.chunked_array(column)) for column in zip(*chunks)]
+        return pl.DataFrame([column.alias(name) for column, name in zip(columns, self._columns(len(columns)))])
+
+
+    @staticmethod
+    def _json_columns(triples: List[List]) -> List[pa.Array]:
+        """
+        Turn parsed triples into one Arrow array per element.
+
+        Args:
+            triples: The triples of a chunk.
+
+        Returns:
+            An int64 array per element if every ID is an integer, and a string array otherwise.
+
+        Raises:
+            ValueError: If the triples don't all have the same length.
+        """
+        if len(set(map(len, triples))) > 1:
+            raise ValueError("All triples must have the same number of elements.")
+
+        columns = list(zip(*triples))
+        try:
+            return [pa.array(column, type=pa.int64()) for column in columns]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+
+        try:
+            return [pa.array(column, type=pa.string()) for column in columns]
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return [pa.array([None if value is None else str(value) for value in column], type=pa.string()) for column in columns]
+
+
+    def _from_csv(self, path: Union[str, IO[bytes]]) -> pl.DataFrame:
+        """
+        Load triples from a CSV file without a header.
+
+        Args:
+            path: The path to the CSV file, or a binary stream, from which the triples will be loaded.
+                Streams are parsed in chunks of whole lines.
+
+        Returns:
+            A DataFrame with one string column per element.
+        """
+        if isinstance(path, str):
+            df = pl.read_csv(path, has_header=False, infer_schema_length=0, raise_if_empty=False)
+        else:
+            frames = [
+                pl.read_csv(io.BytesIO(lines), has_header=False, infer_schema_length=0, raise_if_empty=False)
+                for lines in iter_line_chunks(path, quoted=True)
+            ]
+            df = pl.concat([frame for frame in frames if frame.width]) if any(frame.width for frame in frames) else pl.DataFrame()
+
+        return df.with_columns(pl.all().str.strip_chars())
+
+
+    def _encode_archive(self, archive: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        Intern triples from the arrays of a NumPy archive written by `save`.
+
+        Args:
+            archive: The code matrix and the query and passage IDs it refers to.
+
+        Returns:
+            The interned code matrix of the triples.
+        """
+        codes = archive["codes"]
+        qid_codes = self.qid_vocab.encode_many(archive["qids"].tolist())
+        pid_codes = self.pid_vocab.encode_many(archive["pids"].tolist())
+
+        columns = [qid_codes[codes[:, 0]]] + [pid_codes[codes[:, i]] for i in range(1, codes.shape[1])]
+        return self._stack(columns, codes.shape[1])
+
+
+    def _encode_rows(self, rows: List[List[str]]) -> np.ndarray:
+        """
+        Intern a list of triples.
+
+        Args:
+            rows: The triples to be interned.
+
+        Returns:
+            The interned code matrix of the triples.
+
+        Raises:
+            ValueError: If the triples don't all have the same length.
+        """
+        if not rows:
+            return self._stack([], 3)
+
+        width = len(rows[0])
+        if any(len(row) != width for row in rows):
+            raise ValueError("All triples must have the same number of elements.")
+
+        columns = [self._vocab(i).encode_many(column) for i, column in enumerate(zip(*rows))]
+        return self._stack(columns, width)
+
+
+    def _encode_frame(self, df: pl.DataFrame) -> np.ndarray:
+        """
+        Intern triples from a DataFrame with one column per element.
+
+        Args:
+            df: The DataFrame from which the triples will be interned.
+
+        Returns:
+            The interned code matrix of the triples.
+        """
+        columns = [self._vocab(i).encode_many(df.to_series(i)) for i in range(df.width)]
+        return self._stack(columns, df.width or 3)
+
+
+    def _stack(self, columns: List[np.ndarray], width: int) -> np.ndarray:
+        """
+        Stack code columns into a matrix, using int32 codes while both vocabularies fit.
+
+        Args:
+            columns: The code columns.
+            width: The number of columns, used when there are no triples.
+
+        Returns:
+            The code matrix.
+        """
+        dtype = np.int32 if max(len(self.qid_vocab), len(self.pid_vocab)) < 2**31 else np.int64
+
+        if not columns:
+            return np.empty((0, width), dtype=dtype)
+
+        return np.stack(columns, axis=1).astype(dtype, copy=False)
+
+
+    def _vocab(self, column: int) -> Vocabulary:
+        """ Return the vocabulary of a column. """
+        return self.qid_vocab if column == 0 else self.pid_vocab
+
+
+    def _decode(self, codes: np.ndarray) -> List[List[str]]:
+        """
+        Decode a code matrix into a list of triples.
+
+        Args:
+            codes: The code matrix to be decoded.
 
         Returns:
             A list of triples.
         """
-        with open(path, "r") as f:
-            return [[item.strip() for item in line.split(",")] for line in f]
-    
+        columns = [self._vocab(i).decode_many(codes[:, i]).to_list() for i in range(codes.shape[1])]
+        return [list(row) for row in zip(*columns)]
 
-    def _to_json(self, path: str) -> None:
+
+    def _to_frame(self) -> pl.DataFrame:
+        """
+        Convert the triples to a DataFrame with one string column per element.
+
+        Returns:
+            A DataFrame with the columns `qid`, `pos_pid` and `neg_pid`, or `qid` and `pid` for pairs.
+        """
+        return pl.DataFrame([
+            self._vocab(i).decode_many(self.codes[:, i]).cast(pl.String).alias(column)
+            for i, column in enumerate(self._columns(self.width))
+        ])
+
+
+    @staticmethod
+    def _columns(width: int) -> List[str]:
+        """ Return the column names used for triples of the given width. """
+        if width == 2:
+            return ["qid", "pid"]
+        if width == 3:
+            return ["qid", "pos_pid", "neg_pid"]
+
+        return ["qid", "pos_pid"] + [f"neg_pid_{i}" for i in range(1, width - 1)]
+
+
+    def _to_json(self, path: Union[str, IO[bytes]]) -> None:
         """
         Save the triples to a JSON file.
 
         Args:
-            path: The path to the file where the triples will be saved.
+            path: The path or the binary stream to which the triples will be saved.
         """
-        with open(path, "w") as f:
-            for triple in self.triples:
-                f.write(json.dumps(list(triple)) + "\n")
+        if isinstance(path, str):
+            with open(path, "wb") as f:
+                self._to_json(f)
+            return
+
+        for start in range(0, len(self), 65536):
+            lines = "".join(json.dumps(triple) + "\n" for triple in self._decode(self.codes[start:start + 65536]))
+            path.write(lines.encode("utf-8"))
 
 
-    def _to_csv(self, path: str) -> None:
+    def _to_csv(self, path: Union[str, IO[bytes]]) -> None:
         """
         Save the triples to a CSV file.
 
         Args:
-            path: The path to the file where the triples will be saved.
+            path: The path or the binary stream to which the triples will be saved.
         """
-        with open(path, "w") as f:
-            for triple in self.triples:
-                f.write(f"{','.join(triple)}\n")
+        self._to_frame().write_csv(path, include_header=False)
 
 
-    def __getitem__(self, index: int) -> List[str]:
-        """ Return the triple at the given index. """
-        return self.triples[index]
-    
+    def _to_npz(self, path: Union[str, IO[bytes]]) -> None:
+        """
+        Save the code matrix and both vocabularies to a NumPy archive.
+
+        Args:
+            path: The path or the binary stream to which the triples will be saved.
+        """
+        arrays = {
+            "codes": self.codes,
+            "qids": np.array(self.qid_vocab.ids),
+            "pids": np.array(self.pid_vocab.ids)
+        }
+
+        if isinstance(path, str):
+            with open(path, "wb") as f:
+                np.savez(f, **arrays)
+        else:
+            # Zip archives can't be written to non-seekable streams, so the archive is built in memory.
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            path.write(buffer.getbuffer())
+
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[List[str], List[List[str]]]:
+        """ Return the triple at the given index, or a list of triples for a slice. """
+        if isinstance(index, slice):
+            return self._decode(self.codes[index])
+
+        return self._decode(self.codes[[index]])[0]
+
 
     def __repr__(self):
         """ Return the string representation of the Triples object. """
-        return f"Triples({len(self.triples)} triples)"
-    
+        return f"Triples({len(self)} triples)"
+
 
     def __len__(self):
         """ Return the number of triples. """
-        return len(self.triples)
-    
-    
-    def __iter__(self):
+        return self.codes.shape[0]
+
+
+    def __iter__(self) -> Iterator[List[str]]:
         """ Return an iterator over the triples. """
-        return iter(self.triples)
+        for start in range(0, len(self), 65536):
+            yield from self._decode(self.codes[start:start + 65536])
@@ -0,0 +1,353 @@
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+)
+
+from .index import HashIndex
+
+
+class Vocabulary:
+    """
+    Vocabulary interns external IDs as dense integer codes.
+
+    Each distinct ID is stored once, so larger structures can hold compact integer arrays instead of
+    repeating the ID strings.
+    """
+
+    def __init__(self, ids: Optional[Iterable[Any]] = None):
+        """
+        Initialize the Vocabulary object.
+
+        Args:
+            ids: The IDs to be interned, in code order.
+        """
+        self._ids: List[Any] = []
+        self._index: Dict[Any, int] = {}
+        self._all_strings = True
+
+        self._series: Optional[pl.Series] = None
+        self._enum: Optional[pl.Enum] = None
+
+        for id_ in ids or []:
+            self.add(id_)
+
+
+    def add(self, id_: Any) -> int:
+        """
+        Intern an ID.
+
+        Args:
+            id_: The ID to be interned.
+
+        Returns:
+            The code of the ID. IDs that are already interned keep their code.
+        """
+        code = self._index.get(id_)
+
+        if code is None:
+            code = len(self._ids)
+            self._index[id_] = code
+            self._ids.append(id_)
+            self._all_strings = self._all_strings and isinstance(id_, str)
+
+        return code
+
+
+    def encode(self, id_: Any) -> int:
+        """
+        Get the code of an interned ID.
+
+        Args:
+            id_: The ID to be encoded.
+
+        Returns:
+            The code of the ID.
+
+        Raises:
+            KeyError: If the ID is not interned.
+        """
+        return self._index[id_]
+
+
+    def decode(self, code: int) -> Any:
+        """
+        Get the ID of a code.
+
+        Args:
+            code: The code to be decoded.
+
+        Returns:
+            The ID of the code.
+        """
+        return self._ids[code]
+
+
+    def encode_many(self, ids: Iterable[Any]) -> np.ndarray:
+        """
+        Intern many IDs at once.
+
+        String series are interned in bulk through a categorical cast, so only the distinct IDs pass
+        through Python.
+
+        Args:
+            ids: The IDs to be interned.
+
+        Returns:
+            An int64 array with the code of every ID.
+        """
+        if isinstance(ids, pl.Series) and ids.dtype == pl.String:
+            if pl.using_string_cache():
+                uniques = ids.unique(maintain_order=True)
+                mapping = pl.DataFrame({
+                    "id": uniques,
+                    "code": pl.Series(self._add_distinct(uniques.to_list()), dtype=pl.Int64)
+                })
+                return ids.to_frame("id").join(mapping, on="id", how="left")["code"].to_numpy()
+
+            categories = ids.cast(pl.Categorical)
+            local_codes = categories.to_physical().to_numpy()
+            codes = self._add_distinct(categories.cat.get_categories().to_list())
+
+            return codes[local_codes]
+
+        return np.fromiter((self.add(id_) for id_ in ids), dtype=np.int64)
+
+
+    def _add_distinct(self, ids: List[str]) -> np.ndarray:
+        """
+        Intern distinct string IDs in bulk, with the dictionary and list updates done in C loops.
+
+        Args:
+            ids: The IDs to be interned, each at most once.
+
+        Returns:
+            An int64 array with the code of every ID.
+        """
+        new_ids = [id_ for id_ in ids if id_ not in self._index]
+        self._index.update(zip(new_ids, range(len(self._ids), len(self._ids) + len(new_ids))))
+        self._ids.extend(new_ids)
+
+        return np.fromiter(map(self._index.__getitem__, ids), dtype=np.int64, count=len(ids))
+
+
+    def decode_many(self, codes: np.ndarray) -> pl.Series:
+        """
+        Get the IDs of many codes at once.
+
+        String IDs come back as a Categorical Series whose physical values are the codes themselves, so
+        no string is copied per row.
+
+        Args:
+            codes: The codes to be decoded.
+
+        Returns:
+            A Series with the ID of every code.
+        """
+        if self._all_strings and self._ids:
+            if self._enum is None or len(self._enum.categories) != len(self._ids):
+                self._enum = pl.Enum(self._ids)
+
+            return pl.Series("id", np.asarray(codes, dtype=np.uint32)).cast(self._enum).cast(pl.Categorical)
+
+        if self._series is None or len(self._series) != len(self._ids):
+            self._series = pl.Series("id", self._ids)
+
+        return self._series.gather(np.asarray(codes, dtype=np.int64))
+
+
+    def save(self, path: str):
+        """
+        Save the vocabulary as an Arrow file of the IDs in code order, `{path}.arrow`, and a hash index
+        of the IDs, `{path}.index.npy`. Both can be memory-mapped with `MappedVocabulary`.
+
+        Args:
+            path: The path prefix of the files.
+        """
+        _save_ids(pa.array(self._ids), path)
+
+
+    @property
+    def ids(self) -> List[Any]:
+        """ The interned IDs in code order. """
+        return self._ids
+
+
+    def __getitem__(self, code: int) -> Any:
+        """ Get the ID of a code. """
+        return self._ids[code]
+
+
+    def __contains__(self, id_: Any) -> bool:
+        """ Check if an ID is interned. """
+        return id_ in self._index
+
+
+    def __len__(self) -> int:
+        """ Return the number of interned IDs. """
+        return len(self._ids)
+
+
+    def __iter__(self):
+        """ Return an iterator over the interned IDs in code order. """
+        return iter(self._ids)
+
+
+    def __repr__(self):
+        """ Return the string representation of the Vocabulary object. """
+        return f"Vocabulary({len(self._ids)} ids)"
+
+
+class MappedVocabulary:
+    """
+    MappedVocabulary is a read-only vocabulary over files written by `Vocabulary.save`.
+
+    The IDs and their hash index are memory-mapped, so opening it reads nothing up front and processes
+    that open the same files share their pages.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the MappedVocabulary object.
+
+        Args:
+            path: The path prefix the vocabulary was saved with.
+        """
+        self.path = path
+
+        source = pa.memory_map(f"{path}.arrow", "r")
+        self._ids = pa.ipc.open_file(source).read_all().column(0)
+        self._index = HashIndex.load(f"{path}.index.npy")
+
+
+    def encode(self, id_: Any) -> int:
+        """
+        Get the code of an ID.
+
+        Args:
+            id_: The ID to be encoded.
+
+        Returns:
+            The code of the ID.
+
+        Raises:
+            KeyError: If the ID is not in the vocabulary.
+        """
+        for code in self._index.lookup(id_):
+            if self._ids[code].as_py() == id_:
+                return code
+
+        raise KeyError(id_)
+
+
+    def encode_many(self, ids: Iterable[Any]) -> np.ndarray:
+        """
+        Get the codes of many IDs.
+
+        Args:
+            ids: The IDs to be encoded.
+
+        Returns:
+            An int64 array with the code of every ID.
+
+        Raises:
+            KeyError: If an ID is not in the vocabulary.
+        """
+        return np.fromiter((self.encode(id_) for id_ in ids), dtype=np.int64)
+
+
+    def decode(self, code: int) -> Any:
+        """
+        Get the ID of a code.
+
+        Args:
+            code: The code to be decoded.
+
+        Returns:
+            The ID of the code.
+        """
+        return self._ids[code].as_py()
+
+
+    def decode_many(self, codes: np.ndarray) -> pl.Series:
+        """
+        Get the IDs of many codes at once, as a Categorical Series for string IDs.
+
+        Args:
+            codes: The codes to be decoded.
+
+        Returns:
+            A Series with the ID of every code.
+        """
+        ids = pl.Series("id", self._ids.take(pa.array(np.asarray(codes, dtype=np.int64))))
+        return ids.cast(pl.Categorical) if ids.dtype == pl.String else ids
+
+
+    def save(self, path: str):
+        """
+        Save the vocabulary to other files, as `Vocabulary.save` does.
+
+        Args:
+            path: The path prefix of the files.
+        """
+        _save_ids(self._ids, path)
+
+
+    @property
+    def ids(self) -> List[Any]:
+        """ The IDs in code order. """
+        return self._ids.to_pylist()
+
+
+    def __getitem__(self, code: int) -> Any:
+        """ Get the ID of a code. """
+        return self.decode(code)
+
+
+    def __contains__(self, id_: Any) -> bool:
+        """ Check if an ID is in the vocabulary. """
+        try:
+            self.encode(id_)
+        except KeyError:
+            return False
+
+        return True
+
+
+    def __len__(self) -> int:
+        """ Return the number of IDs. """
+        return len(self._ids)
+
+
+    def __iter__(self):
+        """ Return an iterator over the IDs in code order. """
+        for chunk in self._ids.chunks:
+            yield from chunk.to_pylist()
+
+
+    def __repr__(self):
+        """ Return the string representation of the MappedVocabulary object. """
+        return f"MappedVocabulary({self.path}, {len(self._ids)} ids)"
+
+
+def _save_ids(ids: pa.Array, path: str):
+    """
+    Write the files of a saved vocabulary.
+
+    Args:
+        ids: The IDs in code order.
+        path: The path prefix of the files.
+    """
+    table = pa.table({"id": ids})
+
+    with pa.OSFile(f"{path}.arrow", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    HashIndex.build(ids.to_pylist()).save(f"{path}.index.npy")
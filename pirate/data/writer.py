@@ -0,0 +1,146 @@
+import io
+import json
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from typing import IO, Iterable, List, Optional
+
+from .compression import open_compressed, split_extension
+from .triples import Triples
+
+
+class TriplesWriter:
+    """
+    TriplesWriter appends triples to a file (json, jsonl, csv, parquet) in batches.
+
+    Triples are buffered in memory and written every `batch_size` triples, so memory stays constant
+    however many triples are written. A file written to a JSON or CSV path can be loaded with
+    `Triples` at any point and holds every flushed batch. A Parquet file is only readable once the
+    writer is closed, and so is a file compressed by a `.gz` or `.zst` suffix.
+
+    IDs of any type are written as strings to Parquet and CSV files, which are read back as strings,
+    and as they are to JSON files.
+    """
+
+    def __init__(self, path: str, width: int = 3, batch_size: int = 65536):
+        """
+        Initialize the TriplesWriter object and create the file.
+
+        Args:
+            path: The path to the file where the triples will be written.
+            width: The number of elements in each triple. Defaults to 3.
+            batch_size: The number of triples buffered before they are written. Defaults to 65536.
+
+        Raises:
+            NotImplementedError: If the file extension is not supported.
+        """
+        self.path = path
+        self.width = width
+        self.batch_size = batch_size
+        self.ext, self.compression = split_extension(path)
+
+        self._buffer: List[List[str]] = []
+        self._num_written = 0
+
+        self._file: Optional[IO] = None
+        self._parquet_writer: Optional[pq.ParquetWriter] = None
+
+        if self.ext not in ("json", "jsonl", "csv", "parquet"):
+            raise NotImplementedError(f"Extension {self.ext} not supported")
+
+        stream = open_compressed(path, self.compression) if self.compression is not None else None
+
+        if self.ext == "parquet":
+            schema = pa.schema([(column, pa.string()) for column in Triples._columns(width)])
+            self._parquet_writer = pq.ParquetWriter(stream or path, schema)
+            self._file = stream
+        elif stream is not None:
+            self._file = io.TextIOWrapper(stream, encoding="utf-8")
+        else:
+            self._file = open(path, "w")
+
+
+    def write(self, triple: List[str]):
+        """
+        Append a triple.
+
+        Args:
+            triple: The triple to be written.
+
+        Raises:
+            ValueError: If the triple doesn't have `width` elements.
+        """
+        if len(triple) != self.width:
+            raise ValueError(f"Expected a triple with {self.width} elements, got {len(triple)}.")
+
+        self._buffer.append(triple)
+
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+
+    def write_many(self, triples: Iterable[List[str]]):
+        """
+        Append many triples.
+
+        Args:
+            triples: The triples to be written, for example a `Triples` object.
+        """
+        for triple in triples:
+            self.write(triple)
+
+
+    def flush(self):
+        """ Write the buffered triples to the file. """
+        if not self._buffer:
+            return
+
+        if self.ext == "json" or self.ext == "jsonl":
+            self._file.write("".join(json.dumps(triple) + "\n" for triple in self._buffer))
+            self._file.flush()
+        elif self.ext == "csv":
+            self._file.write(self._to_frame().write_csv(include_header=False))
+            self._file.flush()
+        else:
+            columns = [[str(value) for value in column] for column in zip(*self._buffer)]
+            self._parquet_writer.write_table(pa.table(columns, schema=self._parquet_writer.schema))
+
+        self._num_written += len(self._buffer)
+        self._buffer = []
+
+
+    def close(self):
+        """ Write the buffered triples and close the file. """
+        self.flush()
+
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+    def _to_frame(self) -> pl.DataFrame:
+        """ Convert the buffered triples to a DataFrame with one string column per element. """
+        rows = [[str(value) for value in triple] for triple in self._buffer]
+        return pl.DataFrame(rows, schema={column: pl.String for column in Triples._columns(self.width)}, orient="row")
+
+
+    def __enter__(self) -> "TriplesWriter":
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self):
+        """ Return the number of triples written so far, including buffered ones. """
+        return self._num_written + len(self._buffer)
+
+
+    def __repr__(self):
+        """ Return the string representation of the TriplesWriter object. """
+        return f"TriplesWriter({self.path}, {len(self)} triples)"
@@ -1,10 +1,12 @@
 import random
+import numpy as np
 
-from typing import List, Any
+from typing import Any, Iterable, List, Optional
 from abc import ABC, abstractmethod
 
 from pirate.models import Encoder
 from pirate.data.triples import Triples
+from pirate.data.writer import TriplesWriter
 from pirate.retrievers import (
     BaseRetriever,
     BM25Retriever,
@@ -32,22 +34,49 @@ class BaseMiner(ABC):
         self, 
         num_negs_per_pair: int = 1,
         exclude_pairs: List[List[str]] = [],
+        output_path: Optional[str] = None,
         *args,
         **kwargs
-    ) -> Triples:
+    ) -> Optional[Triples]:
         """
         Mine negative samples from the data.
 
         Args:
             num_negs_per_pair: The number of negative samples to mine per positive pair.
             exclude_pairs: The pairs to exclude from the negative samples.
+            output_path: The path to a file the triples are streamed to as they are mined.
 
         Returns:
-            A list of new triples.
+            A list of new triples, or None if they were streamed to `output_path`.
         """
         pass
 
 
+    def _output(self, rows: Iterable[List[int]], output_path: Optional[str] = None) -> Optional[Triples]:
+        """
+        Collect mined triples, or stream them to a file.
+
+        Args:
+            rows: The mined triples as codes in the vocabularies of the input triples.
+            output_path: The path to a file the triples are streamed to. Defaults to None.
+
+        Returns:
+            The mined triples, or None if they were streamed to `output_path`.
+        """
+        qid_vocab = self.triples.qid_vocab
+        pid_vocab = self.triples.pid_vocab
+
+        if output_path is None:
+            codes = np.array(list(rows), dtype=np.int64).reshape(-1, 3)
+            return Triples.from_codes(codes, qid_vocab, pid_vocab)
+
+        with TriplesWriter(output_path) as writer:
+            for qid_code, pos_pid_code, neg_pid_code in rows:
+                writer.write([qid_vocab.decode(qid_code), pid_vocab.decode(pos_pid_code), pid_vocab.decode(neg_pid_code)])
+
+        return None
+
+
     def _seed(self):
         if self.mining_params.seed is not None:
             random.seed(self.mining_params.seed)
@@ -58,7 +87,7 @@ class BaseMiner(ABC):
 
         match model:
             case Encoder.BM25 | Encoder.BM25L | Encoder.BM25PLUS:
-                model = BM25Retriever(model)
+                model = BM25Retriever(model, num_workers=self.mining_params.num_workers)
             case Encoder.BIENCODER:
                 raise ValueError("BiEncoder not supported for mining yet.")
                 model = BiEncoder(model)
@@ -1,5 +1,10 @@
+import os
+import json
 import random
-from typing import List, Optional
+import shutil
+import hashlib
+
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from tqdm import tqdm
 
@@ -23,7 +28,7 @@ class HardMiner(BaseMiner):
 
         assert self.triples is not None, "Triples must be provided."
         assert len(self.triples) > 0, "Triples must not be empty."
-        assert max([len(i) for i in self.triples]) == 2, "Triples must be in the pair format [qid, pid]."
+        assert self.triples.width == 2, "Triples must be in the pair format [qid, pid]."
 
         passage_dict = {}
         query_dict = {}
@@ -44,20 +49,102 @@ class HardMiner(BaseMiner):
     def mine(
         self,
         num_negs_per_pair: int = 1,
-        exclude_pairs: Optional[List[List[str]]] = None
-    ) -> Triples:
-        self.encoder.index(self.passages)
+        exclude_pairs: Optional[List[List[str]]] = None,
+        output_path: Optional[str] = None
+    ) -> Optional[Triples]:
+        index_path = self.mining_params.index_path
+
+        fingerprint = self._fingerprint() if index_path is not None else None
+
+        if fingerprint is not None and self._read_fingerprint(index_path) == fingerprint:
+            self.encoder.load_index(index_path)
+        else:
+            self.encoder.index(self.passages)
+
+            if index_path is not None:
+                self._save_index(index_path, fingerprint)
+
         rankings = self.encoder.rank_passages(self.queries, self.mining_params.top_k)
 
         if self.mining_params.score_threshold:
             rankings = rankings.filter_by_score(self.mining_params.score_threshold)
 
-        triples_list = []
-        for qid, pos_pid in tqdm(self.triples, desc="Mining hard negatives", total=len(self.triples), disable=self.mining_params.verbose):
-            if exclude_pairs and [qid, pos_pid] in exclude_pairs:
+        qid_vocab = self.triples.qid_vocab
+        pid_vocab = self.triples.pid_vocab
+
+        excluded_pairs = {
+            (qid_vocab.encode(qid), pid_vocab.encode(pid))
+            for qid, pid in exclude_pairs or []
+            if qid in qid_vocab and pid in pid_vocab
+        }
+        passage_groups_by_qid = {qid: group["pid"].to_list() for qid, group in rankings.iter_groups()}
+
+        rows = self._iter_triples(passage_groups_by_qid, excluded_pairs, num_negs_per_pair)
+        return self._output(rows, output_path)
+
+
+    def _fingerprint(self) -> Dict[str, object]:
+        """ Describe the indexed corpus and encoder, so a saved index is only reused for the same ones. """
+        model = self.mining_params.model
+        digest = hashlib.blake2b(digest_size=16)
+
+        for pid in self.passages:
+            for value in [str(pid), self.passages[pid]]:
+                encoded = value.encode("utf-8")
+                digest.update(len(encoded).to_bytes(8, "little"))
+                digest.update(encoded)
+
+        return {
+            "encoder": getattr(model, "value", type(model).__qualname__),
+            "corpus_size": len(self.passages),
+            "corpus_hash": digest.hexdigest()
+        }
+
+
+    def _read_fingerprint(self, index_path: str) -> Optional[Dict[str, object]]:
+        """ Read the fingerprint saved with an index, or None if there is no saved index. """
+        try:
+            with open(os.path.join(index_path, "fingerprint.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    def _save_index(self, index_path: str, fingerprint: Dict[str, object]):
+        """
+        Save the index with its fingerprint. It is written to a temporary directory first and then
+        renamed, replacing an outdated index, so an interrupted save never leaves a partial index that
+        looks valid.
+        """
+        partial = f"{index_path}.{os.getpid()}.tmp"
+        shutil.rmtree(partial, ignore_errors=True)
+
+        self.encoder.save_index(partial)
+        with open(os.path.join(partial, "fingerprint.json"), "w") as f:
+            json.dump(fingerprint, f)
+
+        outdated = f"{index_path}.{os.getpid()}.old"
+        if os.path.exists(index_path):
+            os.rename(index_path, outdated)
+
+        os.rename(partial, index_path)
+        shutil.rmtree(outdated, ignore_errors=True)
+
+
+    def _iter_triples(
+        self,
+        passage_groups_by_qid: Dict[str, List[str]],
+        excluded_pairs: Set[Tuple[int, int]],
+        num_negs_per_pair: int
+    ) -> Iterator[List[int]]:
+        qid_vocab = self.triples.qid_vocab
+        pid_vocab = self.triples.pid_vocab
+
+        for qid_code, pos_pid_code in tqdm(self.triples.codes.tolist(), desc="Mining hard negatives", total=len(self.triples), disable=self.mining_params.verbose):
+            if (qid_code, pos_pid_code) in excluded_pairs:
                 continue
             
-            passage_groups = rankings.get_passage_groups(qid)["pid"].to_list()
+            passage_groups = passage_groups_by_qid.get(qid_vocab.decode(qid_code), [])
             
             passage_sample_set = []
             match self.mining_params.sampling:
@@ -66,10 +153,7 @@ class HardMiner(BaseMiner):
                 case Sampling.RTOP_K:
                     passage_sample_set = passage_groups[:self.mining_params.top_k] if self.mining_params.top_k else passage_groups
 
-            random_negative_passages = random.sample(passage_sample_set, num_negs_per_pair)
+            random_negative_passages = random.sample(passage_sample_set, min(num_negs_per_pair, len(passage_sample_set)))
 
             for neg_pid in random_negative_passages:
-                triples_list.append([qid, pos_pid, neg_pid])
-
-        triples = Triples(triples_list)
-        return triples
\ No newline at end of file
+                yield [qid_code, pos_pid_code, pid_vocab.add(neg_pid)]
@@ -1,7 +1,8 @@
 import random
+import numpy as np
 
 from tqdm import tqdm
-from typing import List, Optional
+from typing import Iterator, List, Optional, Set, Tuple
 
 from pirate.data import Triples
 from pirate.miner.base import BaseMiner
@@ -16,25 +17,47 @@ class InBatchMiner(BaseMiner):
         
         assert self.triples is not None, "Triples must be provided."
         assert len(self.triples) > 0, "Triples must not be empty."
-        assert max([len(i) for i in self.triples]) == 2, "Triples must be in the pair format [qid, pid]."
+        assert self.triples.width == 2, "Triples must be in the pair format [qid, pid]."
 
 
     def mine(
         self,
         num_negs_per_pair: int = 1,
-        exclude_pairs: Optional[List[List[str]]] = None
-    ) -> Triples:
-        triples_list = []
-        for qid, pos_pid in tqdm(self.triples, desc="Mining in-batch negatives", total=len(self.triples), disable=self.mining_params.verbose):
-            if exclude_pairs and [qid, pos_pid] in exclude_pairs:
+        exclude_pairs: Optional[List[List[str]]] = None,
+        output_path: Optional[str] = None
+    ) -> Optional[Triples]:
+        qid_vocab = self.triples.qid_vocab
+        pid_vocab = self.triples.pid_vocab
+
+        excluded_pairs = {
+            (qid_vocab.encode(qid), pid_vocab.encode(pid))
+            for qid, pid in exclude_pairs or []
+            if qid in qid_vocab and pid in pid_vocab
+        }
+
+        rows = self._iter_triples(excluded_pairs, num_negs_per_pair)
+        return self._output(rows, output_path)
+
+
+    def _iter_triples(self, excluded_pairs: Set[Tuple[int, int]], num_negs_per_pair: int) -> Iterator[List[int]]:
+        codes = self.triples.codes
+
+        # Pairs sorted by query put each query's positives in one block, so the positives of the other
+        # queries are every position outside that block and can be sampled without building a list.
+        order = np.argsort(codes[:, 0], kind="stable")
+        sorted_pids = codes[order, 1].tolist()
+        block_qids, block_starts, block_sizes = np.unique(codes[order, 0], return_index=True, return_counts=True)
+        blocks = dict(zip(block_qids.tolist(), zip(block_starts.tolist(), block_sizes.tolist())))
+
+        for qid_code, pos_pid_code in tqdm(codes.tolist(), desc="Mining in-batch negatives", total=len(self.triples), disable=self.mining_params.verbose):
+            if (qid_code, pos_pid_code) in excluded_pairs:
                 continue
             
-            other_pos_pids = [pid for q, pid in self.triples if q != qid]
-            
-            random_negative_passages = random.sample(other_pos_pids, num_negs_per_pair)
+            block_start, block_size = blocks[qid_code]
+            other_positions = random.sample(range(len(sorted_pids) - block_size), num_negs_per_pair)
             
-            for neg_pid in random_negative_passages:
-                triples_list.append([qid, pos_pid, neg_pid])
-        
-        triples = Triples(triples_list)
-        return triples
+            for position in other_positions:
+                if position >= block_start:
+                    position += block_size
+
+                yield [qid_code, pos_pid_code, sorted_pids[position]]
@@ -3,7 +3,7 @@ import inspect
 
 from tqdm import tqdm
 from loguru import logger
-from typing import List, Optional
+from typing import Iterator, List, Optional, Set, Tuple
 
 from pirate.data.triples import Triples
 from pirate.miner.base import BaseMiner
@@ -45,17 +45,27 @@ class SyntheticMiner(BaseMiner):
 
         assert self.triples is not None, "Triples must be provided."
         assert len(self.triples) > 0, "Triples must not be empty."
-        assert max([len(i) for i in self.triples]) == 2, "Triples must be in the pair format [qid, pid]."
+        assert self.triples.width == 2, "Triples must be in the pair format [qid, pid]."
 
 
     def mine(
         self,
         num_negs_per_pair: int = 1,
-        exclude_pairs: Optional[List[List[str]]] = None
-    ) -> Triples:
-        triples_list = []
+        exclude_pairs: Optional[List[List[str]]] = None,
+        output_path: Optional[str] = None
+    ) -> Optional[Triples]:
+        excluded_pairs = {(qid, pid) for qid, pid in exclude_pairs or []}
+
+        rows = self._iter_triples(excluded_pairs, num_negs_per_pair)
+        return self._output(rows, output_path)
+
+
+    def _iter_triples(self, excluded_pairs: Set[Tuple[str, str]], num_negs_per_pair: int) -> Iterator[List[int]]:
+        qid_vocab = self.triples.qid_vocab
+        pid_vocab = self.triples.pid_vocab
+
         for qid, pos_pid in tqdm(self.triples, desc="Generating synthetic negatives", total=len(self.triples), disable=self.mining_params.verbose):
-            if exclude_pairs and [qid, pos_pid] in exclude_pairs:
+            if (qid, pos_pid) in excluded_pairs:
                 continue
 
             query = self.mining_params.queries[qid]
@@ -66,14 +76,9 @@ class SyntheticMiner(BaseMiner):
 
                 assert isinstance(negative_document, str), "Returned negative document must be a string."
 
-                neg_pid = None
-                if negative_document not in self.mining_params.passages:
+                neg_pid = self.mining_params.passages.get_id(negative_document)
+                if neg_pid is None:
                     neg_pid = self.mining_params.passages.add(negative_document)
                     logger.debug(f"Added negative document to passages with ID: {neg_pid}")
-                else:
-                    neg_pid = self.mining_params.passages.get_id(negative_document)
-
-                triples_list.append([qid, pos_pid, neg_pid])
 
-        triples = Triples(triples_list)
-        return triples
+                yield [qid_vocab.encode(qid), pid_vocab.encode(pos_pid), pid_vocab.add(neg_pid)]
@@ -32,6 +32,8 @@ class HardMinerParams(MiningParams):
     seed: Optional[int] = None
     top_k: Optional[int] = None
     score_threshold: Optional[float] = 0.7
+    num_workers: int = 1
+    index_path: Optional[str] = None
 
 
 class InBatchMinerParams(MiningParams):
@@ -1,11 +1,15 @@
 from .base import BaseRetriever
 from .bm25 import BM25Retriever
+from .tokenizer import Tokenizer
 from .bi_encoder import BiEncoder
+from .embedding_cache import EmbeddingCache
 from .cross_encoder import CrossEncoder
 
 __all__ = [
     "BaseRetriever",
     "BM25Retriever",
+    "Tokenizer",
     "BiEncoder",
+    "EmbeddingCache",
     "CrossEncoder"
 ]
\ No newline at end of file
@@ -0,0 +1,215 @@
+import os
+import numpy as np
+import scipy.sparse as sp
+
+from typing import Callable, Optional, Tuple
+
+from .utils import blocked_top_k, merge_top_k, normalize_embeddings, top_k_scores
+
+
+class IVFIndex:
+    """
+    IVFIndex is an inverted file index for approximate nearest neighbor search by inner product.
+
+    The embeddings are clustered around centroids found by spherical k-means, and every row is filed
+    in the list of its nearest centroid. A query only scores the rows of its `nprobe` nearest lists,
+    so a search costs about `nprobe / num_lists` of an exact search. The index only holds the lists;
+    the rows are scored from the embedding matrix they point into.
+    """
+
+    def __init__(self, num_lists: int, num_iterations: int = 10, seed: int = 0):
+        """
+        Initialize the IVFIndex object.
+
+        Args:
+            num_lists: The number of lists, usually a few times the square root of the corpus size.
+            num_iterations: The number of k-means iterations. Defaults to 10.
+            seed: The seed of the k-means initialization and sampling. Defaults to 0.
+        """
+        self.num_lists = num_lists
+        self.num_iterations = num_iterations
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int32)
+
+        self._order: Optional[np.ndarray] = None
+        self._offsets: Optional[np.ndarray] = None
+
+
+    def train(self, embeddings: np.ndarray, max_samples_per_list: int = 256):
+        """
+        Find the centroids with spherical k-means on a sample of the embeddings, and file every row.
+
+        Args:
+            embeddings: The normalized embeddings, one row per passage.
+            max_samples_per_list: The number of sampled rows per list k-means is trained on. Defaults to 256.
+        """
+        rng = np.random.default_rng(self.seed)
+        self.num_lists = max(1, min(self.num_lists, len(embeddings)))
+
+        num_samples = min(len(embeddings), self.num_lists * max_samples_per_list)
+        sample = embeddings[np.sort(rng.choice(len(embeddings), num_samples, replace=False))]
+
+        self.centroids = sample[rng.choice(len(sample), self.num_lists, replace=False)]
+        for _ in range(self.num_iterations):
+            assignments = self._assign(sample)
+
+            one_hot = sp.csr_matrix(
+                (np.ones(len(sample), dtype=np.float32), (assignments, np.arange(len(sample)))),
+                shape=(self.num_lists, len(sample))
+            )
+            sums = np.asarray(one_hot @ sample)
+
+            empty = np.flatnonzero(np.bincount(assignments, minlength=self.num_lists) == 0)
+            sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+
+            self.centroids = normalize_embeddings(sums)
+
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.add(embeddings)
+
+
+    def add(self, embeddings: np.ndarray):
+        """
+        File new rows, appended after the rows already filed, in the lists of their nearest centroids.
+
+        Args:
+            embeddings: The normalized embeddings of the new rows.
+        """
+        self.assignments = np.concatenate([self.assignments, self._assign(embeddings)])
+        self._order = None
+
+
+    def search(
+        self,
+        queries: np.ndarray,
+        corpus: np.ndarray,
+        top_k: int,
+        nprobe: int = 8,
+        deleted: Optional[np.ndarray] = None,
+        decode: Optional[Callable[[np.ndarray], np.ndarray]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select the corpus rows with the largest inner products with every query among the rows of its
+        `nprobe` nearest lists.
+
+        Every probed list is scored once for all the queries probing it, and its best rows are merged
+        into their running top-k. Queries whose probed lists hold fewer than `top_k` rows that are not
+        deleted fall back to an exact search.
+
+        Args:
+            queries: The query embeddings, one row per query.
+            corpus: The corpus embeddings, one row per filed row.
+            top_k: The number of documents to keep per query. It must not exceed the number of documents
+                that are not deleted.
+            nprobe: The number of lists searched per query. Defaults to 8.
+            deleted: Whether every corpus row is deleted. Deleted rows are never selected. Defaults to None.
+            decode: A function decoding compact corpus rows into float32 embeddings. Defaults to None.
+
+        Returns:
+            The document indices and their scores, both with one row per query, sorted by decreasing score.
+        """
+        order, offsets = self._lists()
+        probes, _ = top_k_scores(queries @ self.centroids.T, min(nprobe, self.num_lists))
+
+        indices = np.full((len(queries), top_k), -1, dtype=np.int64)
+        scores = np.full((len(queries), top_k), -np.inf, dtype=np.float32)
+
+        probed_lists = probes.ravel()
+        probing_queries = np.repeat(np.arange(len(queries)), probes.shape[1])
+
+        by_list = np.argsort(probed_lists, kind="stable")
+        lists, starts = np.unique(probed_lists[by_list], return_index=True)
+
+        for list_id, query_rows in zip(lists.tolist(), np.split(probing_queries[by_list], starts[1:])):
+            rows = order[offsets[list_id]:offsets[list_id + 1]]
+            if len(rows) == 0:
+                continue
+
+            block = corpus[rows]
+            block_scores = queries[query_rows] @ (block if decode is None else decode(block)).T
+            if deleted is not None:
+                block_scores[:, deleted[rows]] = -np.inf
+
+            block_indices, block_scores = top_k_scores(block_scores, top_k)
+            indices[query_rows], scores[query_rows] = merge_top_k(
+                indices[query_rows], scores[query_rows], rows[block_indices], block_scores, top_k
+            )
+
+        missing = np.flatnonzero(np.isneginf(scores[:, -1])) if top_k else np.empty(0, dtype=np.int64)
+        if len(missing):
+            indices[missing], scores[missing] = blocked_top_k(queries[missing], corpus, top_k, deleted=deleted, decode=decode)
+
+        return indices, scores
+
+
+    def save(self, path: str):
+        """
+        Save the centroids and the list of every row to `.npy` files in a directory.
+
+        Args:
+            path: The path to the directory.
+        """
+        for name in ["centroids", "assignments"]:
+            with open(os.path.join(path, f"ivf_{name}.npy"), "wb") as f:
+                np.save(f, getattr(self, name))
+
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IVFIndex"]:
+        """
+        Load an index saved with `save`.
+
+        Args:
+            path: The path to the directory.
+
+        Returns:
+            The loaded IVFIndex, or None if the directory holds none.
+        """
+        if not os.path.exists(os.path.join(path, "ivf_centroids.npy")):
+            return None
+
+        centroids = np.load(os.path.join(path, "ivf_centroids.npy"))
+
+        index = cls(len(centroids))
+        index.centroids = centroids
+        index.assignments = np.load(os.path.join(path, "ivf_assignments.npy"))
+
+        return index
+
+
+    @staticmethod
+    def delete(path: str):
+        """
+        Delete an index saved with `save` from a directory, if it holds one.
+
+        Args:
+            path: The path to the directory.
+        """
+        for name in ["centroids", "assignments"]:
+            if os.path.exists(os.path.join(path, f"ivf_{name}.npy")):
+                os.remove(os.path.join(path, f"ivf_{name}.npy"))
+
+
+    def _assign(self, embeddings: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        """ Return the nearest centroid of every row, scoring a block of rows at a time. """
+        assignments = np.empty(len(embeddings), dtype=np.int32)
+        for start in range(0, len(embeddings), block_size):
+            assignments[start:start + block_size] = np.argmax(embeddings[start:start + block_size] @ self.centroids.T, axis=1)
+
+        return assignments
+
+
+    def _lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        """ Return the rows sorted by list, and the offset of every list in them. """
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind="stable")
+            self._offsets = np.concatenate([[0], np.cumsum(np.bincount(self.assignments, minlength=self.num_lists))])
+
+        return self._order, self._offsets
+
+
+    def __repr__(self):
+        """ Return the string representation of the IVFIndex object. """
+        return f"IVFIndex({self.num_lists} lists, {len(self.assignments)} rows)"
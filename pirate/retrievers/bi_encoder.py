@@ -1,8 +1,10 @@
-import torch
+import os
+import json
+import numpy as np
 
 from tqdm import tqdm
 from loguru import logger
-from typing import Optional
+from typing import Any, Iterable, List, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 
 from pirate.data import (
@@ -11,69 +13,386 @@ from pirate.data import (
     Ranking,
 )
 
+from .ann import IVFIndex
+from .embedding_cache import EmbeddingCache
+from .quantization import Quantizer
+from .utils import IndexIds, blocked_top_k, build_ranking, normalize_embeddings, tile_sizes, top_k_scores
+
 
 class BiEncoder(SentenceTransformer):
     def __init__(
         self,
         model_name: str,
         *args,
+        embedding_cache_dir: Optional[str] = None,
+        max_cached_embeddings: int = 1_000_000,
         **kwargs,
     ):
+        """
+        Initialize the BiEncoder object.
+
+        Args:
+            model_name: The name of the sentence-transformers model.
+            *args: Positional arguments passed to `SentenceTransformer`.
+            embedding_cache_dir: The directory where embeddings are cached, one cache per model. Passages
+                and queries found in the cache are not encoded again. Defaults to None, which disables
+                the cache.
+            max_cached_embeddings: The maximum number of cached embeddings, beyond which the least
+                recently used ones are evicted. Defaults to 1,000,000.
+            **kwargs: Keyword arguments passed to `SentenceTransformer`.
+        """
         super().__init__(model_name, *args, **kwargs)
 
         self.model_name = model_name
         self.indexed_corpus = None
         self.corpus = None
         self.list_of_passages = None
+        self.quantizer = Quantizer()
+        self.ann_index = None
+        self._buffer = None
+
+        self.embedding_cache = None
+        if embedding_cache_dir is not None:
+            self.embedding_cache = EmbeddingCache(
+                os.path.join(embedding_cache_dir, model_name.replace("/", "__")),
+                model_name,
+                max_entries=max_cached_embeddings
+            )
+
+
+    def encode_normalized(self, texts: List[str], *args, **kwargs) -> np.ndarray:
+        """
+        Encode texts into L2-normalized embeddings. With an embedding cache, only the texts that are not
+        cached are encoded, each distinct one once, and their embeddings are added to the cache.
+
+        The cache is keyed by the model and the text alone, so arguments that change the embeddings,
+        such as a prompt, should not vary between calls that share a cache.
+
+        Args:
+            texts: The texts to be encoded.
+            *args: Positional arguments passed to `encode`.
+            **kwargs: Keyword arguments passed to `encode`.
+
+        Returns:
+            The normalized embeddings as a float32 array, one row per text.
+        """
+        if self.embedding_cache is None:
+            return normalize_embeddings(self.encode(texts, *args, **kwargs)).reshape(len(texts), -1)
+
+        embeddings, missing = self.embedding_cache.get_many(texts)
+        if len(missing) == 0:
+            return embeddings
+
+        distinct = {}
+        for position in missing.tolist():
+            distinct.setdefault(self.embedding_cache.key(texts[position]), texts[position])
+        distinct = list(distinct.values())
+
+        logger.info(f"Encoding {len(distinct)} texts missing from the embedding cache...")
+        new_embeddings = normalize_embeddings(self.encode(distinct, *args, **kwargs)).reshape(len(distinct), -1)
+        self.embedding_cache.put_many(distinct, new_embeddings)
+
+        if embeddings is None:
+            embeddings = np.empty((len(texts), new_embeddings.shape[1]), dtype=np.float32)
+
+        rows = {self.embedding_cache.key(text): row for row, text in enumerate(distinct)}
+        embeddings[missing] = new_embeddings[[rows[self.embedding_cache.key(texts[position])] for position in missing.tolist()]]
+
+        return embeddings
+
+
+    def index(
+        self,
+        corpus: Passages,
+        *args,
+        storage: str = "float32",
+        ann: Optional[str] = None,
+        num_lists: Optional[int] = None,
+        **kwargs
+    ):
+        """
+        Encode the passages and build the index.
+
+        The embeddings are L2-normalized once here, so ranking only takes inner products. They can be
+        stored in a compact form, which ranking scores directly, a block of rows at a time: `float16`
+        halves the index, `int8` quarters it and `binary` cuts it 32-fold, at some cost in recall that
+        `recall_at_k` measures against a `float32` index.
 
+        With `ann="ivf"`, an inverted file index is built on top, so ranking the best passages only
+        scores the passages filed near every query.
 
-    def index(self, corpus: Passages, *args, **kwargs):
+        Args:
+            corpus: The passages to be indexed.
+            *args: Positional arguments passed to `encode`.
+            storage: How the embeddings are stored, one of "float32", "float16", "int8" (per-dimension
+                scales) and "binary" (sign bits, searched by Hamming distance). Defaults to "float32".
+            ann: The approximate nearest neighbor index, "ivf" or None for exact search only. Defaults
+                to None.
+            num_lists: The number of IVF lists. Defaults to four times the square root of the corpus size.
+            **kwargs: Keyword arguments passed to `encode`.
+
+        Raises:
+            ValueError: If the corpus is not a Passages object, or if the storage type or the approximate
+                nearest neighbor index is not supported.
+        """
         if not isinstance(corpus, Passages):
             raise ValueError("Invalid corpus type, must be Passages or Queries.")
-        
-        self.list_of_passages = [corpus[doc_id] for doc_id in corpus]
-        self.index_id_lookup = {i: doc_id for i, doc_id in enumerate(corpus)}
+        if ann not in (None, "ivf"):
+            raise ValueError(f"Invalid approximate nearest neighbor index {ann}, must be 'ivf' or None.")
+
+        quantizer = Quantizer(storage)
+
+        self.list_of_passages = [corpus[doc_id] for doc_id in corpus.vocab]
+        self.index_id_lookup = IndexIds(corpus.vocab)
 
         logger.info(f"Indexing corpus on {self.model_name}...")
-        self.indexed_corpus = self.encode(self.list_of_passages, *args, **kwargs)
+        embeddings = self.encode_normalized(self.list_of_passages, *args, **kwargs)
+
+        self.quantizer = quantizer.fit(embeddings)
+        self.indexed_corpus = self.quantizer.encode(embeddings)
         self.corpus = corpus
+        self._buffer = None
+
+        self.ann_index = None
+        if ann == "ivf":
+            logger.info("Training the IVF index...")
+            self.ann_index = IVFIndex(num_lists or int(4 * np.sqrt(len(embeddings))))
+            self.ann_index.train(embeddings)
+
+        logger.info(f"Finished indexing corpus, {self.indexed_corpus.nbytes / 2**20:.1f} MiB of {storage} embeddings.")
+
+
+    def add(self, passages: Passages, *args, **kwargs):
+        """
+        Add passages to the index. Only the new passages are encoded, and their embeddings are appended
+        to a buffer that doubles when it is full, so adding costs in proportion to the new passages.
+
+        Args:
+            passages: The passages to be added.
+            *args: Positional arguments passed to `encode`.
+            **kwargs: Keyword arguments passed to `encode`.
+
+        Raises:
+            ValueError: If the index has not been built, if `passages` is not a Passages object, or if a
+                passage is already indexed.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+        if not isinstance(passages, Passages):
+            raise ValueError("Invalid corpus type, must be Passages.")
+
+        ids = list(passages.vocab)
+        texts = [passages[doc_id] for doc_id in ids]
+        embeddings = self.encode_normalized(texts, *args, **kwargs)
+
+        self.index_id_lookup.add(ids)
+        if self.ann_index is not None:
+            self.ann_index.add(embeddings)
+        embeddings = self.quantizer.encode(embeddings)
+        if self.list_of_passages is not None:
+            self.list_of_passages.extend(texts)
+
+        corpus = self.indexed_corpus
+        num_rows = len(corpus)
+
+        if self._buffer is None or num_rows + len(embeddings) > len(self._buffer):
+            self._buffer = np.empty((max(2 * num_rows, num_rows + len(embeddings)), corpus.shape[1]), dtype=corpus.dtype)
+            self._buffer[:num_rows] = corpus
+
+        self._buffer[num_rows:num_rows + len(embeddings)] = embeddings
+        self.indexed_corpus = self._buffer[:num_rows + len(embeddings)]
+
+
+    def remove(self, pids: Iterable[Any]):
+        """
+        Remove passages from the index. Their embeddings stay in place but they are no longer ranked.
+
+        Args:
+            pids: The IDs of the passages to be removed.
+
+        Raises:
+            ValueError: If the index has not been built.
+            KeyError: If a passage is not indexed.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+
+        self.index_id_lookup.remove(pids)
+
+
+    def save_index(self, path: str):
+        """
+        Save the index to a directory: the normalized embeddings as a `.npy` matrix in their storage
+        type, the quantization parameters, and the IDs of the passage in every row.
+
+        Args:
+            path: The path to the directory where the index will be saved.
+
+        Raises:
+            ValueError: If the index has not been built.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, "embeddings.npy"), "wb") as f:
+            np.save(f, self.indexed_corpus)
+        with open(os.path.join(path, "params.json"), "w") as f:
+            json.dump({"model": self.model_name}, f)
+
+        self.quantizer.save(path)
+        if self.ann_index is not None:
+            self.ann_index.save(path)
+        else:
+            IVFIndex.delete(path)
+        self.index_id_lookup.save(os.path.join(path, "passages"))
+
+
+    def load_index(self, path: str):
+        """
+        Load an index saved with `save_index` instead of encoding the corpus. The embeddings are
+        memory-mapped, so processes that load the same index share its memory. Adding passages
+        afterwards copies the embeddings into memory.
+
+        Args:
+            path: The path to the directory of the index.
+
+        Raises:
+            ValueError: If the index was saved from another model.
+        """
+        with open(os.path.join(path, "params.json")) as f:
+            params = json.load(f)
+
+        if params["model"] != self.model_name:
+            raise ValueError(f"Index {path} was built with {params['model']}, not {self.model_name}.")
+
+        self.indexed_corpus = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.quantizer = Quantizer.load(path)
+        self.ann_index = IVFIndex.load(path)
+        self.index_id_lookup = IndexIds.load(os.path.join(path, "passages"))
+        self.corpus = None
+        self.list_of_passages = None
+        self._buffer = None
+
+
+    def rank_passages(
+        self,
+        queries: Queries,
+        top_k: Optional[int] = None,
+        *args,
+        query_block_size: int = 1024,
+        corpus_block_size: int = 16384,
+        rescore_multiplier: int = 4,
+        nprobe: int = 8,
+        exact: bool = False,
+        memory_budget: Optional[int] = None,
+        **kwargs
+    ) -> Ranking:
+        """
+        Rank the indexed passages for every query by cosine similarity.
+
+        Queries are encoded a block at a time, and every block is scored against the normalized corpus
+        with matrix products over blocks of corpus rows, keeping a running top-k per query. Compact
+        corpus rows are decoded one block at a time.
+
+        A binary index is searched by Hamming distance between the sign bits of the queries and of the
+        passages. The best `rescore_multiplier` x `top_k` candidates are then rescored with the float
+        queries against the passage signs, which recovers most of the recall lost to the binary queries.
+
+        With an IVF index and a `top_k`, every query only scores the passages of its `nprobe` nearest
+        lists, against float queries. Full rankings, and `exact=True` to validate the approximate
+        results, search the whole corpus.
 
-        logger.info("Finished indexing corpus.")
+        With a memory budget, the query and corpus block sizes are chosen so that the score tile, the
+        decoded corpus rows and the running top-k of a block of queries fit the budget.
 
+        Args:
+            queries: The queries to rank the passages for.
+            top_k: The number of best passages to keep per query. Defaults to all passages.
+            *args: Positional arguments passed to `encode`.
+            query_block_size: The number of queries encoded and scored at once. Defaults to 1024.
+            corpus_block_size: The number of corpus rows scored at once. A block holds a dense score
+                matrix of `query_block_size` x `corpus_block_size` floats. Defaults to 16384.
+            rescore_multiplier: The number of candidates per passage to keep for rescoring a binary
+                index. 0 ranks by Hamming distance alone. Defaults to 4.
+            nprobe: The number of IVF lists searched per query. More lists trade speed for recall.
+                Defaults to 8.
+            exact: Whether to search the whole corpus even with an IVF index. Defaults to False.
+            memory_budget: The memory in bytes a tile of queries and corpus rows may take, which overrides
+                `query_block_size` and `corpus_block_size`. The rankings themselves are not part of it.
+                Defaults to None, no budget.
+            **kwargs: Keyword arguments passed to `encode`.
 
-    def rank_passages(self, queries: Queries, top_k: Optional[int] = None, *args, **kwargs) -> Ranking:
-        if self.indexed_corpus is None or self.corpus is None:
+        Returns:
+            The ranking of the passages for every query.
+
+        Raises:
+            ValueError: If the index has not been built or loaded.
+        """
+        if self.indexed_corpus is None:
             raise ValueError("Index not built. Please call the index method first.")
-        
-        ranking_list = []
-        for i, query_id in tqdm(enumerate(queries), total=len(queries)):
-            query_embedding = self.encode(queries[query_id], *args, **kwargs)
-            
-            # Ensure query_embedding is a PyTorch tensor
-            if not isinstance(query_embedding, torch.Tensor):
-                query_embedding = torch.tensor(query_embedding)
-            
-            # Ensure indexed_corpus is a PyTorch tensor
-            if not isinstance(self.indexed_corpus, torch.Tensor):
-                self.indexed_corpus = torch.tensor(self.indexed_corpus)
-            
-            # Reshape query_embedding to match the dimensions
-            query_embedding = query_embedding.reshape(1, -1)
-            
-            # Calculate cosine similarity
-            scores = torch.nn.functional.cosine_similarity(query_embedding, self.indexed_corpus)
-            
-            score_array = scores.cpu().numpy().flatten()
-            if top_k is not None:
-                top_k_indices = score_array.argsort()[-top_k:][::-1]
-                top_k_scores = score_array[top_k_indices]
-                top_k_doc_ids = [self.index_id_lookup[i] for i in top_k_indices]
-                for j, doc_id in enumerate(top_k_doc_ids):
-                    ranking_list.append([query_id, doc_id, j, top_k_scores[j]])
+
+        k = len(self.index_id_lookup) if top_k is None else min(top_k, len(self.index_id_lookup))
+        deleted = self.index_id_lookup.deleted if len(self.index_id_lookup) < self.index_id_lookup.num_rows else None
+        decode = None if self.quantizer.storage == "float32" else self.quantizer.decode
+
+        hamming = self.quantizer.storage == "binary" and (rescore_multiplier == 0 or k * rescore_multiplier < len(self.index_id_lookup))
+        num_candidates = k * max(rescore_multiplier, 1)
+        approximate = self.ann_index is not None and top_k is not None and not exact
+
+        if memory_budget is not None:
+            dim = self.quantizer.dim or self.indexed_corpus.shape[1]
+            query_block_size, corpus_block_size = tile_sizes(
+                memory_budget,
+                self.index_id_lookup.num_rows,
+                num_candidates if hamming else k,
+                row_bytes=0 if decode is None else 4 * dim
+            )
+
+        texts = [queries[query_id] for query_id in queries]
+
+        indices = []
+        scores = []
+        for start in tqdm(range(0, len(texts), query_block_size)):
+            block = texts[start:start + query_block_size]
+            query_embeddings = self.encode_normalized(block, *args, **kwargs)
+
+            if approximate:
+                block_indices, block_scores = self.ann_index.search(query_embeddings, self.indexed_corpus, k, nprobe, deleted, decode)
+            elif hamming:
+                query_signs = self.quantizer.decode(self.quantizer.encode(query_embeddings))
+                block_indices, block_scores = blocked_top_k(query_signs, self.indexed_corpus, num_candidates, corpus_block_size, deleted, decode)
+                if rescore_multiplier > 0:
+                    block_indices, block_scores = self._rescore(query_embeddings, block_indices, k)
             else:
-                sorted_indices = score_array.argsort()[::-1]
-                for j, doc_id in enumerate(sorted_indices):
-                    ranking_list.append([query_id, self.index_id_lookup[doc_id], j, score_array[doc_id]])
-        
-        ranking = Ranking(ranking_list)
-        return ranking
+                block_indices, block_scores = blocked_top_k(query_embeddings, self.indexed_corpus, k, corpus_block_size, deleted, decode)
+
+            indices.append(block_indices)
+            scores.append(block_scores)
+
+        return build_ranking(queries.vocab, self.index_id_lookup, indices, scores)
+
+
+    def _rescore(self, queries: np.ndarray, candidates: np.ndarray, top_k: int, chunk_size: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Rescore candidate passages with the float queries and keep the best `top_k`.
+
+        Args:
+            queries: The normalized query embeddings, one row per query.
+            candidates: The candidate rows of every query.
+            top_k: The number of passages to keep per query.
+            chunk_size: The number of queries whose candidates are decoded at once. Defaults to 64.
+
+        Returns:
+            The rows of the best passages and their scores, sorted by decreasing score.
+        """
+        scores = np.empty(candidates.shape, dtype=np.float32)
+        for start in range(0, len(queries), chunk_size):
+            rows = candidates[start:start + chunk_size]
+            embeddings = self.quantizer.decode(self.indexed_corpus[rows.ravel()]).reshape(*rows.shape, -1)
+            scores[start:start + chunk_size] = np.einsum("qd,qkd->qk", queries[start:start + chunk_size], embeddings)
+
+        order, scores = top_k_scores(scores, top_k)
+
+        return np.take_along_axis(candidates, order, axis=1), scores
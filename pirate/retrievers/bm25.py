@@ -1,28 +1,708 @@
+import os
+import json
 import numpy as np
+import scipy.sparse as sp
 
-from rank_bm25 import (
-    BM25Okapi,
-    BM25L,
-    BM25Plus
-)
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 from loguru import logger
-from typing import Any, Optional, Callable
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 from pirate.data.ranking import Ranking
+from pirate.data.shards import shard_bounds
 
 from .base import BaseRetriever
+from .tokenizer import TermCounts, Tokenizer, count_terms, merge_counts
+from .utils import IndexIds, _reserve, build_ranking, merge_top_k, tile_sizes, top_k_scores
 from pirate.models.types import Encoder
 from pirate.data import (
+    MappedVocabulary,
     Passages,
     Queries,
+    Vocabulary,
 )
 
 
+class BM25Index(ABC):
+    """
+    BM25Index is a native BM25 index over a tokenized corpus.
+
+    The index is a term x document CSR matrix of term frequencies. Scoring a batch of queries computes
+    the BM25 weights of the postings of their terms only, and takes one sparse product of their term
+    count matrix with those weights, so no Python code runs per document. Since the weights are not
+    stored, adding or removing documents only updates the corpus statistics. Subclasses define the idf
+    and the term weights of each BM25 variant, with the same formulas and defaults as `rank_bm25`, so
+    the scores are the same.
+
+    Added documents get new columns, and their postings are kept in a second matrix until it holds a
+    tenth as many as the first one, so an addition costs in proportion to its size. The document
+    lengths, the deletion marks and the document frequencies are kept in buffers that double when they
+    are full, the corpus size and total length in running sums, and the idfs are only recomputed when
+    they are next used. Removed documents keep their columns, marked in `deleted`, and score -inf.
+    """
+
+    merge_ratio = 0.1
+
+    def __init__(self, corpus: Union[List[List[str]], TermCounts], k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize the BM25Index object and build the index.
+
+        Args:
+            corpus: The tokenized documents, or their term counts.
+            k1: The term frequency saturation. Defaults to 1.5.
+            b: The document length normalization. Defaults to 0.75.
+        """
+        self.k1 = k1
+        self.b = b
+
+        counts = corpus if isinstance(corpus, TermCounts) else count_terms(corpus)
+
+        self.vocab = Vocabulary(counts.terms)
+        self._doc_len = counts.doc_len
+        self._deleted = np.zeros(len(counts.doc_len), dtype=bool)
+        self._num_docs = len(counts.doc_len)
+
+        self.term_freqs = self._count_terms(counts.codes, counts.doc_len, 0)
+        self._doc_freqs = np.diff(self.term_freqs.indptr).astype(np.int64)
+        self._added_freqs: Optional[sp.csr_matrix] = None
+
+        self.corpus_size = self._num_docs
+        self._total_len = counts.doc_len.sum()
+        self._update_stats()
+
+
+    @property
+    def doc_len(self) -> np.ndarray:
+        """ The number of tokens of every document. """
+        return self._doc_len[:self._num_docs]
+
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """ Whether every document is removed. """
+        return self._deleted[:self._num_docs]
+
+
+    @property
+    def doc_freqs(self) -> np.ndarray:
+        """ The number of documents that are not removed each term occurs in. """
+        return self._doc_freqs[:len(self.vocab)]
+
+
+    @property
+    def idf(self) -> np.ndarray:
+        """ The idf of every term, 0 for the terms of no document, recomputed after the corpus changes. """
+        if self._idf is None:
+            present = self.doc_freqs > 0
+            self._idf = np.zeros(len(self.doc_freqs))
+            self._idf[present] = self._calc_idf(self.doc_freqs[present])
+
+        return self._idf
+
+
+    def get_scores(self, query: List[str]) -> np.ndarray:
+        """
+        Score every document for a tokenized query.
+
+        Args:
+            query: The tokens of the query. Repeated tokens count once per occurrence, and tokens that
+                are not in the corpus score 0.
+
+        Returns:
+            The score of every document, in corpus order.
+        """
+        return self.score_batch([query])[0]
+
+
+    def score_batch(self, queries: List[List[str]]) -> np.ndarray:
+        """
+        Score every document for many tokenized queries with one sparse matrix product.
+
+        Args:
+            queries: The tokens of every query.
+
+        Returns:
+            A matrix with one row of document scores per query. Removed documents score -inf.
+        """
+        term_scores, offsets = self._score_sparse(queries)
+
+        scores = term_scores.toarray()
+        scores += offsets[:, None]
+        if self.corpus_size < len(self.doc_len):
+            scores[:, self.deleted] = -np.inf
+
+        return scores
+
+
+    def top_k_batch(self, queries: List[List[str]], top_k: int, block_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Select the best documents for many tokenized queries.
+
+        The documents are scored one block at a time. The postings of the query terms in a block are
+        sliced out of the index, weighted and multiplied with the query terms, and the best documents of
+        the block are merged into a running top-k, so only the postings, the sparse product and the
+        queries x `block_size` score matrix of one block are held. When every document that is not
+        removed is kept, the score blocks are collected instead and sorted once.
+
+        Args:
+            queries: The tokens of every query.
+            top_k: The number of documents to keep per query. It must not exceed the number of documents
+                that are not removed.
+            block_size: The number of documents scored at once. Defaults to None, all documents.
+
+        Returns:
+            The document indices and their scores, both with one row per query, sorted by decreasing score.
+        """
+        num_docs = len(self.doc_len)
+        if block_size is None or block_size >= num_docs:
+            return top_k_scores(self.score_batch(queries), top_k)
+
+        query_terms = self._encode_queries(queries)
+        offsets = np.asarray(query_terms @ self._calc_offsets()).ravel()
+        terms = np.unique(query_terms.indices)
+        query_terms = query_terms[:, terms]
+
+        matrices = [matrix for matrix in [self.term_freqs, self._added_freqs] if matrix is not None]
+        for matrix in matrices:
+            if not matrix.has_sorted_indices:
+                matrix.sort_indices()
+        cursors = [matrix.indptr[terms].astype(np.int64) for matrix in matrices]
+
+        keep_all = top_k >= self.corpus_size
+        blocks = []
+
+        indices = np.empty((len(queries), 0), dtype=np.int64)
+        scores = np.empty((len(queries), 0), dtype=np.float64)
+
+        for start in range(0, num_docs, block_size):
+            stop = min(start + block_size, num_docs)
+
+            postings = None
+            for i, matrix in enumerate(matrices):
+                ends = _seek_postings(matrix, terms, cursors[i], stop)
+                block = _slice_postings(matrix, cursors[i], ends, start, stop)
+                postings = block if postings is None else postings + block
+                cursors[i] = ends
+
+            block_scores = (query_terms @ self._weigh(postings, terms, start)).toarray()
+            block_scores += offsets[:, None]
+            if self.corpus_size < num_docs:
+                block_scores[:, self.deleted[start:stop]] = -np.inf
+
+            if keep_all:
+                blocks.append(block_scores)
+                continue
+
+            block_indices, block_scores = top_k_scores(block_scores, top_k)
+            indices, scores = merge_top_k(indices, scores, block_indices + start, block_scores, top_k)
+
+        if blocks:
+            return top_k_scores(np.concatenate(blocks, axis=1), top_k)
+
+        return indices, scores
+
+
+    def num_postings(self) -> int:
+        """ Return the number of postings in the index, one per term of every document. """
+        return self.term_freqs.nnz + (0 if self._added_freqs is None else self._added_freqs.nnz)
+
+
+    def _score_sparse(self, queries: List[List[str]]) -> Tuple[sp.csr_matrix, np.ndarray]:
+        """
+        Score the documents that hold a query term with one sparse matrix product.
+
+        Args:
+            queries: The tokens of every query.
+
+        Returns:
+            The sparse scores of the query terms, one row per query, and the score every document adds
+            per query regardless of its terms.
+        """
+        query_terms = self._encode_queries(queries)
+        terms = np.unique(query_terms.indices)
+        weights = self._weigh(self._postings(terms), terms)
+
+        return query_terms[:, terms] @ weights, np.asarray(query_terms @ self._calc_offsets()).ravel()
+
+
+    def _weigh(self, postings: sp.csr_matrix, terms: np.ndarray, start: int = 0) -> sp.csr_matrix:
+        """
+        Replace the term frequencies of postings with their BM25 weights.
+
+        Args:
+            postings: The term frequencies, one row per term, in the columns of a block of documents.
+            terms: The codes of the terms of the rows.
+            start: The index of the first document of the block. Defaults to 0.
+
+        Returns:
+            A CSR matrix of the weights with the shape of `postings`.
+        """
+        weights = self._calc_weights(
+            postings.data.astype(np.float64),
+            np.repeat(self.idf[terms], np.diff(postings.indptr)),
+            self.doc_len[postings.indices + start]
+        )
+        return sp.csr_matrix((weights, postings.indices, postings.indptr), shape=postings.shape)
+
+
+    def add(self, corpus: Union[List[List[str]], TermCounts]):
+        """
+        Add documents after the indexed ones, in the next columns.
+
+        Args:
+            corpus: The tokenized documents, or their term counts.
+        """
+        counts = corpus if isinstance(corpus, TermCounts) else count_terms(corpus)
+
+        if isinstance(self.vocab, MappedVocabulary):
+            self.vocab = Vocabulary(self.vocab.ids)
+
+        num_terms = len(self.vocab)
+        codes = self.vocab.encode_many(counts.terms)[counts.codes]
+
+        offset = self._num_docs
+        num_added = len(counts.doc_len)
+
+        self._doc_len = _reserve(self._doc_len, offset, num_added)
+        self._deleted = _reserve(self._deleted, offset, num_added)
+        self._doc_len[offset:offset + num_added] = counts.doc_len
+        self._deleted[offset:offset + num_added] = False
+        self._num_docs += num_added
+
+        new_freqs = self._count_terms(codes, counts.doc_len, offset)
+        added_freqs = new_freqs if self._added_freqs is None else new_freqs + self._resize(self._added_freqs)
+
+        self.term_freqs = self._resize(self.term_freqs)
+        self._doc_freqs = _reserve(self._doc_freqs, num_terms, len(self.vocab) - num_terms)
+        self._doc_freqs[num_terms:len(self.vocab)] = 0
+        self._doc_freqs[:len(self.vocab)] += np.diff(new_freqs.indptr)
+
+        if added_freqs.nnz > self.merge_ratio * self.term_freqs.nnz:
+            self.term_freqs = self.term_freqs + added_freqs
+            self._added_freqs = None
+        else:
+            self._added_freqs = added_freqs
+
+        self.corpus_size += num_added
+        self._total_len += counts.doc_len.sum()
+        self._update_stats()
+
+
+    def remove(self, docs: np.ndarray):
+        """
+        Remove documents. Their columns stay in the index and score -inf.
+
+        Args:
+            docs: The column numbers of the documents to be removed. Documents that are already
+                removed are skipped.
+        """
+        docs = np.unique(np.asarray(docs, dtype=np.int64))
+        docs = docs[~self.deleted[docs]]
+
+        self._deleted = _reserve(self._deleted, self._num_docs, 0)
+        self._deleted[docs] = True
+
+        self._doc_freqs = _reserve(self._doc_freqs, len(self.vocab), 0)
+        for term_freqs in [self.term_freqs, self._added_freqs]:
+            if term_freqs is not None:
+                self._doc_freqs[:len(self.vocab)] -= np.diff(term_freqs[:, docs].indptr)
+
+        self.corpus_size -= len(docs)
+        self._total_len -= self.doc_len[docs].sum()
+        self._update_stats()
+
+
+    def _update_stats(self):
+        """ Update the average document length from the running sums, and drop the idfs until they are next used. """
+        self.avgdl = self._total_len / self.corpus_size
+        self._idf: Optional[np.ndarray] = None
+
+
+    def _count_terms(self, codes: np.ndarray, doc_len: np.ndarray, offset: int) -> sp.csr_matrix:
+        """
+        Count the occurrences of every term in every document.
+
+        Args:
+            codes: The term code of every token of the documents.
+            doc_len: The number of tokens of every document.
+            offset: The column of the first document.
+
+        Returns:
+            A term x document CSR matrix of term frequencies over all columns, with sorted document indices.
+        """
+        docs = np.repeat(np.arange(offset, offset + len(doc_len), dtype=np.int64), doc_len)
+
+        term_freqs = sp.csr_matrix(
+            (np.ones(len(codes), dtype=np.int32), (codes, docs)),
+            shape=(len(self.vocab), len(self.doc_len))
+        )
+        term_freqs.sum_duplicates()
+
+        return term_freqs
+
+
+    def _resize(self, term_freqs: sp.csr_matrix) -> sp.csr_matrix:
+        """ Extend a term x document matrix with empty rows and columns to the current terms and documents. """
+        indptr = np.concatenate([
+            term_freqs.indptr,
+            np.full(len(self.vocab) - term_freqs.shape[0], term_freqs.indptr[-1], dtype=term_freqs.indptr.dtype)
+        ])
+        return sp.csr_matrix((term_freqs.data, term_freqs.indices, indptr), shape=(len(self.vocab), len(self.doc_len)), copy=False)
+
+
+    def _postings(self, terms: np.ndarray) -> sp.csr_matrix:
+        """
+        Get the term frequencies of some terms in every document.
+
+        Args:
+            terms: The codes of the terms.
+
+        Returns:
+            A CSR matrix with one row per term.
+        """
+        postings = self.term_freqs[terms]
+        if self._added_freqs is not None:
+            postings = postings + self._added_freqs[terms]
+
+        return postings
+
+
+    def save(self, path: str):
+        """
+        Save the index to a directory.
+
+        The postings of the term frequency matrix and the document statistics are saved as `.npy`
+        files, the terms as a vocabulary and the parameters as JSON, so `load` can memory-map everything.
+
+        Args:
+            path: The path to the directory where the index will be saved.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        term_freqs = self._postings(np.arange(len(self.vocab)))
+        term_freqs.sort_indices()
+
+        arrays = {
+            "term_freqs": term_freqs.data,
+            "doc_indices": term_freqs.indices,
+            "term_offsets": term_freqs.indptr,
+            "doc_len": self.doc_len,
+            "doc_freqs": self.doc_freqs,
+            "deleted": self.deleted
+        }
+        for name, array in arrays.items():
+            with open(os.path.join(path, f"{name}.npy"), "wb") as f:
+                np.save(f, array)
+
+        self.vocab.save(os.path.join(path, "terms"))
+
+        params = {name: float(getattr(self, name)) for name in self._params()}
+        with open(os.path.join(path, "params.json"), "w") as f:
+            json.dump({"model": type(self).__name__, "params": params}, f)
+
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """
+        Load an index saved with `save`. The arrays and the terms are memory-mapped, not read into
+        memory, so loading takes the same time for any corpus size.
+
+        Args:
+            path: The path to the directory of the index.
+
+        Returns:
+            The loaded index, of the BM25 variant it was saved from.
+
+        Raises:
+            ValueError: If the index was saved from a variant that is not `cls` or one of its subclasses.
+        """
+        with open(os.path.join(path, "params.json")) as f:
+            saved = json.load(f)
+
+        variants = {variant.__name__: variant for variant in [cls, *cls.__subclasses__()]}
+        if saved["model"] not in variants:
+            raise ValueError(f"Index {path} was saved from {saved['model']}, not {cls.__name__}.")
+
+        index = object.__new__(variants[saved["model"]])
+        index.__dict__.update(saved["params"])
+
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ["term_freqs", "doc_indices", "term_offsets", "doc_len", "doc_freqs", "deleted"]
+        }
+
+        index.vocab = MappedVocabulary(os.path.join(path, "terms"))
+        index._doc_len = arrays["doc_len"]
+        index._deleted = arrays["deleted"]
+        index._num_docs = len(arrays["doc_len"])
+        index._doc_freqs = arrays["doc_freqs"]
+        index.term_freqs = sp.csr_matrix(
+            (arrays["term_freqs"], arrays["doc_indices"], arrays["term_offsets"]),
+            shape=(len(index.vocab), len(index.doc_len)),
+            copy=False
+        )
+        index._added_freqs = None
+
+        index.corpus_size = int(index._num_docs - index.deleted.sum())
+        index._total_len = index.doc_len[~index.deleted].sum()
+        index._update_stats()
+
+        return index
+
+
+    def _params(self) -> List[str]:
+        """ Return the names of the parameters of the BM25 variant, which `save` stores. """
+        return ["k1", "b"]
+
+
+    def _encode_queries(self, queries: List[List[str]]) -> sp.csr_matrix:
+        """
+        Count the indexed terms of every query.
+
+        Args:
+            queries: The tokens of every query.
+
+        Returns:
+            A query x term CSR matrix of term counts. Tokens that are not in the corpus are dropped.
+        """
+        rows = []
+        terms = []
+
+        for row, query in enumerate(queries):
+            codes = [self.vocab.encode(token) for token in query if token in self.vocab]
+            rows.extend([row] * len(codes))
+            terms.extend(codes)
+
+        return sp.csr_matrix(
+            (np.ones(len(terms)), (np.array(rows, dtype=np.int64), np.array(terms, dtype=np.int64))),
+            shape=(len(queries), len(self.vocab))
+        )
+
+
+    def _length_norm(self, doc_len: np.ndarray) -> np.ndarray:
+        """ Return the document length normalization 1 - b + b * dl / avgdl. """
+        return 1 - self.b + self.b * doc_len / self.avgdl
+
+
+    @abstractmethod
+    def _calc_idf(self, doc_freqs: np.ndarray) -> np.ndarray:
+        """
+        Compute the idf of every term.
+
+        Args:
+            doc_freqs: The number of documents each term occurs in.
+
+        Returns:
+            The idf of every term.
+        """
+        pass
+
+
+    @abstractmethod
+    def _calc_weights(self, term_freqs: np.ndarray, idf: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+        """
+        Compute the weights of the non-zero entries of the term x document matrix.
+
+        Args:
+            term_freqs: The frequency of the term in the document.
+            idf: The idf of the term.
+            doc_len: The length of the document.
+
+        Returns:
+            The BM25 weight of every entry.
+        """
+        pass
+
+
+    def _calc_offsets(self) -> np.ndarray:
+        """
+        Compute the score every document gets for a query term whatever its frequency, which is added
+        to the sparse product once per occurrence of the term in the query.
+
+        Returns:
+            The offset of every term.
+        """
+        return np.zeros(len(self.idf))
+
+
+class BM25OkapiIndex(BM25Index):
+    """
+    BM25OkapiIndex implements Okapi BM25, with negative idfs floored at `epsilon` times the average idf.
+    """
+
+    def __init__(self, corpus: Union[List[List[str]], TermCounts], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.epsilon = epsilon
+        super().__init__(corpus, k1, b)
+
+
+    def _params(self) -> List[str]:
+        return [*super()._params(), "epsilon"]
+
+
+    def _calc_idf(self, doc_freqs: np.ndarray) -> np.ndarray:
+        idf = np.log(self.corpus_size - doc_freqs + 0.5) - np.log(doc_freqs + 0.5)
+        self.average_idf = idf.sum() / len(idf)
+
+        return np.where(idf < 0, self.epsilon * self.average_idf, idf)
+
+
+    def _calc_weights(self, term_freqs: np.ndarray, idf: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+        return idf * (term_freqs * (self.k1 + 1) / (term_freqs + self.k1 * self._length_norm(doc_len)))
+
+
+class BM25LIndex(BM25Index):
+    """
+    BM25LIndex implements BM25L, which shifts the normalized term frequency by `delta` to favor long documents.
+    """
+
+    def __init__(self, corpus: Union[List[List[str]], TermCounts], k1: float = 1.5, b: float = 0.75, delta: float = 0.5):
+        self.delta = delta
+        super().__init__(corpus, k1, b)
+
+
+    def _params(self) -> List[str]:
+        return [*super()._params(), "delta"]
+
+
+    def _calc_idf(self, doc_freqs: np.ndarray) -> np.ndarray:
+        return np.log(self.corpus_size + 1) - np.log(doc_freqs + 0.5)
+
+
+    def _calc_weights(self, term_freqs: np.ndarray, idf: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+        ctd = term_freqs / self._length_norm(doc_len)
+        return idf * term_freqs * (self.k1 + 1) * (ctd + self.delta) / (self.k1 + ctd + self.delta)
+
+
+class BM25PlusIndex(BM25Index):
+    """
+    BM25PlusIndex implements BM25+, which adds `delta` times the idf of a query term to every document,
+    including those without the term. That part is the same for all documents, so it is kept as a
+    per-term offset instead of being stored for every document.
+    """
+
+    def __init__(self, corpus: Union[List[List[str]], TermCounts], k1: float = 1.5, b: float = 0.75, delta: float = 1):
+        self.delta = delta
+        super().__init__(corpus, k1, b)
+
+
+    def _params(self) -> List[str]:
+        return [*super()._params(), "delta"]
+
+
+    def _calc_idf(self, doc_freqs: np.ndarray) -> np.ndarray:
+        return np.log((self.corpus_size + 1) / doc_freqs)
+
+
+    def _calc_weights(self, term_freqs: np.ndarray, idf: np.ndarray, doc_len: np.ndarray) -> np.ndarray:
+        return idf * (term_freqs * (self.k1 + 1)) / (self.k1 * self._length_norm(doc_len) + term_freqs)
+
+
+    def _calc_offsets(self) -> np.ndarray:
+        return self.idf * self.delta
+
+
+def _seek_postings(matrix: sp.csr_matrix, terms: np.ndarray, cursors: np.ndarray, stop: int) -> np.ndarray:
+    """
+    Find where the postings of some terms reach a document, with one binary search per term run in step.
+
+    Args:
+        matrix: The term x document CSR matrix, with sorted indices.
+        terms: The codes of the terms.
+        cursors: The position of the first posting of every term still to be read.
+        stop: The document to be reached.
+
+    Returns:
+        The position of the first posting of every term in a document from `stop` on.
+    """
+    low, high = cursors.copy(), matrix.indptr[terms + 1].astype(np.int64)
+
+    while True:
+        active = low < high
+        if not active.any():
+            return low
+
+        middle = (low + high) // 2
+        before = active & (matrix.indices[np.minimum(middle, len(matrix.indices) - 1)] < stop)
+        low = np.where(before, middle + 1, low)
+        high = np.where(active & ~before, middle, high)
+
+
+def _slice_postings(matrix: sp.csr_matrix, starts: np.ndarray, ends: np.ndarray, start: int, stop: int) -> sp.csr_matrix:
+    """ Copy the postings between `starts` and `ends` of every term into a term x block CSR matrix. """
+    lengths = ends - starts
+    indptr = np.concatenate([[0], np.cumsum(lengths)])
+    positions = np.repeat(starts - indptr[:-1], lengths) + np.arange(indptr[-1])
+
+    return sp.csr_matrix(
+        (matrix.data[positions], matrix.indices[positions] - start, indptr),
+        shape=(len(starts), stop - start)
+    )
+
+
+def split_on_spaces(text: str) -> List[str]:
+    """ Split a text on single spaces. Unlike a lambda, it can be sent to worker processes. """
+    return text.split(" ")
+
+
+_worker_state: Dict[str, Any] = {}
+
+
+def _init_worker(tokenizer: Optional[Callable], index: Optional[BM25Index]):
+    """ Keep the tokenizer and the index of a worker process for the tasks it runs. """
+    _worker_state["tokenizer"] = tokenizer
+    _worker_state["index"] = index
+
+
+def _count_chunk(texts: List[str]) -> TermCounts:
+    """ Tokenize a chunk of the corpus in a worker process and count its terms. """
+    tokenizer = _worker_state["tokenizer"]
+    return count_terms([tokenizer(text) for text in texts], bulk=False)
+
+
+def _rank_chunk(texts: List[str], top_k: int, block_size: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+    """ Rank the passages for a batch of queries in a worker process. """
+    return _rank_texts(_worker_state["index"], _worker_state["tokenizer"], texts, top_k, block_size)
+
+
+def _rank_texts(
+    index: BM25Index,
+    tokenizer: Optional[Callable],
+    texts: List[Any],
+    top_k: int,
+    block_size: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Tokenize a batch of queries, unless the tokenizer is None and they are tokenized already, and select their best passages. """
+    queries = texts if tokenizer is None else [tokenizer(text) for text in texts]
+    return index.top_k_batch(queries, top_k, block_size)
+
+
 class BM25Retriever(BaseRetriever):
-    def __init__(self, model: Encoder, tokenizer: Optional[Callable] = None):
+    def __init__(self, model: Encoder, tokenizer: Optional[Callable] = None, num_workers: int = 1):
+        """
+        Initialize the BM25Retriever object.
+
+        Args:
+            model: The BM25 variant, BM25, BM25L or BM25PLUS.
+            tokenizer: The function splitting a text into tokens. A `Tokenizer` tokenizes texts in
+                batches in this process. Other functions are called once per text, on the workers if
+                there are several, so they must be picklable, such as module-level functions. Defaults
+                to a `Tokenizer` with its default settings.
+            num_workers: The number of processes tokenizing the corpus and scoring queries. A `Tokenizer`
+                runs polars, which is not safe in forked processes, so it splits the texts into
+                `num_workers` chunks tokenized in parallel on the polars thread pool instead. The index
+                and the rankings are the same for any number of workers. Defaults to 1, which runs
+                everything in this process.
+
+        Raises:
+            ValueError: If the model is not a BM25 variant or the number of workers is not positive.
+        """
+        if num_workers < 1:
+            raise ValueError(f"The number of workers must be positive, got {num_workers}.")
+
         self.model_name = model
         self.model = self._get_model(model)
-        self.tokenizer = tokenizer or (lambda x: x.split(" "))
+        self.tokenizer = tokenizer or Tokenizer()
+        self.num_workers = num_workers
 
         self.indexed_corpus = None
         self.corpus = None
@@ -31,54 +711,223 @@ class BM25Retriever(BaseRetriever):
     def _get_model(self, model: Encoder) -> Any:
         match model:
             case Encoder.BM25:
-                return BM25Okapi
+                return BM25OkapiIndex
             case Encoder.BM25L:
-                return BM25L
+                return BM25LIndex
             case Encoder.BM25PLUS:
-                return BM25Plus
+                return BM25PlusIndex
             case _:
                 raise ValueError("Invalid BM25 model. Must be BM25, BM25L, or BM25PLUS.")
 
 
+    def _pool(self, tokenizer: Optional[Callable], index: Optional[BM25Index] = None) -> ProcessPoolExecutor:
+        """
+        Start the worker processes.
+
+        Where processes are forked, the workers share the memory of the index instead of copying it.
+
+        Args:
+            tokenizer: The tokenizer the workers call on every text, or None if they get tokenized texts.
+            index: The index the workers score queries against, if any.
+
+        Returns:
+            A pool of `num_workers` processes.
+        """
+        if index is not None:
+            # Compute the idfs before the workers start, so they share them instead of each computing them.
+            index.idf
+
+        return ProcessPoolExecutor(self.num_workers, initializer=_init_worker, initargs=(tokenizer, index))
+
+
     def index(self, corpus: Passages):
+        """
+        Tokenize the passages and build the BM25 index.
+
+        Args:
+            corpus: The passages to be indexed.
+
+        Raises:
+            ValueError: If the corpus is not a Passages object.
+        """
         if not isinstance(corpus, Passages):
             raise ValueError("Invalid corpus type, must be Passages or Queries.")
-        
-        tokenized_corpus = [self.tokenizer(corpus[doc_id]) for doc_id in corpus]
-        self.index_id_lookup = {i: doc_id for i, doc_id in enumerate(corpus)}
+
+        texts = [corpus[doc_id] for doc_id in corpus.vocab]
+        self.index_id_lookup = IndexIds(corpus.vocab)
 
         logger.info(f"Indexing corpus on {self.model_name}...")
-        self.indexed_corpus = self.model(tokenized_corpus)
+        self.indexed_corpus = self.model(self._count_terms(texts))
         self.corpus = corpus
 
         logger.info("Finished indexing corpus.")
 
 
-    def rank_passages(self, queries: Queries, top_k: Optional[int] = None) -> Ranking:
-        if self.indexed_corpus is None or self.corpus is None:
+    def add(self, passages: Passages):
+        """
+        Add passages to the index. Only the new passages are tokenized, and the index is updated in place.
+
+        Args:
+            passages: The passages to be added.
+
+        Raises:
+            ValueError: If the index has not been built, if `passages` is not a Passages object, or if a
+                passage is already indexed.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+        if not isinstance(passages, Passages):
+            raise ValueError("Invalid corpus type, must be Passages.")
+
+        ids = list(passages.vocab)
+        counts = self._count_terms([passages[doc_id] for doc_id in ids])
+
+        self.index_id_lookup.add(ids)
+        self.indexed_corpus.add(counts)
+
+
+    def remove(self, pids: Iterable[Any]):
+        """
+        Remove passages from the index. They are no longer ranked.
+
+        Args:
+            pids: The IDs of the passages to be removed.
+
+        Raises:
+            ValueError: If the index has not been built.
+            KeyError: If a passage is not indexed.
+        """
+        if self.indexed_corpus is None:
             raise ValueError("Index not built. Please call the index method first.")
 
-        tokenized_queries = [self.tokenizer(queries[query_id]) for query_id in queries]
+        self.indexed_corpus.remove(self.index_id_lookup.remove(pids))
+
+
+    def _count_terms(self, texts: List[str]) -> TermCounts:
+        """
+        Tokenize texts and count their terms.
+
+        A `Tokenizer` counts the terms of all texts at once, from its cache if it has one, tokenizing
+        one chunk of texts per worker on the polars thread pool. Otherwise, with several workers, each
+        worker tokenizes and counts the terms of a contiguous chunk of the texts, and the chunks are
+        merged in order.
+
+        Args:
+            texts: The texts to be tokenized.
+
+        Returns:
+            The term counts of the texts.
+        """
+        if isinstance(self.tokenizer, Tokenizer):
+            return self.tokenizer.count_terms(texts, num_chunks=self.num_workers)
+
+        if self.num_workers > 1:
+            chunks = [texts[offset:offset + length] for offset, length in shard_bounds(len(texts), self.num_workers)]
+
+            with self._pool(self.tokenizer) as pool:
+                return merge_counts(list(pool.map(_count_chunk, chunks)))
+
+        return count_terms([self.tokenizer(text) for text in texts])
+
+
+    def save_index(self, path: str):
+        """
+        Save the index and the IDs of the indexed passages to a directory.
+
+        Args:
+            path: The path to the directory where the index will be saved.
+
+        Raises:
+            ValueError: If the index has not been built.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+
+        self.indexed_corpus.save(path)
+        self.index_id_lookup.save(os.path.join(path, "passages"))
+
+
+    def load_index(self, path: str):
+        """
+        Load an index saved with `save_index` instead of building it. The index is memory-mapped, so
+        processes that load the same index share its memory.
+
+        Args:
+            path: The path to the directory of the index.
+
+        Raises:
+            ValueError: If the index was saved from another BM25 variant.
+        """
+        self.indexed_corpus = self.model.load(path)
+        self.index_id_lookup = IndexIds.load(os.path.join(path, "passages"))
+        self.corpus = None
+
+
+    def rank_passages(
+        self,
+        queries: Queries,
+        top_k: Optional[int] = None,
+        batch_size: int = 256,
+        memory_budget: Optional[int] = None
+    ) -> Ranking:
+        """
+        Rank the indexed passages for every query.
+
+        Queries are scored in batches, each with one sparse matrix product against the index, and only
+        the best `top_k` passages of every query are sorted. With several workers, the batches are
+        tokenized and scored in parallel.
+
+        With a memory budget, a batch is scored in tiles of passages whose best passages are merged
+        into a running top-k. Only the postings of the passages of a tile are sliced out of the index,
+        and the batch and tile sizes are chosen from the average number of postings per passage so that
+        the tiles of all workers fit the budget.
+
+        Args:
+            queries: The queries to rank the passages for.
+            top_k: The number of best passages to keep per query. Defaults to all passages.
+            batch_size: The number of queries scored at once. A batch holds a dense score matrix of
+                `batch_size` x corpus size floats. Ignored with a memory budget. Defaults to 256.
+            memory_budget: The memory in bytes the score tiles may take. The rankings themselves are not
+                part of it. Defaults to None, no budget.
+
+        Returns:
+            The ranking of the passages for every query.
+
+        Raises:
+            ValueError: If the index has not been built or loaded.
+        """
+        if self.indexed_corpus is None:
+            raise ValueError("Index not built. Please call the index method first.")
+
+        if top_k is None or top_k > len(self.index_id_lookup):
+            top_k = len(self.index_id_lookup)
+
+        block_size = None
+        if memory_budget is not None:
+            batch_size, block_size = tile_sizes(
+                memory_budget // self.num_workers,
+                self.index_id_lookup.num_rows,
+                top_k,
+                score_bytes=8,
+                row_nnz=self.indexed_corpus.num_postings() / self.index_id_lookup.num_rows,
+                sparse=True
+            )
 
-        ranking_list = []
-        for i, query_id in enumerate(queries):
-            scores = self.indexed_corpus.get_scores(tokenized_queries[i])
-            score_array = np.array(scores)
+        texts = [queries[query_id] for query_id in queries]
+        batches = [texts[start:start + batch_size] for start in range(0, len(texts), batch_size)]
 
-            if top_k is not None:
-                top_k_indices = score_array.argsort()[-top_k:][::-1]
-                top_k_scores = score_array[top_k_indices]
-                top_k_doc_ids = [self.index_id_lookup[i] for i in top_k_indices]
+        tokenizer = self.tokenizer
+        if isinstance(tokenizer, Tokenizer):
+            batches = [tokenizer.tokenize_many(batch, num_chunks=self.num_workers) for batch in batches]
+            tokenizer = None
 
-                for j, doc_id in enumerate(top_k_doc_ids):
-                    ranking_list.append([query_id, doc_id, top_k_scores[j], j])
-            
-            else:
-                sorted_indices = score_array.argsort()[::-1]
+        if self.num_workers > 1 and len(batches) > 1:
+            with self._pool(tokenizer, self.indexed_corpus) as pool:
+                results = list(pool.map(_rank_chunk, batches, [top_k] * len(batches), [block_size] * len(batches)))
+        else:
+            results = [_rank_texts(self.indexed_corpus, tokenizer, batch, top_k, block_size) for batch in batches]
 
-                for j, doc_id in enumerate(sorted_indices):
-                    ranking_list.append([query_id, self.index_id_lookup[doc_id], score_array[doc_id], j])
-        
-        ranking = Ranking(ranking_list)
+        indices = [batch_indices for batch_indices, _ in results]
+        scores = [batch_scores for _, batch_scores in results]
 
-        return ranking
+        return build_ranking(queries.vocab, self.index_id_lookup, indices, scores)
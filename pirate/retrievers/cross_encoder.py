@@ -1,3 +1,5 @@
+import numpy as np
+
 from typing import Optional
 from sentence_transformers import CrossEncoder as CrossEncoderModel
 
@@ -7,6 +9,8 @@ from pirate.data import (
     Ranking,
 )
 
+from .utils import build_ranking, top_k_scores
+
 
 class CrossEncoder(CrossEncoderModel):
     def __init__(
@@ -24,18 +28,19 @@ class CrossEncoder(CrossEncoderModel):
 
 
     def rank_passages(self, queries: Queries, corpus: Passages, top_k: Optional[int] = None, *args, **kwargs) -> Ranking:
-        self.list_of_passages = [corpus[doc_id] for doc_id in corpus]
-        self.index_id_lookup = {i: doc_id for i, doc_id in enumerate(corpus)}
+        self.list_of_passages = [corpus[doc_id] for doc_id in corpus.vocab]
+        self.index_id_lookup = corpus.vocab
         self.corpus = corpus
 
-        ranking_list = []
-        for i, query_id in enumerate(queries):
+        indices = []
+        scores = []
+        for query_id in queries:
             query_content = queries[query_id]
-            ranks = self.rank(query_content, self.list_of_passages, top_k=top_k, *args, **kwargs)
-           
-            for i, rank in enumerate(ranks):
-                ranking_list.append([query_id, self.index_id_lookup[rank["corpus_id"]], rank["score"], i])
-        
-        ranking = Ranking(ranking_list)
-
-        return ranking
\ No newline at end of file
+            pairs = [[query_content, passage] for passage in self.list_of_passages]
+            query_scores = self.predict(pairs, *args, **kwargs)
+
+            query_indices, query_scores = top_k_scores(np.asarray(query_scores).reshape(1, -1), top_k)
+            indices.append(query_indices)
+            scores.append(query_scores)
+
+        return build_ranking(queries.vocab, self.index_id_lookup, indices, scores)
@@ -0,0 +1,226 @@
+import os
+import json
+import numpy as np
+
+from typing import Dict, List, Optional, Tuple
+
+from pirate.data.index import hash_text
+
+
+class EmbeddingCache:
+    """
+    EmbeddingCache keeps the embeddings of texts for one model in memory-mapped files on disk.
+
+    Texts are keyed by the hash of their exact text, since the model may embed texts that only differ
+    in case or whitespace differently. The cache holds at most `capacity` embeddings. When it is full, the
+    least recently used entries are evicted. The files are written in place, so a single process
+    should write to a cache at a time.
+    """
+
+    def __init__(self, path: str, model_name: str, max_entries: int = 1_000_000, max_bytes: Optional[int] = None):
+        """
+        Initialize the EmbeddingCache object and open the cache if it exists.
+
+        The files are created by the first `put_many`, once the embedding dimension is known.
+
+        Args:
+            path: The path to the directory of the cache.
+            model_name: The name of the model whose embeddings are cached.
+            max_entries: The maximum number of cached embeddings. Defaults to 1,000,000.
+            max_bytes: The maximum size of the embedding file in bytes. Defaults to None, no limit
+                other than `max_entries`.
+
+        Raises:
+            ValueError: If the cache at `path` holds embeddings of another model.
+        """
+        self.path = path
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.capacity = 0
+        self.size = 0
+        self._tick = 0
+        self._slots: Dict[int, int] = {}
+
+        self.embeddings: Optional[np.ndarray] = None
+        self.keys: Optional[np.ndarray] = None
+        self.ticks: Optional[np.ndarray] = None
+
+        if os.path.exists(self._meta_path()):
+            self._open()
+
+
+    def key(self, text: str) -> int:
+        """
+        Get the cache key of a text.
+
+        Args:
+            text: The text.
+
+        Returns:
+            The hash of the text.
+        """
+        return hash_text(text)
+
+
+    def get_many(self, texts: List[str]) -> Tuple[Optional[np.ndarray], np.ndarray]:
+        """
+        Look up the embeddings of many texts. Hits count as uses for the LRU eviction.
+
+        Args:
+            texts: The texts to be looked up.
+
+        Returns:
+            An array with one row per text, filled for the cached texts, or None if the cache is empty,
+            and the positions of the texts that are not cached.
+        """
+        if self.embeddings is None:
+            return None, np.arange(len(texts))
+
+        slots = np.array([self._slots.get(self.key(text), -1) for text in texts], dtype=np.int64)
+        hits = slots >= 0
+
+        embeddings = np.zeros((len(texts), self.embeddings.shape[1]), dtype=self.embeddings.dtype)
+        embeddings[hits] = self.embeddings[slots[hits]]
+
+        self._tick += 1
+        self.ticks[slots[hits]] = self._tick
+
+        return embeddings, np.flatnonzero(~hits)
+
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray):
+        """
+        Cache the embeddings of many texts, evicting the least recently used entries if the cache is full.
+
+        Only the last `capacity` distinct texts are cached. The cached texts of the batch are marked as
+        used first, so making room for the new ones never evicts them.
+
+        Args:
+            texts: The texts.
+            embeddings: The embeddings of the texts, one row per text.
+        """
+        if not texts:
+            return
+
+        if self.embeddings is None:
+            self._create(embeddings.shape[1], embeddings.dtype)
+        if self.capacity == 0:
+            return
+
+        entries = {}
+        for text, embedding in zip(texts, embeddings):
+            entries[self.key(text)] = embedding
+        entries = list(entries.items())[-self.capacity:]
+
+        self._tick += 1
+
+        cached = np.array([self._slots[key] for key, _ in entries if key in self._slots], dtype=np.int64)
+        self.ticks[cached] = self._tick
+
+        new_keys = [key for key, _ in entries if key not in self._slots]
+        self._evict(self.size + len(new_keys) - self.capacity)
+
+        for key in new_keys:
+            self._slots[key] = self.size
+            self.keys[self.size] = key
+            self.size += 1
+
+        slots = np.array([self._slots[key] for key, _ in entries], dtype=np.int64)
+        self.embeddings[slots] = np.stack([embedding for _, embedding in entries])
+        self.ticks[slots] = self._tick
+
+        self.flush()
+
+
+    def flush(self):
+        """ Write the cached embeddings and the cache state to disk. """
+        if self.embeddings is None:
+            return
+
+        for array in [self.embeddings, self.keys, self.ticks]:
+            array.flush()
+
+        with open(self._meta_path(), "w") as f:
+            json.dump({"model": self.model_name, "size": self.size, "tick": self._tick}, f)
+
+
+    def _evict(self, count: int):
+        """
+        Evict the least recently used entries. The last entries are moved into the freed slots, so
+        the cached entries always fill the first `size` slots.
+
+        Args:
+            count: The number of entries to be evicted.
+        """
+        if count <= 0:
+            return
+
+        evicted = np.sort(np.argpartition(self.ticks[:self.size], count - 1)[:count])
+        for slot in evicted.tolist():
+            del self._slots[int(self.keys[slot])]
+
+        kept = np.setdiff1d(np.arange(self.size - count, self.size), evicted)
+        freed = evicted[evicted < self.size - count]
+
+        self.embeddings[freed] = self.embeddings[kept]
+        self.keys[freed] = self.keys[kept]
+        self.ticks[freed] = self.ticks[kept]
+        for slot, key in zip(freed.tolist(), self.keys[freed].tolist()):
+            self._slots[key] = slot
+
+        self.size -= count
+
+
+    def _create(self, dim: int, dtype: np.dtype):
+        """ Create the cache files for embeddings of `dim` dimensions. """
+        os.makedirs(self.path, exist_ok=True)
+
+        self.capacity = self.max_entries
+        if self.max_bytes is not None:
+            self.capacity = min(self.capacity, self.max_bytes // (dim * np.dtype(dtype).itemsize))
+
+        open_memmap = np.lib.format.open_memmap
+        self.embeddings = open_memmap(self._array_path("embeddings"), "w+", dtype=dtype, shape=(self.capacity, dim))
+        self.keys = open_memmap(self._array_path("keys"), "w+", dtype=np.uint64, shape=(self.capacity,))
+        self.ticks = open_memmap(self._array_path("ticks"), "w+", dtype=np.int64, shape=(self.capacity,))
+
+
+    def _open(self):
+        """ Memory-map the cache files. """
+        with open(self._meta_path()) as f:
+            meta = json.load(f)
+
+        if meta["model"] != self.model_name:
+            raise ValueError(f"Cache {self.path} holds embeddings of {meta['model']}, not {self.model_name}.")
+
+        self.embeddings = np.load(self._array_path("embeddings"), mmap_mode="r+")
+        self.keys = np.load(self._array_path("keys"), mmap_mode="r+")
+        self.ticks = np.load(self._array_path("ticks"), mmap_mode="r+")
+
+        self.capacity = len(self.keys)
+        self.size = meta["size"]
+        self._tick = meta["tick"]
+        self._slots = dict(zip(self.keys[:self.size].tolist(), range(self.size)))
+
+        if self.size > self.max_entries:
+            self._evict(self.size - self.max_entries)
+
+
+    def _array_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.npy")
+
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "cache.json")
+
+
+    def __len__(self) -> int:
+        """ Return the number of cached embeddings. """
+        return self.size
+
+
+    def __repr__(self):
+        """ Return the string representation of the EmbeddingCache object. """
+        return f"EmbeddingCache({self.path}, {self.size}/{self.capacity} embeddings)"
@@ -0,0 +1,160 @@
+import os
+import json
+import numpy as np
+
+from typing import Optional
+
+
+STORAGE_TYPES = ("float32", "float16", "int8", "binary")
+
+
+class Quantizer:
+    """
+    Quantizer stores normalized embeddings in a compact form and decodes them back a block at a time.
+
+    - `float32` keeps the embeddings as they are.
+    - `float16` halves their size.
+    - `int8` maps every dimension linearly onto [-127, 127], with the offset and scale of the dimension
+      fitted to the indexed embeddings, for a quarter of the size.
+    - `binary` keeps the sign bit of every dimension, for a 32nd of the size. Decoded rows are the
+      signs scaled to unit norm, so the inner product of two decoded rows is 1 - 2 * Hamming distance / dim.
+    """
+
+    def __init__(
+        self,
+        storage: str = "float32",
+        dim: Optional[int] = None,
+        offsets: Optional[np.ndarray] = None,
+        scales: Optional[np.ndarray] = None
+    ):
+        """
+        Initialize the Quantizer object.
+
+        Args:
+            storage: The storage type, one of `STORAGE_TYPES`. Defaults to "float32".
+            dim: The number of dimensions of the embeddings. Set by `fit`.
+            offsets: The offset of every dimension for `int8` storage. Set by `fit`.
+            scales: The scale of every dimension for `int8` storage. Set by `fit`.
+
+        Raises:
+            ValueError: If the storage type is not supported.
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Invalid storage type {storage}, must be one of {STORAGE_TYPES}.")
+
+        self.storage = storage
+        self.dim = dim
+        self.offsets = offsets
+        self.scales = scales
+
+
+    def fit(self, embeddings: np.ndarray) -> "Quantizer":
+        """
+        Fit the quantization to embeddings. Only `int8` storage has parameters, the range of every
+        dimension. Embeddings encoded later are clipped to that range.
+
+        Args:
+            embeddings: The embeddings, one row per text.
+
+        Returns:
+            The fitted Quantizer.
+        """
+        self.dim = embeddings.shape[1]
+
+        if self.storage == "int8":
+            if len(embeddings):
+                low, high = embeddings.min(axis=0), embeddings.max(axis=0)
+            else:
+                low, high = np.zeros(self.dim, dtype=np.float32), np.zeros(self.dim, dtype=np.float32)
+
+            self.offsets = ((high + low) / 2).astype(np.float32)
+            self.scales = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+
+        return self
+
+
+    def encode(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Encode embeddings into their compact form.
+
+        Args:
+            embeddings: The embeddings, one row per text.
+
+        Returns:
+            The codes, one row per text.
+        """
+        if self.storage == "float16":
+            return embeddings.astype(np.float16)
+        if self.storage == "int8":
+            codes = np.rint((embeddings - self.offsets) / self.scales)
+            return np.clip(codes, -127, 127).astype(np.int8)
+        if self.storage == "binary":
+            return np.packbits(embeddings > 0, axis=1)
+
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Decode codes back into float32 embeddings.
+
+        Args:
+            codes: The codes, one row per text.
+
+        Returns:
+            The approximate embeddings, one row per text.
+        """
+        if self.storage == "int8":
+            return codes.astype(np.float32) * self.scales + self.offsets
+        if self.storage == "binary":
+            signs = np.unpackbits(codes, axis=1, count=self.dim).astype(np.float32)
+            return (2 * signs - 1) / np.float32(np.sqrt(self.dim))
+
+        return np.asarray(codes, dtype=np.float32)
+
+
+    def save(self, path: str):
+        """
+        Save the quantization parameters to `quantizer.json` in a directory.
+
+        Args:
+            path: The path to the directory.
+        """
+        params = {"storage": self.storage, "dim": self.dim}
+        if self.offsets is not None:
+            params["offsets"] = self.offsets.tolist()
+            params["scales"] = self.scales.tolist()
+
+        with open(os.path.join(path, "quantizer.json"), "w") as f:
+            json.dump(params, f)
+
+
+    @classmethod
+    def load(cls, path: str) -> "Quantizer":
+        """
+        Load quantization parameters saved with `save`. Directories without them hold float32 embeddings.
+
+        Args:
+            path: The path to the directory.
+
+        Returns:
+            The loaded Quantizer.
+        """
+        params_path = os.path.join(path, "quantizer.json")
+        if not os.path.exists(params_path):
+            return cls()
+
+        with open(params_path) as f:
+            params = json.load(f)
+
+        return cls(
+            params["storage"],
+            params["dim"],
+            np.array(params["offsets"], dtype=np.float32) if "offsets" in params else None,
+            np.array(params["scales"], dtype=np.float32) if "scales" in params else None
+        )
+
+
+    def __repr__(self):
+        """ Return the string representation of the Quantizer object. """
+        return f"Quantizer({self.storage}, dim={self.dim})"
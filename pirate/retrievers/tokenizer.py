@@ -0,0 +1,301 @@
+import os
+import shutil
+import hashlib
+import numpy as np
+import polars as pl
+
+from itertools import chain
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple
+
+from pirate.data import Vocabulary
+from pirate.data.shards import shard_bounds
+
+
+ENGLISH_STOPWORDS = frozenset([
+    "a", "about", "above", "after", "again", "against", "all", "am", "an", "and", "any", "are", "as",
+    "at", "be", "because", "been", "before", "being", "below", "between", "both", "but", "by", "can",
+    "did", "do", "does", "doing", "down", "during", "each", "few", "for", "from", "further", "had",
+    "has", "have", "having", "he", "her", "here", "hers", "herself", "him", "himself", "his", "how",
+    "i", "if", "in", "into", "is", "it", "its", "itself", "just", "me", "more", "most", "my", "myself",
+    "no", "nor", "not", "now", "of", "off", "on", "once", "only", "or", "other", "our", "ours",
+    "ourselves", "out", "over", "own", "same", "she", "should", "so", "some", "such", "than", "that",
+    "the", "their", "theirs", "them", "themselves", "then", "there", "these", "they", "this", "those",
+    "through", "to", "too", "under", "until", "up", "very", "was", "we", "were", "what", "when",
+    "where", "which", "while", "who", "whom", "why", "will", "with", "you", "your", "yours",
+    "yourself", "yourselves"
+])
+
+
+class TermCounts(NamedTuple):
+    """
+    The tokens of a corpus, interned as codes into its distinct terms.
+
+    Attributes:
+        terms: The distinct terms, in the order they first occur.
+        codes: The code of every token, with the tokens of all documents one after the other.
+        doc_len: The number of tokens of every document.
+    """
+    terms: List[str]
+    codes: np.ndarray
+    doc_len: np.ndarray
+
+
+def count_terms(corpus: List[List[str]], bulk: bool = True) -> TermCounts:
+    """
+    Intern the tokens of a tokenized corpus.
+
+    Args:
+        corpus: The tokenized documents.
+        bulk: Whether to intern the tokens in bulk through polars. Worker processes intern them in
+            Python instead, since the polars thread pool of a forked process may be left locked.
+            Both give the same codes. Defaults to True.
+
+    Returns:
+        The term counts of the corpus.
+    """
+    vocab = Vocabulary()
+    tokens = list(chain.from_iterable(corpus))
+
+    codes = vocab.encode_many(pl.Series(tokens, dtype=pl.String) if bulk and tokens else tokens)
+    doc_len = np.fromiter((len(document) for document in corpus), dtype=np.int64, count=len(corpus))
+
+    return TermCounts(vocab.ids, codes, doc_len)
+
+
+def merge_counts(chunks: List[TermCounts]) -> TermCounts:
+    """
+    Merge the term counts of consecutive chunks of a corpus.
+
+    Terms are re-interned in the order they first occur across the chunks, so the result is the same
+    as counting the whole corpus at once.
+
+    Args:
+        chunks: The term counts of every chunk, in corpus order.
+
+    Returns:
+        The term counts of the whole corpus.
+    """
+    vocab = Vocabulary()
+    codes = [vocab.encode_many(chunk.terms)[chunk.codes] for chunk in chunks if len(chunk.codes)]
+
+    return TermCounts(
+        vocab.ids,
+        np.concatenate(codes) if codes else np.empty(0, dtype=np.int64),
+        np.concatenate([chunk.doc_len for chunk in chunks]) if chunks else np.empty(0, dtype=np.int64)
+    )
+
+
+class Tokenizer:
+    """
+    Tokenizer splits texts into words in batches, with polars string expressions instead of a Python
+    call per text.
+
+    Texts are lowercased, split into the matches of a regular expression, stripped of stopwords and
+    optionally stemmed, in that order. Stemmers only see each distinct word once. With a cache
+    directory, the term counts of a corpus are saved under a fingerprint of the corpus and the
+    tokenizer settings, so a corpus is tokenized once however many times it is indexed.
+    """
+
+    def __init__(
+        self,
+        lowercase: bool = True,
+        pattern: str = r"\w+",
+        stopwords: Optional[Iterable[str]] = None,
+        stemmer: Optional[Callable[[str], str]] = None,
+        cache_dir: Optional[str] = None
+    ):
+        """
+        Initialize the Tokenizer object.
+
+        Args:
+            lowercase: Whether to lowercase the texts. Defaults to True.
+            pattern: The regular expression matching a token. Character classes such as `\\w` are
+                Unicode-aware. Defaults to runs of word characters.
+            stopwords: The words to be dropped, such as `ENGLISH_STOPWORDS`. Defaults to None.
+            stemmer: A function mapping a word to its stem, such as `nltk.stem.PorterStemmer().stem`.
+                Defaults to None.
+            cache_dir: The directory where term counts are cached. Defaults to None, which disables
+                the cache.
+        """
+        self.lowercase = lowercase
+        self.pattern = pattern
+        self.stopwords = sorted(set(stopwords)) if stopwords is not None else None
+        self.stemmer = stemmer
+        self.cache_dir = cache_dir
+
+
+    def __call__(self, text: str) -> List[str]:
+        """
+        Tokenize a text.
+
+        Args:
+            text: The text to be tokenized.
+
+        Returns:
+            The tokens of the text.
+        """
+        return self.tokenize_many([text])[0]
+
+
+    def tokenize_many(self, texts: List[str], num_chunks: int = 1) -> List[List[str]]:
+        """
+        Tokenize many texts at once.
+
+        Args:
+            texts: The texts to be tokenized.
+            num_chunks: The number of contiguous chunks of texts tokenized in parallel on the polars
+                thread pool. Defaults to 1.
+
+        Returns:
+            The tokens of every text.
+        """
+        tokens, doc_len = self._tokenize(texts, num_chunks)
+        tokens = tokens.to_list()
+
+        ends = np.cumsum(doc_len).tolist()
+        return [tokens[end - length:end] for end, length in zip(ends, doc_len.tolist())]
+
+
+    def count_terms(self, texts: List[str], num_chunks: int = 1) -> TermCounts:
+        """
+        Tokenize many texts and intern their tokens, without creating a Python object per token.
+
+        The result is the same as `count_terms(self.tokenize_many(texts))`. With a cache directory,
+        it is read from the cache when the same texts were counted with the same settings before.
+
+        Args:
+            texts: The texts to be tokenized.
+            num_chunks: The number of contiguous chunks of texts tokenized in parallel on the polars
+                thread pool. The result is the same for any number of chunks. Defaults to 1.
+
+        Returns:
+            The term counts of the texts.
+        """
+        if self.cache_dir is None:
+            return self._count_terms(texts, num_chunks)
+
+        path = os.path.join(self.cache_dir, self.fingerprint(texts))
+        if os.path.isdir(path):
+            return self._load_counts(path)
+
+        counts = self._count_terms(texts, num_chunks)
+        self._save_counts(counts, path)
+
+        return counts
+
+
+    def fingerprint(self, texts: Iterable[str]) -> str:
+        """
+        Compute a fingerprint of a corpus and the tokenizer settings, which names its cached term counts.
+
+        Args:
+            texts: The texts of the corpus.
+
+        Returns:
+            A hexadecimal digest that changes with any text, with the order of the texts and with any
+            setting.
+        """
+        stemmer = getattr(self.stemmer, "__qualname__", type(self.stemmer).__qualname__)
+        settings = [self.lowercase, self.pattern, self.stopwords, stemmer]
+
+        digest = hashlib.blake2b(repr(settings).encode("utf-8"), digest_size=16)
+        for text in texts:
+            encoded = text.encode("utf-8")
+            digest.update(len(encoded).to_bytes(8, "little"))
+            digest.update(encoded)
+
+        return digest.hexdigest()
+
+
+    def _tokenize(self, texts: List[str], num_chunks: int = 1) -> Tuple[pl.Series, np.ndarray]:
+        """
+        Tokenize many texts into one series of tokens.
+
+        The texts are split into contiguous chunks that are collected together, so polars tokenizes
+        them on several threads, and the tokens of the chunks are concatenated in order.
+
+        Args:
+            texts: The texts to be tokenized.
+            num_chunks: The number of chunks tokenized in parallel. Defaults to 1.
+
+        Returns:
+            The tokens of all texts one after the other, and the number of tokens of every text.
+        """
+        frame = pl.DataFrame({"token": pl.Series(texts, dtype=pl.String)}).with_row_index("doc")
+
+        token = pl.col("token").str.to_lowercase() if self.lowercase else pl.col("token")
+        chunks = [
+            frame.slice(offset, length).lazy().with_columns(token.str.extract_all(self.pattern)).explode("token")
+            for offset, length in shard_bounds(len(texts), max(1, min(num_chunks, len(texts))))
+        ]
+        tokens = pl.concat(pl.collect_all(chunks)).filter(pl.col("token").is_not_null())
+
+        if self.stopwords is not None:
+            tokens = tokens.filter(~pl.col("token").is_in(self.stopwords))
+
+        if self.stemmer is not None:
+            words = tokens["token"].unique(maintain_order=True)
+            stems = pl.Series([self.stemmer(word) for word in words.to_list()], dtype=pl.String)
+            tokens = tokens.with_columns(pl.col("token").replace(words, stems))
+
+        doc_len = np.bincount(tokens["doc"].to_numpy(), minlength=len(texts)).astype(np.int64)
+
+        return tokens["token"], doc_len
+
+
+    def _count_terms(self, texts: List[str], num_chunks: int = 1) -> TermCounts:
+        """ Tokenize many texts and intern their tokens. """
+        tokens, doc_len = self._tokenize(texts, num_chunks)
+
+        vocab = Vocabulary()
+        codes = vocab.encode_many(tokens)
+
+        return TermCounts(vocab.ids, codes, doc_len)
+
+
+    def _save_counts(self, counts: TermCounts, path: str):
+        """
+        Save term counts to a cache directory. They are written to a temporary directory first, so
+        concurrent jobs never read a partial entry.
+
+        Args:
+            counts: The term counts to be saved.
+            path: The path to the cache directory of the corpus.
+        """
+        partial = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(partial, exist_ok=True)
+
+        pl.DataFrame({"term": pl.Series(counts.terms, dtype=pl.String)}).write_ipc(
+            os.path.join(partial, "terms.arrow"),
+            compression="uncompressed"
+        )
+        for name in ["codes", "doc_len"]:
+            with open(os.path.join(partial, f"{name}.npy"), "wb") as f:
+                np.save(f, getattr(counts, name))
+
+        try:
+            os.rename(partial, path)
+        except OSError:
+            shutil.rmtree(partial, ignore_errors=True)
+
+
+    def _load_counts(self, path: str) -> TermCounts:
+        """
+        Load term counts from a cache directory. The codes are memory-mapped.
+
+        Args:
+            path: The path to the cache directory of the corpus.
+
+        Returns:
+            The cached term counts.
+        """
+        return TermCounts(
+            pl.read_ipc(os.path.join(path, "terms.arrow"))["term"].to_list(),
+            np.load(os.path.join(path, "codes.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "doc_len.npy"))
+        )
+
+
+    def __repr__(self):
+        """ Return the string representation of the Tokenizer object. """
+        return f"Tokenizer(lowercase={self.lowercase}, pattern={self.pattern!r})"
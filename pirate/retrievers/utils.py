@@ -0,0 +1,498 @@
+import numpy as np
+import polars as pl
+
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
+
+from pirate.data import (
+    MappedVocabulary,
+    Ranking,
+    Vocabulary,
+)
+
+
+NNZ_BYTES = 64
+
+
+class IndexIds:
+    """
+    IndexIds tracks the passage held by every row of an index that is updated in place.
+
+    Rows are only appended, so the rows of indexed passages never move, and removing a passage marks
+    its row as deleted. The vocabulary of the indexed corpus is shared and never changed: IDs that are
+    not in it get codes after its own, in a vocabulary of added IDs. The codes and deletion marks of the
+    rows are kept in buffers that double when they are full, so adding passages costs in proportion to
+    the added passages.
+    """
+
+    def __init__(
+        self,
+        vocab: Union[Vocabulary, MappedVocabulary],
+        codes: Optional[np.ndarray] = None,
+        deleted: Optional[np.ndarray] = None
+    ):
+        """
+        Initialize the IndexIds object.
+
+        Args:
+            vocab: The vocabulary of the passage IDs.
+            codes: The code of the passage in every row. Defaults to one row per ID, in code order.
+            deleted: Whether the passage in every row is removed. Defaults to none removed.
+        """
+        self.vocab = vocab
+        self.added_vocab = Vocabulary()
+
+        self._codes = np.arange(len(vocab), dtype=np.int64) if codes is None else codes
+        self._deleted = np.zeros(len(self._codes), dtype=bool) if deleted is None else deleted
+        self._num_rows = len(self._codes)
+        self._rows: Optional[np.ndarray] = None
+
+        self._ids: Optional[pl.Series] = None
+        self._enum: Optional[pl.Enum] = None
+
+
+    @property
+    def codes(self) -> np.ndarray:
+        """ The code of the passage in every row. """
+        return self._codes[:self._num_rows]
+
+
+    @property
+    def deleted(self) -> np.ndarray:
+        """ Whether the passage in every row is removed. """
+        return self._deleted[:self._num_rows]
+
+
+    def add(self, ids: List[Any]) -> np.ndarray:
+        """
+        Append a row for every passage.
+
+        Args:
+            ids: The IDs of the passages.
+
+        Returns:
+            The rows of the passages.
+
+        Raises:
+            ValueError: If a passage is already indexed or appears twice.
+        """
+        if len(set(ids)) != len(ids):
+            raise ValueError("Passages to be added must have distinct IDs.")
+
+        row_map = self._row_map()
+        indexed = [id_ for id_ in ids if self._encode(id_) >= 0 and row_map[self._encode(id_)] >= 0]
+        if indexed:
+            raise ValueError(f"Passages already indexed: {indexed[:5]}")
+
+        codes = np.fromiter(
+            (code if code >= 0 else len(self.vocab) + self.added_vocab.add(id_) for id_, code in zip(ids, map(self._encode, ids))),
+            dtype=np.int64,
+            count=len(ids)
+        )
+        rows = np.arange(self._num_rows, self._num_rows + len(codes), dtype=np.int64)
+
+        self._codes = _reserve(self._codes, self._num_rows, len(codes))
+        self._deleted = _reserve(self._deleted, self._num_rows, len(codes))
+        self._codes[rows] = codes
+        self._deleted[rows] = False
+        self._num_rows += len(codes)
+
+        self._row_map()[codes] = rows
+
+        return rows
+
+
+    def remove(self, ids: Iterable[Any]) -> np.ndarray:
+        """
+        Mark the rows of passages as deleted.
+
+        Args:
+            ids: The IDs of the passages.
+
+        Returns:
+            The rows of the passages.
+
+        Raises:
+            KeyError: If a passage is not indexed.
+        """
+        row_map = self._row_map()
+
+        codes = []
+        for id_ in ids:
+            code = self._encode(id_)
+            if code < 0 or row_map[code] < 0:
+                raise KeyError(id_)
+            codes.append(code)
+
+        codes = np.array(codes, dtype=np.int64)
+        rows = row_map[codes]
+
+        self._deleted = _reserve(self._deleted, self._num_rows, 0)
+        self._deleted[rows] = True
+        row_map[codes] = -1
+
+        return rows
+
+
+    def decode_many(self, rows: np.ndarray) -> pl.Series:
+        """
+        Get the IDs of the passages in many rows.
+
+        Args:
+            rows: The rows to be decoded.
+
+        Returns:
+            A Series with the ID of the passage in every row.
+        """
+        codes = self.codes[rows]
+        if len(self.added_vocab) == 0:
+            return self.vocab.decode_many(codes)
+
+        num_codes = len(self.vocab) + len(self.added_vocab)
+        if self._ids is None or len(self._ids) != num_codes:
+            self._ids = pl.Series("id", list(self.vocab.ids) + self.added_vocab.ids)
+            self._enum = pl.Enum(self._ids) if self._ids.dtype == pl.String else None
+
+        if self._enum is not None:
+            return pl.Series("id", np.asarray(codes, dtype=np.uint32)).cast(self._enum).cast(pl.Categorical)
+
+        return self._ids.gather(np.asarray(codes, dtype=np.int64))
+
+
+    def save(self, path: str):
+        """
+        Save the IDs to files with the path prefix `path`: the vocabulary, with the added IDs after the
+        indexed ones, and the codes and deletion marks of the rows as `.npy` files.
+
+        Args:
+            path: The path prefix of the files.
+        """
+        vocab = self.vocab
+        if len(self.added_vocab):
+            vocab = Vocabulary(list(self.vocab.ids) + self.added_vocab.ids)
+
+        vocab.save(path)
+
+        for name in ["codes", "deleted"]:
+            with open(f"{path}.{name}.npy", "wb") as f:
+                np.save(f, getattr(self, name))
+
+
+    @classmethod
+    def load(cls, path: str) -> "IndexIds":
+        """
+        Load IDs saved with `save`. Everything is memory-mapped.
+
+        Args:
+            path: The path prefix of the files.
+
+        Returns:
+            The loaded IndexIds.
+        """
+        return cls(
+            MappedVocabulary(path),
+            np.load(f"{path}.codes.npy", mmap_mode="r"),
+            np.load(f"{path}.deleted.npy", mmap_mode="r")
+        )
+
+
+    def _encode(self, id_: Any) -> int:
+        """ Return the code of an ID, or -1 if it is not in the vocabularies. """
+        if id_ in self.vocab:
+            return self.vocab.encode(id_)
+        if id_ in self.added_vocab:
+            return len(self.vocab) + self.added_vocab.encode(id_)
+
+        return -1
+
+
+    def _row_map(self) -> np.ndarray:
+        """ Return the row of every code of the vocabularies, or -1 for IDs that are not indexed. """
+        num_codes = len(self.vocab) + len(self.added_vocab)
+
+        if self._rows is None:
+            self._rows = np.full(num_codes, -1, dtype=np.int64)
+            present = np.flatnonzero(~self.deleted)
+            self._rows[self.codes[present]] = present
+        elif len(self._rows) < num_codes:
+            size = len(self._rows)
+            self._rows = _reserve(self._rows, size, num_codes - size)
+            self._rows[size:] = -1
+
+        return self._rows[:num_codes]
+
+
+    @property
+    def num_rows(self) -> int:
+        """ The number of rows, including the deleted ones. """
+        return self._num_rows
+
+
+    def __len__(self) -> int:
+        """ Return the number of indexed passages. """
+        return int(self._num_rows - self.deleted.sum())
+
+
+def top_k_scores(scores: np.ndarray, top_k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the best documents of every row of a score matrix, best first.
+
+    With `top_k`, `argpartition` finds the k best documents of every row first, so only those are sorted.
+
+    Args:
+        scores: A matrix with one row of document scores per query.
+        top_k: The number of documents to keep per query. Defaults to all documents.
+
+    Returns:
+        The document indices and their scores, both with one row per query, sorted by decreasing score.
+    """
+    num_docs = scores.shape[1]
+
+    if top_k is not None and top_k < num_docs:
+        indices = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    else:
+        indices = np.broadcast_to(np.arange(num_docs), scores.shape)
+
+    selected = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-selected, axis=1, kind="stable")
+
+    return np.take_along_axis(indices, order, axis=1), np.take_along_axis(selected, order, axis=1)
+
+
+def merge_top_k(
+    indices: np.ndarray,
+    scores: np.ndarray,
+    new_indices: np.ndarray,
+    new_scores: np.ndarray,
+    top_k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Merge two selections of documents per query into the best `top_k`, as a running top-k does.
+
+    Args:
+        indices: The document indices of the first selection, one row per query.
+        scores: The scores of the first selection.
+        new_indices: The document indices of the second selection.
+        new_scores: The scores of the second selection.
+        top_k: The number of documents to keep per query.
+
+    Returns:
+        The document indices and their scores, sorted by decreasing score.
+    """
+    if indices.shape[1] == 0:
+        return new_indices, new_scores
+
+    indices = np.concatenate([indices, new_indices], axis=1)
+    order, scores = top_k_scores(np.concatenate([scores, new_scores], axis=1), top_k)
+
+    return np.take_along_axis(indices, order, axis=1), scores
+
+
+def blocked_top_k(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    top_k: int,
+    block_size: int = 16384,
+    deleted: Optional[np.ndarray] = None,
+    decode: Optional[Callable[[np.ndarray], np.ndarray]] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Select the corpus rows with the largest inner products with every query.
+
+    The corpus is scored one block of rows at a time with a matrix product, and the best rows of each
+    block are merged into a running top-k, so only a queries x `block_size` score matrix is held. When
+    every row that is not deleted is kept, the score blocks are collected instead and sorted once.
+
+    Args:
+        queries: The query embeddings, one row per query.
+        corpus: The corpus embeddings, one row per document.
+        top_k: The number of documents to keep per query. It must not exceed the number of documents
+            that are not deleted.
+        block_size: The number of corpus rows scored at once. Defaults to 16384.
+        deleted: Whether every corpus row is deleted. Deleted rows are never selected. Defaults to None.
+        decode: A function decoding a block of compact corpus rows into float32 embeddings, such as
+            `Quantizer.decode`, so only one block is held decoded. Defaults to None, a float corpus.
+
+    Returns:
+        The document indices and their scores, both with one row per query, sorted by decreasing score.
+    """
+    keep_all = top_k >= len(corpus) - (0 if deleted is None else np.count_nonzero(deleted))
+    blocks = []
+
+    indices = np.empty((len(queries), 0), dtype=np.int64)
+    scores = np.empty((len(queries), 0), dtype=np.float32)
+
+    for start in range(0, len(corpus), block_size):
+        block = corpus[start:start + block_size]
+        block_scores = queries @ (block if decode is None else decode(block)).T
+
+        if deleted is not None:
+            block_scores[:, deleted[start:start + block_size]] = -np.inf
+
+        if keep_all:
+            blocks.append(block_scores)
+            continue
+
+        block_indices, block_scores = top_k_scores(block_scores, top_k)
+        indices, scores = merge_top_k(indices, scores, block_indices + start, block_scores, top_k)
+
+    if blocks:
+        return top_k_scores(np.concatenate(blocks, axis=1), top_k)
+
+    return indices, scores
+
+
+def tile_sizes(
+    memory_budget: int,
+    num_docs: int,
+    top_k: int,
+    score_bytes: int = 4,
+    row_bytes: int = 0,
+    row_nnz: float = 0,
+    sparse: bool = False,
+    max_corpus_block_size: int = 16384
+) -> Tuple[int, int]:
+    """
+    Choose how many queries and corpus rows are scored in one tile so its working memory fits a budget.
+
+    A tile holds a queries x corpus rows score matrix, the copy and the indices `top_k_scores` takes of
+    it, the corpus rows decoded for scoring, and about four top-k selections per query while they are
+    merged. Sparse corpus rows add their non-zero entries, each counted as `NNZ_BYTES` for the entry
+    and the temporaries it is weighted with, and sparse scores add a sparse product that is as large
+    as the score matrix at most. Corpus blocks are halved until at least one query fits, and then as
+    many queries as fit are taken. The rankings that are returned are not part of the budget.
+
+    Args:
+        memory_budget: The memory available to a tile, in bytes.
+        num_docs: The number of corpus rows.
+        top_k: The number of documents kept per query.
+        score_bytes: The size of a score in bytes. Defaults to 4, float32.
+        row_bytes: The size of a decoded corpus row in bytes. Defaults to 0, rows that are not copied.
+        row_nnz: The average number of non-zero entries of a sparse corpus row, such as the postings
+            of a document. Defaults to 0, dense rows.
+        sparse: Whether the scores are computed as a sparse product before they are densified, with an
+            int32 index per score. Defaults to False.
+        max_corpus_block_size: The largest number of corpus rows per tile. Defaults to 16384.
+
+    Returns:
+        The number of queries and the number of corpus rows per tile, both at least 1.
+    """
+    corpus_block_size = max(1, min(num_docs, max_corpus_block_size))
+    score_copies = 3 if sparse else 2
+
+    while True:
+        per_query = corpus_block_size * (score_copies * score_bytes + 8 + 4 * sparse) + 4 * top_k * (score_bytes + 8)
+        available = memory_budget - corpus_block_size * (row_bytes + int(np.ceil(row_nnz * NNZ_BYTES)))
+
+        if available >= per_query or corpus_block_size == 1:
+            break
+        corpus_block_size //= 2
+
+    return max(1, available // per_query), corpus_block_size
+
+
+def recall_at_k(reference: Ranking, ranking: Ranking, k: int) -> float:
+    """
+    Measure how many of the best passages of a reference ranking, such as an exact search, another
+    ranking finds, such as an approximate or quantized search.
+
+    Args:
+        reference: The reference ranking.
+        ranking: The ranking to be evaluated.
+        k: The number of best passages compared per query.
+
+    Returns:
+        The share of the top `k` reference passages that are also in the top `k` of `ranking`, averaged
+        over the queries of the reference.
+    """
+    def top(r: Ranking) -> pl.DataFrame:
+        return (
+            r.data.select(pl.col("qid").cast(pl.String), pl.col("pid").cast(pl.String), "score")
+            .sort("score", descending=True)
+            .group_by("qid", maintain_order=True)
+            .head(k)
+            .select("qid", "pid")
+        )
+
+    expected = top(reference)
+    if expected.is_empty():
+        return 1.0
+
+    found = expected.join(top(ranking), on=["qid", "pid"], how="inner")
+    per_query = expected.group_by("qid").len().join(found.group_by("qid").len(), on="qid", how="left", suffix="_found")
+
+    return float((per_query["len_found"].fill_null(0) / per_query["len"]).mean())
+
+
+def _reserve(array: np.ndarray, size: int, count: int) -> np.ndarray:
+    """
+    Make room for `count` more entries after the first `size` of an array, doubling it when it is full.
+    Read-only arrays, such as memory-mapped ones, are copied into memory first.
+
+    Args:
+        array: The buffer, whose first `size` entries are in use.
+        size: The number of entries in use.
+        count: The number of entries to be appended.
+
+    Returns:
+        The buffer itself if it has room and is writeable, or a larger copy of its first `size` entries.
+    """
+    if size + count <= len(array) and array.flags.writeable and not isinstance(array, np.memmap):
+        return array
+
+    buffer = np.empty(max(2 * size, size + count), dtype=array.dtype)
+    buffer[:size] = array[:size]
+
+    return buffer
+
+
+def normalize_embeddings(embeddings: Any) -> np.ndarray:
+    """
+    Scale embeddings to unit L2 norm, so their inner products are cosine similarities.
+
+    Args:
+        embeddings: The embeddings, one row per text, as a NumPy array or a tensor.
+
+    Returns:
+        The normalized embeddings as a float32 array. Zero rows stay zero.
+    """
+    if hasattr(embeddings, "detach"):
+        embeddings = embeddings.detach().cpu().numpy()
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def build_ranking(
+    query_vocab: Vocabulary,
+    passage_vocab: Union[Vocabulary, MappedVocabulary, IndexIds],
+    indices: List[np.ndarray],
+    scores: List[np.ndarray]
+) -> Ranking:
+    """
+    Build a Ranking from the top documents of every query without creating an object per row.
+
+    Row i of the stacked matrices belongs to the query with code i. The ID columns are decoded from the
+    codes as categoricals, and the rank of a document is its 0-based position in its row.
+
+    Args:
+        query_vocab: The vocabulary of the query IDs, in the order the queries were scored.
+        passage_vocab: The vocabulary of the passage IDs in index order, or the IDs of the rows of an
+            updated index.
+        indices: The document indices of every batch of queries, as returned by `top_k_scores`.
+        scores: The document scores of every batch of queries, as returned by `top_k_scores`.
+
+    Returns:
+        A Ranking with the columns `qid`, `pid`, `rank` and `score`.
+    """
+    indices = np.concatenate(indices) if indices else np.empty((0, 0), dtype=np.int64)
+    scores = np.concatenate(scores) if scores else np.empty((0, 0), dtype=np.float64)
+    num_queries, k = indices.shape
+
+    return Ranking(pl.DataFrame({
+        "qid": query_vocab.decode_many(np.repeat(np.arange(num_queries), k)),
+        "pid": passage_vocab.decode_many(indices.ravel()),
+        "rank": np.tile(np.arange(k, dtype=np.int32), num_queries),
+        "score": scores.ravel().astype(np.float64, copy=False)
+    }))
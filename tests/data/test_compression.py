@@ -0,0 +1,32 @@
+import io
+import pytest
+from pirate.data.compression import iter_line_chunks, open_compressed, stream_compressed
+
+
+def test_iter_line_chunks():
+    data = b"".join(b'{"id": %d}\n' % i for i in range(50))
+    chunks = list(iter_line_chunks(io.BytesIO(data), chunk_size=7))
+
+    assert b"".join(chunks) == data
+    assert all(chunk.endswith(b"\n") for chunk in chunks)
+
+
+def test_iter_line_chunks_quoted():
+    data = b'id,text\n1,"first\nline"\n2,"second\n\nline"\n3,third'
+    chunks = list(iter_line_chunks(io.BytesIO(data), chunk_size=4, quoted=True))
+
+    assert b"".join(chunks) == data
+    assert all(chunk.count(b'"') % 2 == 0 for chunk in chunks)
+    assert chunks[-1] == b"3,third"
+
+
+@pytest.mark.parametrize("compression", ["gz", "zst"])
+def test_stream_compressed(tmp_path, compression):
+    path = str(tmp_path / f"lines.txt.{compression}")
+    data = b"".join(b"line %d\n" % i for i in range(1000))
+
+    with open_compressed(path, compression) as f:
+        f.write(data)
+
+    with stream_compressed(path, compression) as stream:
+        assert b"".join(iter_line_chunks(stream, chunk_size=100)) == data
@@ -1,3 +1,5 @@
+import gzip
+import json
 import pytest
 from pirate.data import Passages
 
@@ -53,4 +55,150 @@ def test_load_passage_from_file_csv(csv_passages):
     assert csv_passages.data == {
         "sample_id_1": "Sample passage 1 goes here.",
         "sample_id_2": "Sample passage 2 goes here."
-    }
\ No newline at end of file
+    }
+
+def test_get_id(json_passages):
+    assert json_passages.get_id("Sample passage 2 goes here.") == "sample_id_2"
+    assert json_passages.get_id("Unknown passage.") is None
+    assert json_passages.has_content("Sample passage 1 goes here.")
+    assert not json_passages.has_content("sample passage 1 goes here.")
+
+
+def test_content_index_built_on_first_lookup():
+    passages = Passages({"0": "This is a passage.", "1": "This is another passage."})
+    assert passages._content_index is None
+
+    passages.add("This is a new passage.")
+    assert passages.get_id("This is a new passage.") == "2"
+    assert passages._content_index is not None
+
+
+def test_get_id_normalized():
+    passages = Passages({"1": "This is  a Passage."}, normalize=True)
+    assert passages.get_id("this is a passage.") == "1"
+
+
+def test_add_passage():
+    passages = Passages({"0": "This is a passage.", "1": "This is another passage."})
+    pid = passages.add("This is a new passage.")
+
+    assert pid == "2"
+    assert passages[pid] == "This is a new passage."
+    assert passages.get_id("This is a new passage.") == pid
+
+
+def test_save_and_load_arrow(tmp_path, json_passages):
+    save_path = str(tmp_path / "passages.arrow")
+    json_passages.save(save_path)
+
+    reloaded = Passages(save_path, content_key="content")
+    assert reloaded.data == json_passages.data
+
+
+def test_load_arrow_lazy(tmp_path, json_passages):
+    save_path = str(tmp_path / "passages.arrow")
+    json_passages.save(save_path)
+
+    passages = Passages(save_path, content_key="content", lazy=True)
+    assert len(passages) == 2
+    assert list(passages) == ["sample_id_1", "sample_id_2"]
+    assert passages["sample_id_2"] == "Sample passage 2 goes here."
+    assert "sample_id_3" not in passages
+    assert passages.get_id("Sample passage 1 goes here.") == "sample_id_1"
+
+    pid = passages.add("A new passage.")
+    assert passages[pid] == "A new passage."
+    assert len(passages) == 3
+
+
+def test_load_json_lazy(tmp_path):
+    json_file = tmp_path / "passages.jsonl"
+    json_file.write_text(open("tests/fixtures/passages/sample_passage.jsonl").read())
+
+    for _ in range(2):
+        passages = Passages(str(json_file), content_key="content", lazy=True)
+        assert len(passages) == 2
+        assert list(passages) == ["sample_id_1", "sample_id_2"]
+        assert passages["sample_id_1"] == "Sample passage 1 goes here."
+        assert dict(passages.data) == {
+            "sample_id_1": "Sample passage 1 goes here.",
+            "sample_id_2": "Sample passage 2 goes here."
+        }
+
+    assert (tmp_path / "passages.jsonl.offsets.npy").exists()
+
+
+def test_lazy_membership_does_not_iterate(tmp_path, json_passages, monkeypatch):
+    for ext in ["jsonl", "arrow"]:
+        save_path = str(tmp_path / f"passages.{ext}")
+        json_passages.save(save_path)
+        passages = Passages(save_path, content_key="content", lazy=True)
+
+        def fail(*args):
+            raise AssertionError("Membership should not iterate or read content.")
+
+        store = type(passages.data)
+        monkeypatch.setattr(store, "__iter__", fail)
+        monkeypatch.setattr(store, "_get_content", fail)
+
+        assert "sample_id_2" in passages
+        assert "sample_id_3" not in passages
+
+        monkeypatch.undo()
+
+
+@pytest.mark.parametrize("ext", ["jsonl", "jsonl.gz"])
+def test_load_json_with_mixed_id_types(tmp_path, ext):
+    records = [{"pid": i, "content": f"Passage {i}."} for i in range(150)] + [{"pid": "abc", "content": "Passage abc."}]
+    save_path = str(tmp_path / f"passages.{ext}")
+    with (gzip.open if ext.endswith(".gz") else open)(save_path, "wt") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+    passages = Passages(save_path, content_key="content")
+    assert passages.data == {record["pid"]: record["content"] for record in records}
+    assert None not in passages.data
+
+
+def test_save_and_load_csv_with_commas(tmp_path):
+    passages = Passages({"1": 'First, a "quoted" passage.', "2": "Second passage."})
+    save_path = str(tmp_path / "passages.csv")
+    passages.save(save_path)
+
+    reloaded = Passages(save_path)
+    assert reloaded.data == passages.data
+
+
+@pytest.mark.parametrize("ext", ["jsonl.gz", "jsonl.zst", "csv.zst", "parquet.zst"])
+def test_save_and_load_compressed(tmp_path, json_passages, ext):
+    save_path = str(tmp_path / f"passages.{ext}")
+    json_passages.save(save_path)
+
+    reloaded = Passages(save_path, content_key="content")
+    assert reloaded.data == json_passages.data
+
+    with pytest.raises(ValueError):
+        Passages(save_path, content_key="content", lazy=True)
+
+
+def test_save_and_load_shards(tmp_path, json_passages):
+    json_passages.save(str(tmp_path / "passages.jsonl"), num_shards=3)
+    assert len(list(tmp_path.iterdir())) == 3
+
+    reloaded = Passages(str(tmp_path), content_key="content")
+    assert reloaded.data == json_passages.data
+
+
+def test_load_lazy_shards(tmp_path, json_passages):
+    json_passages.save(str(tmp_path / "passages.arrow"), num_shards=2)
+
+    passages = Passages(str(tmp_path / "passages-*.arrow"), content_key="content", lazy=True)
+    assert not list(tmp_path.glob("*.npy"))
+
+    assert passages["sample_id_2"] == "Sample passage 2 goes here."
+    assert "sample_id_1" in passages and "missing" not in passages
+
+    assert len(passages) == 2
+    assert list(passages) == ["sample_id_1", "sample_id_2"]
+
+    with pytest.raises(KeyError):
+        passages["missing"]
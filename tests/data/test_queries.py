@@ -50,4 +50,11 @@ def test_load_query_from_file_csv(csv_queries):
     assert csv_queries.data == {
         "sample_id_1": "Sample query 1 goes here.",
         "sample_id_2": "Sample query 2 goes here."
-    }
\ No newline at end of file
+    }
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow"])
+def test_save_and_load_columnar(tmp_path, json_queries, ext):
+    save_path = str(tmp_path / f"queries.{ext}")
+    json_queries.save(save_path)
+    reloaded = Queries(save_path)
+    assert reloaded.data == json_queries.data
@@ -1,4 +1,6 @@
+import gzip
 import pytest
+import polars as pl
 from pirate.data import Ranking
 
 @pytest.fixture
@@ -50,3 +52,116 @@ def test_save_to_csv(tmp_path, csv_ranking):
     csv_ranking.save(save_path)
     reloaded = Ranking(save_path)
     assert reloaded.data.shape == (4, 4)
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow"])
+def test_save_to_columnar(tmp_path, json_ranking, ext):
+    save_path = str(tmp_path / f"ranking.{ext}")
+    json_ranking.save(save_path)
+    reloaded = Ranking(save_path)
+    assert reloaded.data.equals(json_ranking.data)
+    assert reloaded.data.schema == json_ranking.data.schema
+
+def test_get_passage_groups_unknown_qid(json_ranking):
+    groups = json_ranking.get_passage_groups("q3")
+    assert len(groups) == 0
+    assert groups.columns == ["qid", "pid", "rank", "score"]
+
+def test_iter_groups(json_ranking):
+    groups = dict(json_ranking.iter_groups())
+    assert list(groups) == ["q1", "q2"]
+    assert groups["q1"]["pid"].to_list() == ["p1", "p2"]
+    assert groups["q2"]["rank"].to_list() == [1, 2]
+
+def test_ids_are_categorical(json_ranking):
+    assert json_ranking.data.schema["qid"] == pl.Categorical
+    assert json_ranking.data.schema["pid"] == pl.Categorical
+
+@pytest.mark.parametrize("ext", ["jsonl", "csv"])
+def test_lazy_ranking(ext):
+    ranking = Ranking(f"tests/fixtures/rankings/sample_ranking.{ext}", lazy=True)
+    filtered = ranking.filter_by_score(0.65)
+    assert filtered.data["pid"].to_list() == ["p1", "p2", "p3"]
+    assert filtered.data.schema["qid"] == pl.Categorical
+    assert filtered.data.schema["score"] == pl.Float64
+
+def test_top_k_per_query(json_ranking):
+    top_1 = json_ranking.top_k_per_query(1)
+    assert top_1.data["pid"].to_list() == ["p1", "p3"]
+
+@pytest.mark.parametrize("ext", ["jsonl", "parquet"])
+def test_save_lazy_ranking(tmp_path, json_ranking, ext):
+    source = str(tmp_path / f"source.{ext}")
+    json_ranking.save(source)
+
+    save_path = str(tmp_path / "ranking.parquet")
+    Ranking(source, lazy=True).filter_by_score(0.65).top_k_per_query(1).save(save_path)
+    assert Ranking(save_path).data["pid"].to_list() == ["p1", "p3"]
+
+def test_derived_rankings_keep_schema(json_ranking):
+    filtered = json_ranking.filter_by_score(0.65)
+    assert filtered.data.schema == json_ranking.data.schema
+    assert filtered.data["pid"].to_list() == ["p1", "p2", "p3"]
+
+    selected = json_ranking.select_queries(["q2", "q3"])
+    assert selected.data["pid"].to_list() == ["p3", "p4"]
+
+def test_load_ranking_from_dataframe(json_ranking):
+    assert Ranking(json_ranking.data).data is json_ranking.data
+
+def test_concat_rankings(json_ranking):
+    other = pl.DataFrame({"qid": ["q3"], "pid": ["p1"], "rank": [1], "score": [0.5]})
+    other = other.with_columns(pl.col("qid").cast(pl.Enum(["q3"])))
+
+    ranking = Ranking.concat([json_ranking, Ranking(other)])
+    assert ranking.data.schema == json_ranking.data.schema
+    assert ranking.data["qid"].to_list() == ["q1", "q1", "q2", "q2", "q3"]
+    assert ranking.get_passage_groups("q3")["pid"].to_list() == ["p1"]
+
+def test_concat_lazy_rankings(json_ranking):
+    lazy = Ranking("tests/fixtures/rankings/sample_ranking.jsonl", lazy=True)
+    ranking = Ranking.concat([json_ranking, lazy])
+    assert len(ranking) == 8
+    assert len(ranking.top_k_per_query(1)) == 2
+
+@pytest.mark.parametrize("ext", ["jsonl.gz", "csv.zst", "parquet.zst"])
+def test_save_to_compressed(tmp_path, json_ranking, ext):
+    save_path = str(tmp_path / f"ranking.{ext}")
+    json_ranking.save(save_path)
+    reloaded = Ranking(save_path)
+    assert reloaded.data.equals(json_ranking.data)
+
+    with pytest.raises(ValueError):
+        Ranking(save_path, lazy=True)
+
+def test_save_and_load_shards(tmp_path, json_ranking):
+    json_ranking.save(str(tmp_path / "ranking.parquet"), num_shards=2)
+
+    shard_qids = [set(Ranking(str(path)).data["qid"].to_list()) for path in tmp_path.iterdir()]
+    assert sum(len(qids) for qids in shard_qids) == len(set.union(*shard_qids))
+
+    reloaded = Ranking(str(tmp_path))
+    assert len(reloaded) == 4
+    assert sorted(reloaded.data.rows()) == sorted(json_ranking.data.rows())
+
+def test_load_lazy_shards(tmp_path, json_ranking):
+    json_ranking.save(str(tmp_path / "ranking.parquet"), num_shards=2)
+
+    ranking = Ranking(str(tmp_path / "*.parquet"), lazy=True)
+    assert ranking._data is None
+    assert len(ranking.top_k_per_query(1)) == 2
+
+def test_csv_loads_agree(tmp_path):
+    text = "qid,pid,rank,score\n1,10,0,2.5\n1,11,1,1.5\n2,10,0,3.0\n"
+    (tmp_path / "ranking.csv").write_text(text)
+    with gzip.open(tmp_path / "ranking.csv.gz", "wt") as f:
+        f.write(text)
+
+    plain = Ranking(str(tmp_path / "ranking.csv"))
+    compressed = Ranking(str(tmp_path / "ranking.csv.gz"))
+    lazy = Ranking(str(tmp_path / "ranking.csv"), lazy=True)
+
+    assert len(lazy.get_passage_groups("1")) == 2
+    assert plain.data.schema == compressed.data.schema == lazy.data.schema
+    rows = lambda ranking: ranking.data.with_columns(pl.col("qid", "pid").cast(pl.String)).rows()
+    assert rows(plain) == rows(compressed) == rows(lazy) == [("1", "10", 0, 2.5), ("1", "11", 1, 1.5), ("2", "10", 0, 3.0)]
+    assert len(plain.get_passage_groups("1")) == len(compressed.get_passage_groups("1")) == 2
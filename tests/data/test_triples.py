@@ -1,3 +1,5 @@
+import numpy as np
+import polars as pl
 import pytest
 from pirate.data import Triples
 
@@ -34,3 +36,112 @@ def test_load_triple_from_file_csv(csv_triples):
         ["sample_qid_1", "sample_ppid_1", "sample_npid_1"],
         ["sample_qid_2", "sample_ppid_2", "sample_npid_2"]
     ]
+
+
+@pytest.mark.parametrize("ext", ["parquet", "arrow"])
+def test_save_and_load_columnar(tmp_path, json_triples, ext):
+    save_path = str(tmp_path / f"triples.{ext}")
+    json_triples.save(save_path)
+    reloaded = Triples(save_path)
+    assert reloaded.triples == json_triples.triples
+
+
+def test_load_ragged_triples():
+    with pytest.raises(ValueError):
+        Triples([["qid1", "ppid1", "npid1"], ["qid2", "ppid2"]])
+
+
+def test_triples_are_interned():
+    triples = Triples([
+        ["qid1", "ppid1", "npid1"],
+        ["qid1", "npid1", "ppid1"]
+    ])
+    assert triples.width == 3
+    assert len(triples.qid_vocab) == 1
+    assert len(triples.pid_vocab) == 2
+    assert triples.codes.tolist() == [[0, 0, 1], [0, 1, 0]]
+    assert triples[1] == ["qid1", "npid1", "ppid1"]
+    assert list(triples) == triples.triples
+
+
+def test_dedup_filter_shuffle():
+    data = [
+        ["qid1", "ppid1", "npid1"],
+        ["qid2", "ppid2", "npid2"],
+        ["qid1", "ppid1", "npid1"]
+    ]
+    triples = Triples(data)
+
+    assert triples.dedup().triples == data[:2]
+    assert triples.filter(triples.codes[:, 0] == 1).triples == [data[1]]
+    assert sorted(triples.shuffle(seed=42).triples) == sorted(data)
+
+
+def test_dedup_square_fortran_codes():
+    triples = Triples([
+        ["qid1", "ppid1", "npid1"],
+        ["qid1", "npid1", "ppid1"],
+        ["qid1", "ppid1", "npid1"]
+    ])
+    fortran = Triples.from_codes(np.asfortranarray(triples.codes), triples.qid_vocab, triples.pid_vocab)
+
+    assert fortran.dedup().triples == triples.triples[:2]
+
+
+def test_save_and_load_npz(tmp_path, json_triples):
+    save_path = str(tmp_path / "triples.npz")
+    json_triples.save(save_path)
+    reloaded = Triples(save_path)
+    assert reloaded.triples == json_triples.triples
+
+
+def test_load_json_with_special_characters(tmp_path):
+    data = [["q,1", 'p "1"', "n1"], ["q2", "p2", "n,2"]]
+    save_path = str(tmp_path / "triples.jsonl")
+    Triples(data).save(save_path)
+
+    reloaded = Triples(save_path)
+    assert reloaded.triples == data
+
+
+def test_load_json_with_mixed_id_types(tmp_path):
+    save_path = tmp_path / "triples.jsonl"
+    save_path.write_text('[1, 2, 3]\n\n  ["q1", "p1", "p2"]  \n[4, 5, 6]\n')
+
+    assert Triples(str(save_path)).triples == [["1", "2", "3"], ["q1", "p1", "p2"], ["4", "5", "6"]]
+    assert Triples([])._from_json(str(save_path), chunk_size=12).rows() == [("1", "2", "3"), ("q1", "p1", "p2"), ("4", "5", "6")]
+
+
+def test_load_json_in_chunks(tmp_path):
+    save_path = tmp_path / "triples.jsonl"
+    save_path.write_text("".join(f"[{i}, {i + 1}, {i + 2}]\n" for i in range(100)))
+
+    triples = Triples([])
+    frame = triples._from_json(str(save_path), chunk_size=16)
+
+    assert frame.dtypes == [pl.Int64] * 3
+    assert frame.rows() == [(i, i + 1, i + 2) for i in range(100)]
+
+
+def test_load_empty_file(tmp_path):
+    save_path = tmp_path / "triples.jsonl"
+    save_path.write_text("")
+
+    triples = Triples(str(save_path))
+    assert len(triples) == 0
+
+
+@pytest.mark.parametrize("ext", ["jsonl.gz", "jsonl.zst", "csv.zst", "npz.zst"])
+def test_save_and_load_compressed(tmp_path, json_triples, ext):
+    save_path = str(tmp_path / f"triples.{ext}")
+    json_triples.save(save_path)
+    reloaded = Triples(save_path)
+    assert reloaded.triples == json_triples.triples
+
+
+@pytest.mark.parametrize("ext", ["jsonl", "npz"])
+def test_save_and_load_shards(tmp_path, json_triples, ext):
+    json_triples.save(str(tmp_path / f"triples.{ext}"), num_shards=2)
+
+    reloaded = Triples(str(tmp_path / f"triples-*.{ext}"))
+    assert reloaded.triples == json_triples.triples
@@ -0,0 +1,47 @@
+import numpy as np
+import polars as pl
+from pirate.data import MappedVocabulary, Passages, Triples, Vocabulary
+
+
+def test_vocabulary_interning():
+    vocab = Vocabulary(["p1", "p2"])
+    assert vocab.add("p3") == 2
+    assert vocab.add("p1") == 0
+    assert vocab.encode("p2") == 1
+    assert vocab.decode(2) == "p3"
+    assert "p4" not in vocab
+    assert len(vocab) == 3
+
+
+def test_vocabulary_bulk():
+    vocab = Vocabulary(["p1"])
+    codes = vocab.encode_many(pl.Series(["p2", "p1", "p2"]))
+    assert codes.tolist() == [1, 0, 1]
+
+    decoded = vocab.decode_many(np.array([1, 0]))
+    assert decoded.dtype == pl.Categorical
+    assert decoded.to_list() == ["p2", "p1"]
+
+
+def test_shared_vocabulary():
+    passages = Passages({"p1": "passage 1", "p2": "passage 2"})
+    triples = Triples([["q1", "p2", "p1"]], pid_vocab=passages.vocab)
+
+    assert triples.pid_vocab is passages.vocab
+    assert triples.codes[0, 1:].tolist() == [1, 0]
+
+    pid = passages.add("passage 3")
+    assert passages.vocab.encode(pid) == 2
+
+
+def test_mapped_vocabulary(tmp_path):
+    vocab = Vocabulary(["p1", "p2", "p3"])
+    vocab.save(str(tmp_path / "vocab"))
+
+    mapped = MappedVocabulary(str(tmp_path / "vocab"))
+    assert len(mapped) == 3
+    assert mapped.encode("p2") == 1
+    assert mapped.decode(2) == "p3"
+    assert "p4" not in mapped
+    assert list(mapped) == ["p1", "p2", "p3"]
+    assert mapped.decode_many(np.array([2, 0])).to_list() == ["p3", "p1"]
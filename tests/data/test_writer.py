@@ -0,0 +1,46 @@
+import pytest
+from pirate.data import Triples, TriplesWriter
+
+@pytest.mark.parametrize("ext", ["jsonl", "csv", "parquet"])
+def test_write_triples(tmp_path, ext):
+    data = [
+        ["qid1", "ppid1", "npid1"],
+        ["qid2", "ppid2", 'npid"2'],
+        ["qid3", "ppid3", "npid3"]
+    ]
+    save_path = str(tmp_path / f"triples.{ext}")
+
+    with TriplesWriter(save_path, batch_size=2) as writer:
+        writer.write_many(data)
+        assert len(writer) == 3
+
+    assert Triples(save_path).triples == data
+
+def test_flushed_batches_are_readable(tmp_path):
+    save_path = str(tmp_path / "triples.jsonl")
+
+    writer = TriplesWriter(save_path, batch_size=2)
+    writer.write_many([["qid1", "ppid1", "npid1"], ["qid2", "ppid2", "npid2"], ["qid3", "ppid3", "npid3"]])
+    assert len(Triples(save_path)) == 2
+
+    writer.close()
+    assert len(Triples(save_path)) == 3
+
+@pytest.mark.parametrize("ext", ["jsonl", "csv", "parquet", "parquet.zst"])
+def test_write_int_ids(tmp_path, ext):
+    data = [[1, 2, 3], [4, "p5", 6], [7, 8, 9]]
+    save_path = str(tmp_path / f"triples.{ext}")
+
+    with TriplesWriter(save_path, batch_size=2) as writer:
+        writer.write_many(data)
+
+    expected = [[str(value) for value in triple] for triple in data]
+    if ext == "jsonl":
+        assert [[str(value) for value in triple] for triple in Triples(save_path).triples] == expected
+    else:
+        assert Triples(save_path).triples == expected
+
+def test_write_wrong_width(tmp_path):
+    with TriplesWriter(str(tmp_path / "triples.jsonl")) as writer:
+        with pytest.raises(ValueError):
+            writer.write(["qid1", "ppid1"])
@@ -114,7 +114,9 @@ def test_hard_neg_miner_mine(example_data):
         seed=42,
         triples=triples,
         passages=passages,
-        queries=queries
+        queries=queries,
+        # BM25 scores on this three-passage corpus are all below the default threshold.
+        score_threshold=None
     )
     miner = HardMiner(params)
     mined_triples = miner.mine(num_negs_per_pair=1)
@@ -131,7 +133,9 @@ def test_hard_neg_miner_mine_exclude_pairs(example_data):
         seed=42,
         triples=triples,
         passages=passages,
-        queries=queries
+        queries=queries,
+        # BM25 scores on this three-passage corpus are all below the default threshold.
+        score_threshold=None
     )
     miner = HardMiner(params)
     mined_triples = miner.mine(num_negs_per_pair=1, exclude_pairs=[["q1", "p1"]])
@@ -147,7 +151,9 @@ def test_hard_neg_miner_mine_rtop_k_sampling(example_data):
         seed=42,
         triples=triples,
         passages=passages,
-        queries=queries
+        queries=queries,
+        # BM25 scores on this three-passage corpus are all below the default threshold.
+        score_threshold=None
     )
     miner = HardMiner(params)
     mined_triples = miner.mine(num_negs_per_pair=1)
@@ -188,3 +194,37 @@ def test_hard_neg_miner_mine_invalid_encoder(example_data):
         )
         miner = HardMiner(params)
         miner.mine(num_negs_per_pair=1)
+
+def test_hard_neg_miner_index_path(tmp_path, example_data, monkeypatch):
+    passages, queries, triples = example_data
+    index_path = str(tmp_path / "index")
+
+    def mine(passages):
+        params = HardMinerParams(
+            model=Encoder.BM25,
+            sampling=Sampling.RANDOM,
+            top_k=5,
+            seed=42,
+            triples=triples,
+            passages=passages,
+            queries=queries,
+            score_threshold=None,
+            index_path=index_path
+        )
+        miner = HardMiner(params)
+        calls = []
+        monkeypatch.setattr(miner.encoder, "index", lambda corpus, index=miner.encoder.index: calls.append(corpus) or index(corpus))
+        miner.mine(num_negs_per_pair=1)
+        return len(calls)
+
+    assert mine(passages) == 1
+    assert mine(passages) == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index"]
+
+    changed = Passages({**passages.data, "p2": "This is a changed passage 2"})
+    assert mine(changed) == 1
+    assert mine(changed) == 0
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["index"]
+
+    (tmp_path / "index" / "fingerprint.json").unlink()
+    assert mine(changed) == 1
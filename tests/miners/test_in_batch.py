@@ -79,3 +79,18 @@ def test_in_batch_neg_miner_mine_empty_triples():
         )
         miner = InBatchMiner(params)
         miner.mine(num_negs_per_pair=1)
+
+@pytest.mark.parametrize("ext", ["jsonl", "parquet"])
+def test_in_batch_neg_miner_mine_to_file(tmp_path, example_data, ext):
+    params = InBatchMinerParams(
+        seed=42,
+        triples=example_data,
+        verbose=False
+    )
+    miner = InBatchMiner(params)
+    output_path = str(tmp_path / f"triples.{ext}")
+    assert miner.mine(num_negs_per_pair=1, output_path=output_path) is None
+
+    mined_triples = Triples(output_path)
+    assert len(mined_triples) == 4
+    assert all(t[2] not in ["p1", "p2"] for t in mined_triples if t[0] == "q1")
@@ -0,0 +1,63 @@
+import numpy as np
+from pirate.retrievers.ann import IVFIndex
+from pirate.retrievers.utils import blocked_top_k, normalize_embeddings
+
+
+def clustered(num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(42).normal(size=(20, 16))
+    return normalize_embeddings(centers[rng.integers(20, size=num_rows)] + 0.3 * rng.normal(size=(num_rows, 16)))
+
+
+def test_search_matches_exact_with_all_lists():
+    corpus, queries = clustered(500), clustered(10, seed=1)
+    index = IVFIndex(16)
+    index.train(corpus)
+
+    indices, scores = index.search(queries, corpus, 10, nprobe=16)
+    expected_indices, expected_scores = blocked_top_k(queries, corpus, 10)
+
+    assert indices.tolist() == expected_indices.tolist()
+    assert np.allclose(scores, expected_scores)
+
+
+def test_search_recall():
+    corpus, queries = clustered(2000), clustered(50, seed=1)
+    index = IVFIndex(32)
+    index.train(corpus)
+
+    indices, _ = index.search(queries, corpus, 10, nprobe=4)
+    expected_indices, _ = blocked_top_k(queries, corpus, 10)
+
+    recall = np.mean([len(set(row) & set(expected)) / 10 for row, expected in zip(indices.tolist(), expected_indices.tolist())])
+    assert recall > 0.9
+
+
+def test_add_and_deleted_rows():
+    corpus, queries = clustered(300), clustered(5, seed=1)
+    index = IVFIndex(8)
+    index.train(corpus[:200])
+    index.add(corpus[200:])
+
+    deleted = np.zeros(300, dtype=bool)
+    deleted[::2] = True
+
+    indices, _ = index.search(queries, corpus, 100, nprobe=1, deleted=deleted)
+
+    assert len(index.assignments) == 300
+    assert not deleted[indices].any()
+    assert all(len(set(row)) == 100 for row in indices.tolist())
+
+
+def test_save_and_load(tmp_path):
+    corpus = clustered(100)
+    index = IVFIndex(4)
+    index.train(corpus)
+    index.save(str(tmp_path))
+
+    loaded = IVFIndex.load(str(tmp_path))
+    assert loaded.num_lists == 4
+    assert loaded.assignments.tolist() == index.assignments.tolist()
+
+    IVFIndex.delete(str(tmp_path))
+    assert IVFIndex.load(str(tmp_path)) is None
@@ -0,0 +1,154 @@
+import hashlib
+import numpy as np
+import pytest
+import torch
+from sentence_transformers import SentenceTransformer
+from pirate.retrievers import BiEncoder
+from pirate.retrievers.utils import normalize_embeddings
+from pirate.data import Passages, Queries
+
+
+def embed(text, dim=16):
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    return np.random.default_rng(seed).normal(size=dim).astype(np.float32)
+
+
+@pytest.fixture
+def bi_encoder(monkeypatch):
+    monkeypatch.setattr(SentenceTransformer, "__init__", lambda self, *args, **kwargs: torch.nn.Module.__init__(self))
+    monkeypatch.setattr(BiEncoder, "encode", lambda self, texts, *args, **kwargs: np.stack([embed(text) for text in texts]))
+    return lambda: BiEncoder("stub-model")
+
+
+@pytest.fixture
+def corpus():
+    return Passages({f"p{i}": f"passage {i}" for i in range(300)})
+
+
+@pytest.fixture
+def queries():
+    return Queries([f"query {i}" for i in range(12)])
+
+
+def ranked(ranking):
+    data = ranking.data
+    return data["qid"].cast(str).to_list(), data["pid"].cast(str).to_list(), data["score"].to_numpy()
+
+
+def assert_same_ranking(ranking, expected):
+    qids, pids, scores = ranked(ranking)
+    expected_qids, expected_pids, expected_scores = ranked(expected)
+
+    assert qids == expected_qids
+    assert pids == expected_pids
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-6)
+
+
+def test_rank_passages_by_cosine(bi_encoder, corpus, queries):
+    retriever = bi_encoder()
+    retriever.index(corpus)
+    ranking = retriever.rank_passages(queries, top_k=5, query_block_size=5, corpus_block_size=64)
+
+    passages = normalize_embeddings(np.stack([embed(corpus[pid]) for pid in corpus]))
+    for qid, group in ranking.iter_groups():
+        scores = passages @ normalize_embeddings(embed(queries[qid])[None])[0]
+        expected = np.argsort(-scores)[:5]
+
+        assert group["pid"].cast(str).to_list() == [f"p{row}" for row in expected]
+        np.testing.assert_allclose(group["score"].to_numpy(), scores[expected], atol=1e-6)
+
+
+@pytest.mark.parametrize("storage,ann", [("float32", None), ("int8", None), ("binary", None), ("float32", "ivf")])
+def test_save_and_load_index(tmp_path, bi_encoder, corpus, queries, storage, ann):
+    retriever = bi_encoder()
+    retriever.index(corpus, storage=storage, ann=ann, num_lists=8)
+    retriever.remove(["p7"])
+    expected = retriever.rank_passages(queries, top_k=10)
+
+    retriever.save_index(str(tmp_path / "index"))
+    reloaded = bi_encoder()
+    reloaded.load_index(str(tmp_path / "index"))
+
+    assert isinstance(reloaded.indexed_corpus, np.memmap)
+    assert_same_ranking(reloaded.rank_passages(queries, top_k=10), expected)
+
+    other = bi_encoder()
+    other.model_name = "other-model"
+    with pytest.raises(ValueError):
+        other.load_index(str(tmp_path / "index"))
+
+
+@pytest.mark.parametrize("storage", ["float32", "binary"])
+def test_add_and_remove_match_fresh_index(bi_encoder, corpus, queries, storage):
+    pids = list(corpus)
+    retriever = bi_encoder()
+    retriever.index(Passages({pid: corpus[pid] for pid in pids[:200]}), storage=storage)
+    retriever.add(Passages({pid: corpus[pid] for pid in pids[200:250]}))
+    retriever.add(Passages({pid: corpus[pid] for pid in pids[250:]}))
+    retriever.remove(["p3", "p210", "p299"])
+
+    kept = [pid for pid in pids if pid not in ("p3", "p210", "p299")]
+    fresh = bi_encoder()
+    fresh.index(Passages({pid: corpus[pid] for pid in kept}), storage=storage)
+
+    if storage == "float32":
+        assert_same_ranking(retriever.rank_passages(queries, top_k=10), fresh.rank_passages(queries, top_k=10))
+
+    # Hamming scores tie a lot, and tied passages may be ranked in any order.
+    qids, pids, scores = ranked(retriever.rank_passages(queries, rescore_multiplier=0))
+    expected_qids, expected_pids, expected_scores = ranked(fresh.rank_passages(queries, rescore_multiplier=0))
+
+    assert qids == expected_qids
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-6)
+    assert dict(zip(zip(qids, pids), scores.tolist())) == dict(zip(zip(expected_qids, expected_pids), expected_scores.tolist()))
+
+
+def test_ivf_with_all_lists_matches_exact(bi_encoder, corpus, queries):
+    retriever = bi_encoder()
+    retriever.index(corpus, ann="ivf", num_lists=8)
+    retriever.add(Passages({"n1": "new passage 1", "n2": "new passage 2"}))
+    retriever.remove(["p5", "n1"])
+
+    assert_same_ranking(
+        retriever.rank_passages(queries, top_k=10, nprobe=8),
+        retriever.rank_passages(queries, top_k=10, exact=True)
+    )
+
+
+def test_binary_rescoring(bi_encoder, corpus, queries):
+    retriever = bi_encoder()
+    retriever.index(corpus, storage="binary")
+    signs = retriever.quantizer.decode(retriever.indexed_corpus)
+
+    hamming = retriever.rank_passages(queries, top_k=40, rescore_multiplier=0)
+    rescored = retriever.rank_passages(queries, top_k=10, rescore_multiplier=4)
+
+    for qid, group in rescored.iter_groups():
+        query = normalize_embeddings(embed(queries[qid])[None])[0]
+        query_signs = retriever.quantizer.decode(retriever.quantizer.encode(query[None]))[0]
+        rows = [int(pid[1:]) for pid in group["pid"].cast(str).to_list()]
+
+        np.testing.assert_allclose(group["score"].to_numpy(), signs[rows] @ query, atol=1e-6)
+        assert np.all(np.diff(group["score"].to_numpy()) <= 0)
+
+        candidates = hamming.data.filter(hamming.data["qid"].cast(str) == qid)
+        hamming_scores = np.sort(signs @ query_signs)[::-1][:40]
+        np.testing.assert_allclose(candidates["score"].to_numpy(), hamming_scores, atol=1e-6)
+        assert set(group["pid"].cast(str).to_list()) <= set(candidates["pid"].cast(str).to_list())
+
+
+@pytest.mark.parametrize("storage", ["float32", "int8", "binary"])
+def test_memory_budget(bi_encoder, corpus, queries, storage):
+    retriever = bi_encoder()
+    retriever.index(corpus, storage=storage)
+
+    for top_k, memory_budget in [(5, 2_000), (None, 20_000)]:
+        expected = retriever.rank_passages(queries, top_k=top_k, rescore_multiplier=0)
+        ranking = retriever.rank_passages(queries, top_k=top_k, rescore_multiplier=0, memory_budget=memory_budget)
+
+        qids, pids, scores = ranked(ranking)
+        expected_qids, expected_pids, expected_scores = ranked(expected)
+        assert qids == expected_qids
+        np.testing.assert_allclose(scores, expected_scores, atol=1e-6)
+        if storage != "binary":
+            assert pids == expected_pids
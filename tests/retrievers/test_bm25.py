@@ -1,5 +1,10 @@
 import pytest
-from pirate.retrievers.bm25 import BM25Retriever
+import tracemalloc
+import numpy as np
+import polars as pl
+from rank_bm25 import BM25Okapi, BM25L, BM25Plus
+from pirate.retrievers.bm25 import BM25Index, BM25LIndex, BM25OkapiIndex, BM25PlusIndex, BM25Retriever, split_on_spaces
+from pirate.retrievers.utils import tile_sizes
 from pirate.models.types import Encoder
 from pirate.data import Passages, Queries
 
@@ -42,6 +47,10 @@ def test_bm25_rank(sample_passages, sample_queries):
     top_2_ranking = retriever.rank_passages(sample_queries, top_k=2)
     assert len(top_2_ranking) == len(sample_queries) * 2
 
+    best = top_2_ranking.data.filter(pl.col("rank") == 0)
+    assert best["pid"].to_list()[:2] == [0, 1]
+    assert top_2_ranking.data.group_by("qid").agg(pl.col("score").diff().max())["score"].max() <= 0
+
 def test_invalid_index_corpus():
     retriever = BM25Retriever(Encoder.BM25)
     with pytest.raises(ValueError):
@@ -51,3 +60,183 @@ def test_rank_before_index():
     retriever = BM25Retriever(Encoder.BM25)
     with pytest.raises(ValueError):
         retriever.rank_passages(Queries(["test"]))
+
+@pytest.mark.parametrize("encoder, reference", [
+    (Encoder.BM25, BM25Okapi),
+    (Encoder.BM25L, BM25L),
+    (Encoder.BM25PLUS, BM25Plus)
+])
+def test_scores_match_rank_bm25(encoder, reference):
+    corpus = [
+        "the cat sat on the mat",
+        "the dog sat on the log",
+        "the cat chased the dog around the yard",
+        "a bird sang",
+        ""
+    ]
+    queries = ["the cat", "dog dog log", "bird and fish", "unknown"]
+
+    retriever = BM25Retriever(encoder, tokenizer=split_on_spaces)
+    retriever.index(Passages(corpus))
+
+    expected = reference([document.split(" ") for document in corpus])
+    tokenized_queries = [query.split(" ") for query in queries]
+    scores = retriever.indexed_corpus.score_batch(tokenized_queries)
+
+    assert scores.shape == (len(queries), len(corpus))
+    for query, row in zip(tokenized_queries, scores):
+        assert np.allclose(row, expected.get_scores(query))
+
+def test_parallel_matches_serial():
+    corpus = Passages([f"doc {i} about topic {i % 7} and word{i % 3}" for i in range(50)])
+    queries = Queries([f"topic {i % 7} word{i % 3} doc" for i in range(20)])
+
+    serial = BM25Retriever(Encoder.BM25, tokenizer=split_on_spaces)
+    serial.index(corpus)
+
+    parallel = BM25Retriever(Encoder.BM25, tokenizer=split_on_spaces, num_workers=3)
+    parallel.index(corpus)
+
+    assert parallel.indexed_corpus.vocab.ids == serial.indexed_corpus.vocab.ids
+    assert (parallel.indexed_corpus.term_freqs != serial.indexed_corpus.term_freqs).nnz == 0
+
+    expected = serial.rank_passages(queries, top_k=5, batch_size=4)
+    ranking = parallel.rank_passages(queries, top_k=5, batch_size=4)
+    assert ranking.data.equals(expected.data)
+
+def test_incomplete_index_fails_at_construction():
+    class NoWeights(BM25Index):
+        def _calc_idf(self, doc_freqs):
+            return np.ones(len(doc_freqs))
+
+    with pytest.raises(TypeError):
+        NoWeights([["a", "b"], ["b"]])
+
+def test_invalid_num_workers():
+    with pytest.raises(ValueError):
+        BM25Retriever(Encoder.BM25, num_workers=0)
+
+def test_save_and_load_index(tmp_path, sample_passages, sample_queries):
+    retriever = BM25Retriever(Encoder.BM25L)
+    retriever.index(sample_passages)
+    retriever.save_index(str(tmp_path / "index"))
+
+    loaded = BM25Retriever(Encoder.BM25L)
+    loaded.load_index(str(tmp_path / "index"))
+
+    assert not loaded.indexed_corpus.term_freqs.data.flags.writeable
+    assert loaded.rank_passages(sample_queries, top_k=2).data.equals(retriever.rank_passages(sample_queries, top_k=2).data)
+
+    with pytest.raises(ValueError):
+        BM25Retriever(Encoder.BM25).load_index(str(tmp_path / "index"))
+
+def test_parallel_ranking_with_tokenizer(sample_passages, sample_queries):
+    serial = BM25Retriever(Encoder.BM25)
+    serial.index(sample_passages)
+
+    parallel = BM25Retriever(Encoder.BM25, num_workers=2)
+    parallel.index(sample_passages)
+
+    expected = serial.rank_passages(sample_queries, batch_size=1)
+    assert parallel.rank_passages(sample_queries, batch_size=1).data.equals(expected.data)
+
+@pytest.mark.parametrize("merge_ratio", [0, 10])
+@pytest.mark.parametrize("encoder", [Encoder.BM25, Encoder.BM25L, Encoder.BM25PLUS])
+def test_add_and_remove(encoder, merge_ratio, monkeypatch):
+    monkeypatch.setattr(BM25Index, "merge_ratio", merge_ratio)
+
+    texts = {f"p{i}": f"doc {i} about topic {i % 7} and word{i % 3}" for i in range(30)}
+    new_texts = {f"n{i}": f"new doc {i} about topic {i % 5} and term{i}" for i in range(5)}
+    queries = Queries(["topic 3 word1", "new term2 doc", "missing words"])
+
+    full = BM25Retriever(encoder)
+    full.index(Passages({**texts, **new_texts}))
+
+    retriever = BM25Retriever(encoder)
+    retriever.index(Passages(texts))
+    retriever.add(Passages(new_texts))
+
+    assert retriever.rank_passages(queries, top_k=10).data.equals(full.rank_passages(queries, top_k=10).data)
+
+    retriever.remove(list(new_texts))
+    retriever.remove(["p0"])
+
+    reference = BM25Retriever(encoder)
+    reference.index(Passages({pid: text for pid, text in texts.items() if pid != "p0"}))
+
+    ranking = retriever.rank_passages(queries)
+    expected = reference.rank_passages(queries)
+    assert len(ranking) == len(expected) == 3 * 29
+    assert np.allclose(ranking.data["score"].to_numpy(), expected.data["score"].to_numpy())
+
+    with pytest.raises(ValueError):
+        retriever.add(Passages({"p1": "already indexed"}))
+    with pytest.raises(KeyError):
+        retriever.remove(["p0"])
+
+@pytest.mark.parametrize("variant", [BM25OkapiIndex, BM25LIndex, BM25PlusIndex])
+def test_small_adds_match_fresh_index(tmp_path, variant):
+    docs = [f"doc {i} topic{i % 7} word{i % 3} term{i}".split() for i in range(60)]
+    queries = [["topic3", "word1"], ["term42", "doc"], ["missing"]]
+
+    variant(docs[:10]).save(str(tmp_path / "index"))
+    index = variant.load(str(tmp_path / "index"))
+
+    capacities = set()
+    for start in range(10, 60, 2):
+        index.add(docs[start:start + 2])
+        capacities.add(len(index._doc_len))
+    index.remove([3, 45])
+
+    assert len(capacities) <= 4
+    assert index.corpus_size == 58
+
+    fresh = variant([doc for i, doc in enumerate(docs) if i not in (3, 45)])
+    assert index.avgdl == pytest.approx(fresh.avgdl)
+    np.testing.assert_allclose(np.delete(index.score_batch(queries), [3, 45], axis=1), fresh.score_batch(queries))
+
+
+@pytest.mark.parametrize("encoder", [Encoder.BM25, Encoder.BM25L, Encoder.BM25PLUS])
+def test_tiled_ranking(encoder):
+    corpus = Passages({f"p{i}": f"doc {i} about topic {i % 7} and word{i % 3}" for i in range(60)})
+    queries = Queries([f"topic {i % 7} word{i % 3} doc" for i in range(20)])
+
+    retriever = BM25Retriever(encoder, tokenizer=split_on_spaces)
+    retriever.index(corpus)
+    retriever.remove(["p3", "p40"])
+
+    for top_k in [5, 58]:
+        expected = retriever.rank_passages(queries, top_k=top_k)
+        ranking = retriever.rank_passages(queries, top_k=top_k, memory_budget=1000)
+
+        assert len(ranking) == len(expected) == 20 * top_k
+        assert np.allclose(ranking.data["score"].to_numpy(), expected.data["score"].to_numpy())
+        assert not ranking.data["pid"].cast(str).is_in(["p3", "p40"]).any()
+
+def test_tiled_scoring_fits_budget():
+    rng = np.random.default_rng(0)
+    docs = [[f"w{term}" for term in rng.integers(0, 200, 30)] for _ in range(10_000)]
+    queries = [[f"w{term}" for term in rng.integers(0, 200, 5)] for _ in range(20)]
+
+    index = BM25OkapiIndex(docs[:9000])
+    index.add(docs[9000:])
+    index.remove(np.arange(0, 10_000, 7))
+
+    budget = 1 << 20
+    batch_size, block_size = tile_sizes(budget, 10_000, 10, score_bytes=8, row_nnz=index.num_postings() / 10_000, sparse=True)
+    assert block_size < 10_000
+
+    tracemalloc.start()
+    indices, scores = index.top_k_batch(queries[:batch_size], 10, block_size)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert peak <= budget
+
+    all_indices, all_scores = index.top_k_batch(queries[:batch_size], index.corpus_size, block_size)
+    expected_indices, expected_scores = index.top_k_batch(queries[:batch_size], index.corpus_size)
+    assert all_indices.tolist() == expected_indices.tolist()
+    np.testing.assert_allclose(all_scores, expected_scores)
+    expected_indices, expected_scores = index.top_k_batch(queries[:batch_size], 10)
+    np.testing.assert_allclose(scores, expected_scores)
+    assert not np.isin(indices, np.arange(0, 10_000, 7)).any()
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from pirate.retrievers import EmbeddingCache
+
+
+def embed(texts):
+    return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_get_and_put(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), "model")
+
+    embeddings, missing = cache.get_many(["a", "b"])
+    assert embeddings is None
+    assert missing.tolist() == [0, 1]
+
+    cache.put_many(["a", "bb"], embed(["a", "bb"]))
+    embeddings, missing = cache.get_many(["a", "c", "bb", " a", "A"])
+
+    assert missing.tolist() == [1, 3, 4]
+    np.testing.assert_array_equal(embeddings[[0, 2]], embed(["a", "bb"]))
+    assert len(cache) == 2
+
+
+def test_reopen(tmp_path):
+    path = str(tmp_path / "cache")
+    EmbeddingCache(path, "model").put_many(["aaa", "b"], embed(["aaa", "b"]))
+
+    cache = EmbeddingCache(path, "model")
+    embeddings, missing = cache.get_many(["b", "aaa"])
+
+    assert len(missing) == 0
+    np.testing.assert_array_equal(embeddings, embed(["b", "aaa"]))
+
+    with pytest.raises(ValueError):
+        EmbeddingCache(path, "other-model")
+
+
+def test_lru_eviction(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), "model", max_entries=3)
+    cache.put_many(["a", "b", "c"], embed(["a", "b", "c"]))
+
+    cache.get_many(["a"])
+    cache.put_many(["dd", "eee"], embed(["dd", "eee"]))
+
+    embeddings, missing = cache.get_many(["a", "b", "c", "dd", "eee"])
+    assert missing.tolist() == [1, 2]
+    np.testing.assert_array_equal(embeddings[[0, 3, 4]], embed(["a", "dd", "eee"]))
+    assert len(cache) == 3
+
+
+def test_eviction_keeps_the_batch(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), "model", max_entries=3)
+    cache.put_many(["a", "b", "c"], embed(["a", "b", "c"]))
+    cache.get_many(["b", "c"])
+
+    cache.put_many(["a", "dd", "eee"], embed(["a", "dd", "eee"]))
+    embeddings, missing = cache.get_many(["a", "b", "c", "dd", "eee"])
+
+    assert missing.tolist() == [1, 2]
+    np.testing.assert_array_equal(embeddings[[0, 3, 4]], embed(["a", "dd", "eee"]))
+
+    cache.put_many(["f", "gg", "hhh", "iiii"], embed(["f", "gg", "hhh", "iiii"]))
+    assert cache.get_many(["f", "gg", "hhh", "iiii"])[1].tolist() == [0]
+    assert len(cache) == 3
+
+
+def test_max_bytes(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache"), "model", max_bytes=2 * 3 * 4)
+    cache.put_many(["a", "b", "c"], embed(["a", "b", "c"]))
+
+    assert cache.capacity == 2
+    assert cache.get_many(["a", "b", "c"])[1].tolist() == [0]
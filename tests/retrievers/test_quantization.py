@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from pirate.retrievers.quantization import Quantizer
+from pirate.retrievers.utils import blocked_top_k, normalize_embeddings
+
+
+def embeddings(num_rows, dim=64, seed=0):
+    return normalize_embeddings(np.random.default_rng(seed).normal(size=(num_rows, dim)))
+
+
+@pytest.mark.parametrize("storage, dtype, width, tolerance", [
+    ("float32", np.float32, 64, 0),
+    ("float16", np.float16, 64, 1e-3),
+    ("int8", np.int8, 64, 1e-2),
+])
+def test_encode_decode(storage, dtype, width, tolerance):
+    corpus = embeddings(100)
+    quantizer = Quantizer(storage).fit(corpus)
+    codes = quantizer.encode(corpus)
+
+    assert codes.dtype == dtype
+    assert codes.shape == (100, width)
+    assert np.abs(quantizer.decode(codes) - corpus).max() <= tolerance
+
+
+def test_binary():
+    corpus = embeddings(100, dim=60)
+    quantizer = Quantizer("binary").fit(corpus)
+    codes = quantizer.encode(corpus)
+
+    assert codes.shape == (100, 8)
+
+    decoded = quantizer.decode(codes)
+    hamming = (np.sign(corpus)[:, None, :] != np.sign(corpus)[None, :, :]).sum(axis=2)
+    assert np.allclose(decoded @ decoded.T, 1 - 2 * hamming / 60, atol=1e-6)
+
+
+def test_blocked_top_k_decodes_blocks():
+    corpus, queries = embeddings(200), embeddings(5, seed=1)
+    quantizer = Quantizer("int8").fit(corpus)
+    codes = quantizer.encode(corpus)
+
+    indices, scores = blocked_top_k(queries, codes, 10, block_size=30, decode=quantizer.decode)
+    expected_indices, expected_scores = blocked_top_k(queries, quantizer.decode(codes), 10)
+
+    assert indices.tolist() == expected_indices.tolist()
+    assert np.allclose(scores, expected_scores, atol=1e-6)
+
+
+def test_save_and_load(tmp_path):
+    quantizer = Quantizer("int8").fit(embeddings(10))
+    quantizer.save(str(tmp_path))
+    loaded = Quantizer.load(str(tmp_path))
+
+    assert loaded.storage == "int8" and loaded.dim == 64
+    np.testing.assert_array_equal(loaded.offsets, quantizer.offsets)
+    np.testing.assert_array_equal(loaded.scales, quantizer.scales)
+
+    assert Quantizer.load(str(tmp_path / "missing")).storage == "float32"
+
+
+def test_invalid_storage():
+    with pytest.raises(ValueError):
+        Quantizer("int4")
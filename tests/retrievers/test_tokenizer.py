@@ -0,0 +1,64 @@
+import os
+import numpy as np
+from pirate.retrievers import Tokenizer
+from pirate.retrievers.tokenizer import ENGLISH_STOPWORDS, count_terms
+
+
+def test_tokenize():
+    tokenizer = Tokenizer()
+    assert tokenizer("Hello, World! It's 2024.") == ["hello", "world", "it", "s", "2024"]
+    assert tokenizer.tokenize_many(["Ünïcode wörds", "", "a-b"]) == [["ünïcode", "wörds"], [], ["a", "b"]]
+
+
+def test_stopwords_and_stemming():
+    calls = []
+
+    def stem(word):
+        calls.append(word)
+        return word.rstrip("s")
+
+    tokenizer = Tokenizer(stopwords=ENGLISH_STOPWORDS, stemmer=stem)
+    assert tokenizer.tokenize_many(["The cats and the dogs", "cats"]) == [["cat", "dog"], ["cat"]]
+    assert sorted(calls) == ["cats", "dogs"]
+
+
+def test_count_terms_matches_tokenize_many():
+    tokenizer = Tokenizer()
+    texts = ["b a b", "", "c a"]
+
+    counts = tokenizer.count_terms(texts)
+    expected = count_terms(tokenizer.tokenize_many(texts))
+
+    assert counts.terms == expected.terms == ["b", "a", "c"]
+    assert counts.codes.tolist() == expected.codes.tolist() == [0, 1, 0, 2, 1]
+    assert counts.doc_len.tolist() == [3, 0, 2]
+
+
+def test_count_terms_in_chunks():
+    tokenizer = Tokenizer(stopwords=["the"])
+    texts = [f"The text {i} of {i % 3} words" for i in range(20)] + [""]
+
+    counts = tokenizer.count_terms(texts)
+    for num_chunks in [2, 7, 50]:
+        chunked = tokenizer.count_terms(texts, num_chunks=num_chunks)
+
+        assert chunked.terms == counts.terms
+        assert np.array_equal(chunked.codes, counts.codes)
+        assert np.array_equal(chunked.doc_len, counts.doc_len)
+        assert tokenizer.tokenize_many(texts, num_chunks=num_chunks) == tokenizer.tokenize_many(texts)
+
+
+def test_count_terms_cache(tmp_path):
+    tokenizer = Tokenizer(cache_dir=str(tmp_path))
+    texts = ["first text", "second text"]
+
+    counts = tokenizer.count_terms(texts)
+    assert os.listdir(tmp_path) == [tokenizer.fingerprint(texts)]
+
+    cached = tokenizer.count_terms(texts)
+    assert cached.terms == counts.terms
+    assert np.array_equal(cached.codes, counts.codes)
+    assert np.array_equal(cached.doc_len, counts.doc_len)
+
+    assert Tokenizer(lowercase=False).fingerprint(texts) != tokenizer.fingerprint(texts)
+    assert tokenizer.fingerprint(texts[::-1]) != tokenizer.fingerprint(texts)
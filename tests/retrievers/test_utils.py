@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+from pirate.data import Ranking, Vocabulary
+from pirate.retrievers.utils import IndexIds, blocked_top_k, build_ranking, normalize_embeddings, recall_at_k, tile_sizes, top_k_scores
+
+def test_top_k_scores():
+    scores = np.array([
+        [0.1, 0.9, 0.5, 0.7],
+        [0.8, 0.2, 0.6, 0.4]
+    ])
+
+    indices, top_scores = top_k_scores(scores, 2)
+    assert indices.tolist() == [[1, 3], [0, 2]]
+    assert top_scores.tolist() == [[0.9, 0.7], [0.8, 0.6]]
+
+    indices, top_scores = top_k_scores(scores)
+    assert indices.tolist() == [[1, 3, 2, 0], [0, 2, 3, 1]]
+
+def test_build_ranking():
+    indices = [np.array([[1, 0]]), np.array([[0, 1]])]
+    scores = [np.array([[0.9, 0.1]]), np.array([[0.8, 0.2]])]
+
+    ranking = build_ranking(Vocabulary(["q1", "q2"]), Vocabulary(["p1", "p2"]), indices, scores)
+    assert ranking.data.columns == ["qid", "pid", "rank", "score"]
+    assert ranking.data.cast({"qid": str, "pid": str}).rows() == [
+        ("q1", "p2", 0, 0.9),
+        ("q1", "p1", 1, 0.1),
+        ("q2", "p1", 0, 0.8),
+        ("q2", "p2", 1, 0.2)
+    ]
+
+def test_blocked_top_k():
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+    corpus = rng.normal(size=(50, 8)).astype(np.float32)
+    deleted = np.zeros(50, dtype=bool)
+    deleted[[3, 17, 42]] = True
+
+    scores = queries @ corpus.T
+    scores[:, deleted] = -np.inf
+    expected_indices, expected_scores = top_k_scores(scores, 10)
+
+    indices, top_scores = blocked_top_k(queries, corpus, 10, block_size=7, deleted=deleted)
+    assert indices.tolist() == expected_indices.tolist()
+    assert np.allclose(top_scores, expected_scores)
+
+def test_blocked_top_k_keeps_all_rows(monkeypatch):
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(5, 8)).astype(np.float32)
+    corpus = rng.normal(size=(50, 8)).astype(np.float32)
+    deleted = np.zeros(50, dtype=bool)
+    deleted[[3, 17, 42]] = True
+
+    scores = queries @ corpus.T
+    scores[:, deleted] = -np.inf
+    expected_indices, expected_scores = top_k_scores(scores, 47)
+
+    def merge(*args):
+        raise AssertionError("Every row is kept, so blocks should not be merged.")
+
+    monkeypatch.setattr("pirate.retrievers.utils.merge_top_k", merge)
+    indices, top_scores = blocked_top_k(queries, corpus, 47, block_size=7, deleted=deleted)
+
+    assert indices.tolist() == expected_indices.tolist()
+    assert np.allclose(top_scores, expected_scores)
+
+def test_normalize_embeddings():
+    embeddings = normalize_embeddings(np.array([[3.0, 4.0], [0.0, 0.0]]))
+    assert embeddings.dtype == np.float32
+    assert np.allclose(embeddings, [[0.6, 0.8], [0.0, 0.0]])
+
+def test_recall_at_k():
+    reference = Ranking([["q1", "p1", 0, 3.0], ["q1", "p2", 1, 2.0], ["q1", "p3", 2, 1.0], ["q2", "p1", 0, 1.0]])
+    ranking = Ranking([["q1", "p2", 0, 5.0], ["q1", "p4", 1, 4.0], ["q1", "p1", 2, 1.0]])
+
+    assert recall_at_k(reference, reference, 2) == 1.0
+    assert recall_at_k(reference, ranking, 2) == 0.25
+    assert recall_at_k(reference, ranking, 3) == 1 / 3
+
+def test_tile_sizes():
+    query_block_size, corpus_block_size = tile_sizes(2**30, 10**6, 100)
+    assert corpus_block_size == 16384
+    assert query_block_size * corpus_block_size * 16 <= 2**30
+
+    query_block_size, corpus_block_size = tile_sizes(100_000, 10**6, 10, row_bytes=1024)
+    assert corpus_block_size < 100 and query_block_size >= 1
+    assert tile_sizes(1, 10, 10) == (1, 1)
+
+    query_block_size, sparse_block_size = tile_sizes(2**20, 10**6, 10, row_nnz=100, sparse=True)
+    assert sparse_block_size < tile_sizes(2**20, 10**6, 10)[1]
+    assert sparse_block_size * 100 * 64 <= 2**20
+
+def test_index_ids(tmp_path):
+    vocab = Vocabulary(["p0", "p1", "p2"])
+    ids = IndexIds(vocab)
+
+    assert ids.add(["n0"]).tolist() == [3]
+    buffer = ids._codes
+    assert ids.add(["n1", "n2"]).tolist() == [4, 5]
+    assert ids._codes is buffer
+    assert vocab.ids == ["p0", "p1", "p2"]
+
+    assert ids.remove(["p1", "n1"]).tolist() == [1, 4]
+    assert ids.add(["p1"]).tolist() == [6]
+    assert len(ids) == 5 and ids.num_rows == 7
+
+    with pytest.raises(ValueError):
+        ids.add(["n0"])
+    with pytest.raises(KeyError):
+        ids.remove(["n1"])
+
+    assert ids.decode_many(np.arange(7)).cast(str).to_list() == ["p0", "p1", "p2", "n0", "n1", "n2", "p1"]
+
+    ids.save(str(tmp_path / "ids"))
+    loaded = IndexIds.load(str(tmp_path / "ids"))
+    assert loaded.decode_many(np.arange(7)).cast(str).to_list() == ["p0", "p1", "p2", "n0", "n1", "n2", "p1"]
+    assert loaded.deleted.tolist() == ids.deleted.tolist()
+
+    loaded.add(["m0"])
+    loaded.remove(["p0"])
+    assert loaded.decode_many(np.array([7])).cast(str).to_list() == ["m0"]
+    assert len(loaded) == 5
+    assert IndexIds.load(str(tmp_path / "ids")).deleted.tolist() == ids.deleted.tolist()